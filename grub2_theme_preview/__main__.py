@@ -1,71 +1,73 @@
 # Copyright (C) 2015 Sebastian Pipping <sebastian@pipping.org>
 # Licensed under GPL v2 or later
 
+import asyncio
 import contextlib
 import errno
-import glob
 import os
-import platform
 import re
 import signal
-import subprocess
 import sys
-import tempfile
+import time
 import traceback
 from argparse import ArgumentParser, RawDescriptionHelpFormatter
-from enum import Enum
 from textwrap import dedent
 
+from .benchmark import DEFAULT_KEYS
+from .errors import BaselineMismatchError
+from .fontcheck import check_glyph_coverage, collect_text_uses, format_font_report
+from .gdbstub import PC_REGISTERS
+from .imagediff import (
+    combine_side_by_side,
+    compare_images,
+    make_diff_image,
+    read_ppm,
+    write_ppm,
+)
+from .imagesize import ImageSizeReport
+from .memory import estimate_guest_memory, iterate_theme_pictures
+from .pf2 import FontSet
+from .pictures import is_jpeg_supported, write_png
+from .preview import (
+    DEFAULT_DISK_BUS,
+    DEFAULT_MEMORY_MIB,
+    DISK_BUSES,
+    GRUB_DEBUG_SPEC,
+    HUGEPAGES_MOUNT,
+    KILL_BY_SIGNAL,
+    MEMORY_BACKINGS,
+    Commands,
+    PlatformPreview,
+    RunSettings,
+    SourceType,
+    benchmark_disk_buses,
+    build_image,
+    check_qemu_exit_code,
+    default_qemu,
+    detect_grub2_mkrescue,
+    find_grub2_platform_directory,
+    find_omvf_image,
+    grub2_platforms,
+    prepare_source,
+    qemu_target,
+    resolve_disk_bus,
+    run_qemu,
+    truncate_grub_debug_file,
+)
+from .profiler import STATIC_KERNEL_PLATFORMS
+from .render import iterate_menu_entries, render_background, render_theme
+from .staging import choose_staging_area, estimate_staging_bytes
 from .version import VERSION_STR
-from .which import which
 
-_PATH_IMAGE_ONLY_PNG = "themes/DEMO.png"
-_PATH_IMAGE_ONLY_TGA = "themes/DEMO.tga"
-_PATH_IMAGE_ONLY_JPEG = "themes/DEMO.jpeg"
-_PATH_FULL_THEME = "themes/DEMO"
-_GRUB_DEBUG_SPEC = "all,-efidisk,-lexer,-scripting,-verify"
+# Deadline for each boot of --benchmark-disk-bus and --profile unless --deadline-menu is given
+_IMPLIED_DEADLINE_MENU_SECONDS = 120
 
-_KILL_BY_SIGNAL = 128
+# Deadline for each unattended run (benchmarking, profiling, screenshots, comparison,
+# recording) unless --deadline-total is given, so that a hang cannot block CI forever
+_IMPLIED_DEADLINE_TOTAL_SECONDS = 600
 
-
-class _CommandNotFoundException(Exception):
-    def __init__(self, command, package=None):
-        self._command = command
-        self._package = package
-
-    def __str__(self):
-        if self._package is None:
-            return 'Command "%s" not found' % self._command
-        else:
-            return f'Command "{self._command}" of {self._package} not found'
-
-
-class _SourceType(Enum):
-    DIRECTORY = 1
-    FILE_PNG = 2
-    FILE_TGA = 3
-    FILE_JPEG = 4
-
-
-def _classify_source(abspath_source):
-    abspath_source_lower = abspath_source.lower()
-    if abspath_source_lower.endswith(".tga"):
-        return _SourceType.FILE_TGA
-    elif abspath_source_lower.endswith(".png"):
-        return _SourceType.FILE_PNG
-    elif abspath_source_lower.endswith(".jpeg"):
-        return _SourceType.FILE_JPEG
-    elif abspath_source_lower.endswith(".jpg"):
-        return _SourceType.FILE_JPEG
-    return _SourceType.DIRECTORY
-
-
-def _get_image_path_for(source_type):
-    if source_type == _SourceType.FILE_TGA:
-        return _PATH_IMAGE_ONLY_TGA
-    elif source_type == _SourceType.FILE_JPEG:
-        return _PATH_IMAGE_ONLY_JPEG
-    return _PATH_IMAGE_ONLY_PNG
+# Resolution of approximate renderings unless --resolution is given
+_DEFAULT_RENDER_RESOLUTION = (1024, 768)
 
 
 def _mkdir_if_missing(path):
@@ -78,182 +80,82 @@ def _mkdir_if_missing(path):
         raise
 
 
-def _run(cmd, verbose):
-    if verbose:
-        print("# %s" % " ".join(cmd))
-        stdout = None
-    else:
-        stdout = open("/dev/null", "w")
+def _compare_against_baseline(screenshot, abs_baseline, abs_diff, options):
+    """
+    Compare ``screenshot`` against the baseline image (recording it if missing);
+    return ``None`` on success or a description of the mismatch
+    """
+    if not os.path.exists(abs_baseline):
+        write_ppm(abs_baseline, screenshot)
+        print(f'INFO: Recorded new baseline at "{abs_baseline}".')
+        return None
+
+    baseline = read_ppm(abs_baseline)
+    comparison = compare_images(
+        baseline,
+        screenshot,
+        tolerance=options.compare_tolerance,
+        max_hash_distance=options.compare_max_hash_distance,
+        want_mask=abs_diff is not None,
+    )
+    print(f'INFO: Comparison against baseline "{abs_baseline}": {comparison.summary()}.')
 
-    try:
-        return subprocess.call(cmd, stdout=stdout, stderr=stdout)
-    except OSError as e:
-        if e.errno != errno.ENOENT:
-            raise
-        raise _CommandNotFoundException(cmd[0])
-    finally:
-        if not verbose:
-            stdout.close()
-
-
-def _generate_dummy_menu_entries():
-    return dedent("""\
-        menuentry 'Debian' --class debian --class gnu-linux --class linux --class gnu --class os {
-            reboot
-        }
-
-        menuentry 'FreeBSD' --class freebsd --class bsd --class os {
-            reboot
-        }
-
-        menuentry 'Gentoo' --class gentoo --class gnu-linux --class linux --class gnu --class os {
-            reboot
-        }
-
-        menuentry 'macOS' --class macos --class darwin --class os {
-            reboot
-        }
-
-        menuentry 'Memtest86+' --class memtest {
-            reboot
-        }
-
-        menuentry 'Windows' --class windows --class os {
-            reboot
-        }
-    """)
-
-
-def _make_grub_cfg_load_our_theme(
-    grub_cfg_content,
-    source_type,
-    resolution_or_none,
-    font_files_to_load,
-    timeout_seconds,
-    serial_grub_debug,
-):
-    prolog_chunks = []
-    if serial_grub_debug:
-        # Adding debug to GRUB's config emits it on serial and QEMU -serial file records COM1.
-        # See https://www.gnu.org/software/grub/manual/grub/html_node/serial.html
-        prolog_chunks.append(f"set debug={_GRUB_DEBUG_SPEC}")
-        prolog_chunks.append("serial")
-
-    # NOTE: The last font loaded becomes the default/fallback font
-    #       So if we load fonts first, the remaining default font
-    #       will remain unchanged and the theme will display unchanged.
-    prolog_chunks.append("loadfont $prefix/fonts/unicode.pf2")
-
-    for relative_path in font_files_to_load:
-        prolog_chunks.append(f"loadfont $prefix/{_PATH_FULL_THEME}/{relative_path}")
-
-    prolog_chunks += [
-        "insmod all_video",
-        "insmod gfxterm",
-        "insmod png",
-        "insmod tga",
-        "insmod jpeg",
-    ]
+    if abs_diff is not None and not comparison.size_mismatch:
+        write_ppm(abs_diff, make_diff_image(screenshot, comparison))
+        print(f'INFO: Wrote diff image to file "{abs_diff}".')
 
-    terminal_output_line = "terminal_output gfxterm"
-    if serial_grub_debug:
-        terminal_output_line += " serial"
-
-    if resolution_or_none is not None:
-        # We need to be the first call to 'terminal_output gfxterm'
-        # if we want to have a say with resolution
-        prolog_chunks.append("set gfxmode=%dx%d" % resolution_or_none)
-        prolog_chunks.append(terminal_output_line)
-
-    prolog_chunks.append("")  # blank line
-    prolog_chunks.append("")  # trailing new line
-
-    epilog_chunks = [
-        # Ensure that we always have one or more menu entries
-        "",
-        "submenu 'Reboot / Shutdown' --class shutdown {",
-        "    menuentry Reboot --class restart { reboot }",
-        "    menuentry Shutdown --class shutdown { halt }",
-        "}",
-        "",
-        "set default=0",  # i.e. move cursor to first entry
-        "set timeout=%d" % timeout_seconds,
-    ]
+    if not comparison.passed(options.compare_max_changed_percent / 100.0):
+        return f'Screenshot does not match baseline "{abs_baseline}" ({comparison.summary()}).'
+    return None
 
-    if resolution_or_none is None:
-        # If we haven't ensured GFX mode earlier, do it now
-        # so it's done at least once
-        epilog_chunks.append(terminal_output_line)
 
-    if source_type == _SourceType.DIRECTORY:
-        epilog_chunks.append("set theme=$prefix/%s/theme.txt" % _PATH_FULL_THEME)
-    else:
-        epilog_chunks.append("background_image $prefix/%s" % _get_image_path_for(source_type))
-
-    # Make sure that lines like "set root='hd0,msdos1'" do not get us
-    # into unnecessary "unknown filesystem" error situations
-    grub_cfg_content = re.sub(
-        "^([ \\t]*set root=)(.+)",
-        "\\1'hd0'  # replaced by grub2-theme-preview, was \\2",
-        grub_cfg_content,
-        flags=re.MULTILINE,
-    )
-
-    return "\n".join(prolog_chunks) + grub_cfg_content + "\n".join(epilog_chunks)
-
-
-def _make_final_grub_cfg_content(
-    source_type,
-    source_grub_cfg,
-    resolution_or_none,
-    font_files_to_load,
-    timeout_seconds,
-    serial_grub_debug,
-):
-    if source_grub_cfg is not None:
-        files_to_try_to_read = [source_grub_cfg]
-        fail_if_missing = True
-    else:
-        files_to_try_to_read = [
-            "/boot/grub2/grub.cfg",
-            "/boot/grub/grub.cfg",
-        ]
-        fail_if_missing = False
+def _process_screenshots(previews, options):
+    previews = [preview for preview in previews if preview.screenshot is not None]
+    if not previews:
+        return
 
-    for candidate in files_to_try_to_read:
-        if not os.path.exists(candidate):
-            if fail_if_missing:
-                print(
-                    "ERROR: [Errno %d] %s: '%s'"
-                    % (errno.ENOENT, os.strerror(errno.ENOENT), candidate),
-                    file=sys.stderr,
-                )
-                sys.exit(1)
-            continue
+    if options.screenshot is not None:
+        # NOTE: With multiple platforms, screenshots are paired up left to right
+        write_ppm(
+            options.screenshot,
+            combine_side_by_side([preview.screenshot for preview in previews]),
+        )
+        print(f'INFO: Wrote screenshot to file "{options.screenshot}".')
 
-        try:
-            f = open(candidate)
-            content = f.read()
-            f.close()
-        except OSError as e:
-            print("INFO: %s" % str(e))
-        else:
-            break
-    else:
-        print(
-            "INFO: Could not read external GRUB config file"
-            ", falling back to internal example config"
+    if options.compare_baseline is None:
+        return
+
+    mismatches = []
+    for preview in previews:
+        mismatch = _compare_against_baseline(
+            preview.screenshot, preview.abs_compare_baseline, preview.abs_compare_diff, options
         )
-        content = _generate_dummy_menu_entries()
+        if mismatch is not None:
+            mismatches.append(mismatch)
+    if mismatches:
+        raise BaselineMismatchError(mismatches)
 
-    return _make_grub_cfg_load_our_theme(
-        content,
-        source_type,
-        resolution_or_none,
-        font_files_to_load,
-        timeout_seconds,
-        serial_grub_debug,
-    )
+
+def _format_timing_report(previews):
+    """
+    Return a table of per-platform image build time, time to menu and QEMU runtime
+    """
+
+    def format_seconds(value):
+        return "%8s" % "-" if value is None else "%8.2f" % value
+
+    lines = ["%-16s %8s %8s %8s" % ("platform", "build", "menu", "run")]
+    for preview in previews:
+        lines.append(
+            "%-16s %s %s %s"
+            % (
+                preview.grub2_platform,
+                format_seconds(preview.build_seconds),
+                format_seconds(preview.menu_seconds),
+                format_seconds(preview.run_seconds),
+            )
+        )
+    return "\n".join(lines)
 
 
 def resolution(text):
@@ -272,17 +174,70 @@ def timeout(text):
     return seconds
 
 
-def iterate_pf2_files_relative(abs_theme_dir):
-    # Imitate /etc/grub.d/00_header:
-    # for x in "$themedir"/*.pf2 "$themedir"/f/*.pf2; do
-    for pattern in (
-        os.path.join(abs_theme_dir, "*.pf2"),
-        os.path.join(abs_theme_dir, "f", "*.pf2"),
-    ):
-        for path in sorted(glob.iglob(pattern), key=lambda path: path.lower()):
-            relative_path = os.path.relpath(path, abs_theme_dir)
-            print("INFO: Appending to fonts to load: %s" % relative_path)
-            yield relative_path
+def seconds(text):
+    value = float(text)
+    if value < 0:
+        raise ValueError('Not a non-negative number of seconds: "%s"' % text)
+    return value
+
+
+def frame_rate(text):
+    value = int(text)
+    if not 1 <= value <= 60:
+        raise ValueError('Not a frame rate in range 1 to 60: "%s"' % text)
+    return value
+
+
+def qemu_keys(text):
+    keys = text.split(",")
+    for key in keys:
+        if not re.match("^[a-z0-9_]+$", key):
+            raise ValueError('Not a QEMU key code: "%s"' % key)
+    return tuple(keys)
+
+
+def sampling_rate(text):
+    value = int(text)
+    if not 1 <= value <= 1000:
+        raise ValueError('Not a sampling rate in range 1 to 1000: "%s"' % text)
+    return value
+
+
+def memory_size(text):
+    if text == "auto":
+        return text
+    value = int(text)
+    if not 32 <= value <= 65536:
+        raise ValueError('Not a memory size in range 32 to 65536 MiB: "%s"' % text)
+    return value
+
+
+def repeat_count(text):
+    value = int(text)
+    if value < 1:
+        raise ValueError('Not a positive count: "%s"' % text)
+    return value
+
+
+def channel_delta(text):
+    value = int(text)
+    if not 0 <= value <= 255:
+        raise ValueError('Not a channel delta in range 0 to 255: "%s"' % text)
+    return value
+
+
+def percentage(text):
+    value = float(text)
+    if not 0 <= value <= 100:
+        raise ValueError('Not a percentage in range 0 to 100: "%s"' % text)
+    return value
+
+
+def hash_distance(text):
+    value = int(text)
+    if not 0 <= value <= 64:
+        raise ValueError('Not a hash distance in range 0 to 64: "%s"' % text)
+    return value
 
 
 def validate_grub2_mkrescue_addition(candidate: str) -> str:
@@ -295,7 +250,7 @@ def validate_grub2_mkrescue_addition(candidate: str) -> str:
 validate_grub2_mkrescue_addition.__name__ = "grub2-mkrescue addition"
 
 
-def parse_command_line(argv):
+def _make_argument_parser():
     parser = ArgumentParser(
         prog="grub2-theme-preview",
         formatter_class=RawDescriptionHelpFormatter,
@@ -308,6 +263,8 @@ def parse_command_line(argv):
                                 (default: "/usr/lib/grub")
           G2TP_OVMF_IMAGE       Path of OVMF image file (default: auto-detect)
                                 (e.g. "/usr/share/[..]/OVMF_CODE.fd")
+          G2TP_CACHE_DIR        Path of cache directory
+                                (default: "~/.cache/grub2-theme-preview")
 
         Software libre licensed under GPL v2 or later.
         Brought to you by Sebastian Pipping <sebastian@pipping.org>.
@@ -327,6 +284,16 @@ def parse_command_line(argv):
         type=resolution,
         help="set a custom resolution, e.g. 800x600",
     )
+    parser.add_argument(
+        "--platform",
+        dest="platform_choice",
+        choices=("auto", "bios", "efi", "both"),
+        default="auto",
+        help="GRUB platform to preview on:"
+        ' "bios" for i386-pc, "efi" for <machine>-efi with OVMF,'
+        ' "both" for building and running both side by side,'
+        ' "auto" for the platform the host was booted with (default: %(default)s)',
+    )
     parser.add_argument(
         "--timeout",
         metavar="SECONDS",
@@ -349,7 +316,27 @@ def parse_command_line(argv):
         ),
     )
     parser.add_argument(
-        "source", metavar="PATH", help="path of theme directory (or PNG/TGA image file) to preview"
+        "--incremental",
+        default=False,
+        action="store_true",
+        help="keep the last rescue image per platform in the cache directory"
+        " and update only the files that changed since, through xorriso;"
+        " rebuild from scratch when GRUB's platform directory"
+        " or the grub-mkrescue/xorriso commands change",
+    )
+    parser.add_argument(
+        "--staging",
+        choices=("auto", "ram", "disk"),
+        default="auto",
+        help="where to assemble the rescue image:"
+        ' "ram" for tmpfs at /dev/shm, "disk" for the temporary directory,'
+        ' "auto" for RAM if there is enough room (default: %(default)s)',
+    )
+    parser.add_argument(
+        "source",
+        metavar="PATH",
+        help="path of theme directory (or PNG/TGA image file,"
+        " or .tar[.gz|.xz|.bz2]/.zip theme archive) to preview",
     )
     parser.add_argument("--version", action="version", version="%(prog)s " + VERSION_STR)
 
@@ -360,6 +347,12 @@ def parse_command_line(argv):
     commands.add_argument(
         "--qemu", metavar="COMMAND", help="KVM/QEMU command (default: qemu-system-<machine>)"
     )
+    commands.add_argument(
+        "--ffmpeg",
+        default="ffmpeg",
+        metavar="COMMAND",
+        help="ffmpeg command used by --record (default: %(default)s)",
+    )
     commands.add_argument(
         "--xorriso",
         default="xorriso",
@@ -376,6 +369,15 @@ def parse_command_line(argv):
         " (default: use QEMU's default display, hopefully either GTK or SDL)",
     )
 
+    qemu.add_argument(
+        "--capture",
+        choices=("qmp", "vnc"),
+        help="how to capture frames for screenshots, comparison and recording:"
+        ' "qmp" writes a PPM file per frame through QMP "screendump",'
+        ' "vnc" keeps an in-memory framebuffer updated through VNC'
+        ' (default: "vnc" with --record or --benchmark, "qmp" otherwise)',
+    )
+
     qemu.add_argument(
         "--full-screen",
         dest="qemu_full_screen",
@@ -393,6 +395,36 @@ def parse_command_line(argv):
         " which is significantly slower than KVM)",
     )
 
+    qemu.add_argument(
+        "--disk-bus",
+        choices=("auto",) + DISK_BUSES,
+        default="auto",
+        help="how to attach the rescue image to the virtual machine:"
+        " as an IDE, AHCI (SATA) or virtio-blk disk, or as a CD-ROM;"
+        " auto uses the attachment that --benchmark-disk-bus last measured fastest"
+        f" for the platform, or {DEFAULT_DISK_BUS} if none (default: %(default)s)",
+    )
+
+    qemu.add_argument(
+        "--memory",
+        metavar="MIB",
+        type=memory_size,
+        default="auto",
+        help='guest memory in MiB, or "auto" to size it from the decoded theme images'
+        " at --resolution plus the fonts (default: %(default)s)",
+    )
+
+    qemu.add_argument(
+        "--memory-backing",
+        choices=MEMORY_BACKINGS,
+        default="ram",
+        help='how QEMU backs guest memory: "ram" allocates on demand,'
+        ' "prealloc" allocates all of it up front'
+        f' and "hugepages" does so from huge pages at {HUGEPAGES_MOUNT},'
+        " for steadier timings with --benchmark and --benchmark-disk-bus"
+        " (default: %(default)s)",
+    )
+
     qemu.add_argument(
         "--vga",
         dest="qemu_vga",
@@ -401,6 +433,196 @@ def parse_command_line(argv):
         " (default: use QEMU's default VGA card)",
     )
 
+    screenshots = parser.add_argument_group("screenshot and comparison arguments")
+    screenshots.add_argument(
+        "--screenshot",
+        metavar="PATH",
+        help="save a PPM screenshot of the settled GRUB screen to PATH and quit QEMU"
+        " (with --platform both, screenshots are placed side by side;"
+        ' implies "-display none" unless --display is given)',
+    )
+    screenshots.add_argument(
+        "--screenshot-delay",
+        metavar="SECONDS",
+        type=seconds,
+        default=3.0,
+        help="time to wait before polling the screen for it to settle"
+        " (default: %(default)s seconds)",
+    )
+    screenshots.add_argument(
+        "--record",
+        metavar="PATH",
+        help="record the screen to video file PATH (e.g. .gif, .webm or .mp4) using ffmpeg"
+        ' (requires "--capture vnc"; implies "-display none" unless --display is given)',
+    )
+    screenshots.add_argument(
+        "--record-seconds",
+        metavar="SECONDS",
+        type=seconds,
+        default=10.0,
+        help="duration of recording (default: %(default)s seconds)",
+    )
+    screenshots.add_argument(
+        "--record-fps",
+        metavar="FPS",
+        type=frame_rate,
+        default=10,
+        help="frames per second of recording (default: %(default)s)",
+    )
+    screenshots.add_argument(
+        "--compare-baseline",
+        metavar="PATH",
+        help="compare the settled GRUB screen against PPM image PATH"
+        " and fail on mismatch; records PATH if missing"
+        " (with --platform both, PATH gets the platform inserted"
+        ' before its extension, e.g. "baseline.i386-pc.ppm", as do'
+        " --compare-diff, --record, --size-baseline and --grub-debug-file)"
+        ' (implies "-display none" unless --display is given)',
+    )
+    screenshots.add_argument(
+        "--compare-diff",
+        metavar="PATH",
+        help="write a PPM image highlighting changed pixels in red to PATH",
+    )
+    screenshots.add_argument(
+        "--compare-tolerance",
+        metavar="DELTA",
+        type=channel_delta,
+        default=0,
+        help="ignore per-channel differences up to DELTA (default: %(default)s)",
+    )
+    screenshots.add_argument(
+        "--compare-max-changed",
+        dest="compare_max_changed_percent",
+        metavar="PERCENT",
+        type=percentage,
+        default=0.0,
+        help="accept up to PERCENT changed pixels (default: %(default)s)",
+    )
+    screenshots.add_argument(
+        "--compare-max-hash-distance",
+        metavar="BITS",
+        type=hash_distance,
+        help="skip exact per-pixel counting when the perceptual hashes"
+        " differ in more than BITS of 64 bits (default: always count)",
+    )
+    screenshots.add_argument(
+        "--render",
+        metavar="PATH",
+        help="render an approximation of the theme to PNG image PATH"
+        " without building a rescue image or starting QEMU;"
+        " with --screenshot or --compare-baseline the virtual machine is run as well"
+        " and the approximation is compared to its screen"
+        " (uses Pillow and numpy if installed; without Pillow, JPEG images are left out"
+        " and decoding large PNG images with Average or Paeth filtered rows takes seconds)",
+    )
+
+    fonts = parser.add_argument_group("font arguments")
+    fonts.add_argument(
+        "--check-fonts",
+        default=False,
+        action="store_true",
+        help="report the fonts to load with their size and the menu entry titles"
+        " and theme texts that they lack glyphs for, without starting QEMU"
+        " (unless --screenshot or --compare-baseline is given)",
+    )
+
+    sizes = parser.add_argument_group("image size arguments")
+    sizes.add_argument(
+        "--size-report",
+        default=False,
+        action="store_true",
+        help="report how the bytes of the rescue image divide up into GRUB modules,"
+        " fonts, theme files, --add grafts, grub.cfg (including boot loader entries)"
+        " and boot files, as listed by xorriso",
+    )
+    sizes.add_argument(
+        "--size-report-top",
+        metavar="COUNT",
+        type=repeat_count,
+        default=10,
+        help="number of largest files and changes to list (default: %(default)s)",
+    )
+    sizes.add_argument(
+        "--size-baseline",
+        metavar="PATH",
+        help="compare the size report against JSON file PATH"
+        " from an earlier run, or record PATH if missing (implies --size-report)",
+    )
+
+    supervision = parser.add_argument_group("supervision arguments")
+    supervision.add_argument(
+        "--deadline-menu",
+        metavar="SECONDS",
+        type=seconds,
+        help="fail if the GRUB menu has not shown up within SECONDS after starting QEMU"
+        " (detected through a marker on the serial port and the screen settling"
+        " after it changed; default: no deadline)",
+    )
+    supervision.add_argument(
+        "--deadline-total",
+        metavar="SECONDS",
+        type=seconds,
+        help="shut QEMU down and fail once it ran for SECONDS, 0 for no deadline"
+        f" (default: {_IMPLIED_DEADLINE_TOTAL_SECONDS} seconds plus --record-seconds"
+        " with --benchmark-disk-bus, --profile, screenshots, comparison, recording"
+        " or --benchmark; no deadline otherwise)",
+    )
+
+    benchmarking = parser.add_argument_group("benchmarking arguments")
+    benchmarking.add_argument(
+        "--benchmark",
+        default=False,
+        action="store_true",
+        help="once the menu has settled, send key presses through QMP"
+        " and report per-key time until the screen stops changing"
+        ' (requires "--capture vnc"; implies "-display none" unless --display is given)',
+    )
+    benchmarking.add_argument(
+        "--benchmark-keys",
+        metavar="KEY,KEY,..",
+        type=qemu_keys,
+        default=DEFAULT_KEYS,
+        help="QEMU key codes to press in order (default: %s)" % ",".join(DEFAULT_KEYS),
+    )
+    benchmarking.add_argument(
+        "--benchmark-repeat",
+        metavar="COUNT",
+        type=repeat_count,
+        default=5,
+        help="number of times to press the whole key sequence"
+        " or to boot from each storage attachment (default: %(default)s)",
+    )
+    benchmarking.add_argument(
+        "--benchmark-disk-bus",
+        default=False,
+        action="store_true",
+        help="boot the rescue image from each storage attachment of --disk-bus in turn,"
+        " report the time until the themed GRUB menu has been drawn"
+        " (as seen through QMP screen dumps), record the fastest attachment"
+        " per platform for --disk-bus auto and quit"
+        f" (implies --deadline-menu {_IMPLIED_DEADLINE_MENU_SECONDS} unless given;"
+        ' implies "-display none" unless --display is given)',
+    )
+
+    profiling = parser.add_argument_group("profiling arguments")
+    profiling.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="sample the guest program counter through QEMU's gdbstub until the themed menu"
+        " has been drawn and write the samples to PATH as folded stacks for flamegraph tools"
+        f" (implies --deadline-menu {_IMPLIED_DEADLINE_MENU_SECONDS} unless given;"
+        " functions are resolved with the .mod files of the GRUB platform directory;"
+        ' BIOS only, i.e. requires "--platform bios" on EFI machines)',
+    )
+    profiling.add_argument(
+        "--profile-rate",
+        metavar="HZ",
+        type=sampling_rate,
+        default=100,
+        help="samples per second for --profile (default: %(default)s)",
+    )
+
     debugging = parser.add_argument_group("debugging arguments")
     debugging.add_argument(
         "--debug", default=False, action="store_true", help="enable debugging output"
@@ -419,87 +641,163 @@ def parse_command_line(argv):
         help=(
             "QEMU `-serial file:PATH` writes the virtual machine's COM1 to PATH "
             "(file is truncated each run); generated grub.cfg adds "
-            f"set debug={_GRUB_DEBUG_SPEC} plus serial/mirroring directives. "
+            f"set debug={GRUB_DEBUG_SPEC} plus serial/mirroring directives. "
             "Breaks normal preview operation, only use for debugging GRUB itself."
         ),
     )
 
-    options = parser.parse_args(argv[1:])
+    return parser
 
-    if options.grub_debug_file is not None:
-        options.grub_debug_file = os.path.abspath(options.grub_debug_file)
 
-    if options.qemu is None:
-        import platform
+def _is_capture_requested(options):
+    return options.benchmark or any(
+        path is not None for path in (options.screenshot, options.compare_baseline, options.record)
+    )
 
-        options.qemu = "qemu-system-%s" % platform.machine()
 
-    if options.grub2_mkrescue is None:
-        try:
-            which("grub2-mkrescue")
-        except OSError:
-            options.grub2_mkrescue = "grub-mkrescue"  # without "2"
-        else:
-            options.grub2_mkrescue = "grub2-mkrescue"  # with "2"
+def _make_commands(options):
+    return Commands(options.grub2_mkrescue, options.qemu, options.xorriso, options.ffmpeg)
+
+
+def _make_run_settings(options):
+    return RunSettings(
+        enable_kvm=options.enable_kvm,
+        display=options.qemu_display,
+        vga=options.qemu_vga,
+        full_screen=options.qemu_full_screen,
+        memory_backing=options.memory_backing,
+        headless=options.benchmark_disk_bus,
+        capture=options.capture,
+        screenshot=options.screenshot is not None or options.compare_baseline is not None,
+        screenshot_delay=options.screenshot_delay,
+        record_fps=options.record_fps,
+        record_seconds=options.record_seconds,
+        benchmark=options.benchmark,
+        benchmark_keys=options.benchmark_keys,
+        benchmark_repeat=options.benchmark_repeat,
+        deadline_menu=options.deadline_menu,
+        deadline_total=options.deadline_total,
+        profile_rate=options.profile_rate,
+        verbose=options.verbose,
+    )
 
-    return options
 
+def _make_platform_preview(grub2_platform, abs_tmp_folder, options, multiple_platforms):
+    def specific(path):
+        if path is None or not multiple_platforms:
+            return path
+        root, extension = os.path.splitext(path)
+        return f"{root}.{grub2_platform}{extension}"
+
+    return PlatformPreview(
+        grub2_platform,
+        abs_tmp_folder,
+        disk_bus=resolve_disk_bus(options.disk_bus, grub2_platform),
+        memory_mib=DEFAULT_MEMORY_MIB if options.memory == "auto" else options.memory,
+        serial_menu_marker=options.deadline_menu is not None,
+        abs_record_file=specific(options.record),
+        abs_compare_baseline=specific(options.compare_baseline),
+        abs_compare_diff=specific(options.compare_diff),
+        abs_grub_debug_file=specific(options.grub_debug_file),
+        abs_size_baseline=specific(options.size_baseline),
+        abs_profile_file=specific(options.profile),
+    )
 
-def _candidate_grub2_image_directories(platform):
-    try:
-        candidate_dirs = [
-            os.environ["G2TP_GRUB_LIB"],
-        ]
-    except KeyError:
-        candidate_dirs = [
-            "/usr/share/grub2",  # openSUSE
-            "/usr/lib/grub",  # everyone else
-        ]
-    return [f"{d}/{platform}" for d in candidate_dirs]
 
+def parse_command_line(argv):
+    parser = _make_argument_parser()
+    options = parser.parse_args(argv[1:])
 
-def _grub2_platform():
-    if os.path.exists("/sys/firmware/efi"):
-        _cpu = platform.machine()
-        _platform = "efi"
-    else:
-        # for BIOS-based machines
-        # https://www.gnu.org/software/grub/manual/grub/grub.html#Installation
-        _cpu = "i386"
-        _platform = "pc"
-    return f"{_cpu}-{_platform}"
+    if options.grub_debug_file is not None:
+        options.grub_debug_file = os.path.abspath(options.grub_debug_file)
 
+    if options.capture is None:
+        options.capture = "vnc" if options.record is not None or options.benchmark else "qmp"
+    elif options.capture != "vnc":
+        if options.record is not None:
+            parser.error('argument --record: requires "--capture vnc"')
+        if options.benchmark:
+            parser.error('argument --benchmark: requires "--capture vnc"')
+
+    if options.benchmark_disk_bus:
+        if options.plain_rescue_image:
+            parser.error(
+                "argument --benchmark-disk-bus: not allowed with argument --plain-rescue-image"
+            )
+        if _is_capture_requested(options):
+            parser.error(
+                "argument --benchmark-disk-bus: not allowed with screenshots,"
+                " comparison, recording or --benchmark"
+            )
+        if options.deadline_menu is None:
+            options.deadline_menu = _IMPLIED_DEADLINE_MENU_SECONDS
+
+    if options.profile is not None:
+        if options.plain_rescue_image:
+            parser.error("argument --profile: not allowed with argument --plain-rescue-image")
+        if options.deadline_menu is None:
+            options.deadline_menu = _IMPLIED_DEADLINE_MENU_SECONDS
+
+    if options.deadline_total == 0:
+        options.deadline_total = None
+    elif options.deadline_total is None and (
+        options.benchmark_disk_bus or options.profile is not None or _is_capture_requested(options)
+    ):
+        options.deadline_total = _IMPLIED_DEADLINE_TOTAL_SECONDS
+        if options.record is not None:
+            options.deadline_total += options.record_seconds
+
+    if options.deadline_menu is not None and options.plain_rescue_image:
+        parser.error("argument --deadline-menu: not allowed with argument --plain-rescue-image")
+
+    if options.render is not None and options.plain_rescue_image:
+        parser.error("argument --render: not allowed with argument --plain-rescue-image")
+
+    if options.check_fonts and options.plain_rescue_image:
+        parser.error("argument --check-fonts: not allowed with argument --plain-rescue-image")
+
+    if options.size_baseline is not None:
+        options.size_report = True
+
+    for name in (
+        "screenshot",
+        "compare_baseline",
+        "compare_diff",
+        "record",
+        "size_baseline",
+        "render",
+        "profile",
+    ):
+        if getattr(options, name) is not None:
+            setattr(options, name, os.path.abspath(getattr(options, name)))
 
-def _grub2_ovmf_tuple():
-    """
-    Returns a 3-tuple with:
-    1. the absolute filename of the OVMF image to use or None if missing
-    2. a display hint for humans where the file is located, roughly
-    3. a list of package names to try install, potentially
-    """
-    omvf_image = os.environ.get("G2TP_OVMF_IMAGE")
-    if omvf_image is not None:  # Support non-standard locations e.g. NixOS
-        candidates = [omvf_image]
-    else:
-        candidates = [
-            "/usr/share/edk2-ovmf/OVMF_CODE.fd",  # Gentoo and its derivatives
-            "/usr/share/edk2-ovmf/x64/OVMF_CODE.fd",  # Older Arch Linux and its derivatives
-            "/usr/share/edk2/x64/OVMF.4m.fd",  # Arch Linux and its derivatives
-            "/usr/share/edk2/x64/OVMF_CODE.4m.fd",  # Arch Linux and its derivatives
-            "/usr/share/OVMF/OVMF_CODE.fd",  # Older Debian and its derivatives
-            "/usr/share/OVMF/OVMF_CODE_4M.fd",  # Debian and its derivatives
-            "/usr/share/edk2/ovmf/OVMF_CODE.fd",  # Fedora (and its derivatives?)
-            "/usr/share/qemu/edk2-x86_64-code.fd",  # Void Linux
-            "/usr/share/qemu/ovmf-x86_64.bin",  # openSUSE (and its derivatives?)
-            "/usr/share/qemu/ovmf-x86_64-4m.bin",  # openSUSE (and its derivatives?)
-            "/usr/share/qemu/ovmf-x86_64-sev.bin",  # openSUSE (and its derivatives?)
+    if options.qemu is None:
+        options.qemu = default_qemu()
+    if options.grub2_mkrescue is None:
+        options.grub2_mkrescue = detect_grub2_mkrescue()
+
+    if options.profile is not None and qemu_target(options.qemu) not in PC_REGISTERS:
+        parser.error(
+            "argument --profile: QEMU target not supported, supported are: "
+            + ", ".join(sorted(PC_REGISTERS))
+        )
+
+    if options.profile is not None:
+        unsupported_platforms = [
+            grub2_platform
+            for grub2_platform in grub2_platforms(options.platform_choice)
+            if grub2_platform not in STATIC_KERNEL_PLATFORMS
         ]
+        if unsupported_platforms:
+            parser.error(
+                f"argument --profile: GRUB platform {', '.join(unsupported_platforms)}"
+                " not supported, as its kernel is relocated at load time;"
+                " supported are: "
+                + ", ".join(sorted(STATIC_KERNEL_PLATFORMS))
+                + ' (i.e. "--platform bios")'
+            )
 
-    for candidate in candidates:
-        if os.path.exists(candidate):
-            return candidate, None, []
-    else:
-        return None, "/usr/share/[..]/OVMF_CODE.fd", ["edk2-ovmf", "ovmf"]
+    return options
 
 
 def _dump_grub_cfg_content(grub_cfg_content, target):
@@ -511,192 +809,241 @@ def _dump_grub_cfg_content(grub_cfg_content, target):
     print(file=target)
 
 
-def _require_recursive_read_access_at(abs_path):
-    for root, directories, files in os.walk(abs_path):
-        for basename in directories + files:
-            abs_path = os.path.join(root, basename)
-            if not os.access(abs_path, os.R_OK):
-                raise OSError(errno.EACCES, "Permission denied: '%s'" % abs_path)
+def _report_image_size(preview, options):
+    baseline = None
+    if preview.abs_size_baseline is not None and os.path.exists(preview.abs_size_baseline):
+        with open(preview.abs_size_baseline) as f:
+            baseline = ImageSizeReport.from_json(f.read())
 
+    print(f"INFO: Size of the rescue image for {preview.grub2_platform} in bytes:")
+    print(preview.size_report.format(options.size_report_top, baseline))
 
-def truncate_grub_debug_file(abs_path):
-    try:
-        with open(abs_path, "wb"):
-            pass
-    except OSError as e:
-        raise OSError(
-            e.errno,
-            f"Cannot create or truncate grub serial capture '{abs_path}': {e}",
+    if preview.abs_size_baseline is not None and baseline is None:
+        with open(preview.abs_size_baseline, "w") as f:
+            print(preview.size_report.to_json(), file=f)
+        print(f'INFO: Recorded new size baseline at "{preview.abs_size_baseline}".')
+
+
+async def _preview_on_all_platforms(previews, commands, options, theme, abs_grub_cfg_file):
+    """
+    Build the rescue images of all platforms in parallel,
+    then run all of their virtual machines at the same time
+    """
+    settings = _make_run_settings(options)
+    grafts = (
+        []
+        if options.plain_rescue_image
+        else theme.make_grafts(abs_grub_cfg_file, options.addition_requests)
+    )
+    await asyncio.gather(
+        *(
+            build_image(
+                preview,
+                commands,
+                grafts,
+                incremental=options.incremental and not options.plain_rescue_image,
+                size_report=options.size_report,
+                addition_requests=options.addition_requests,
+                verbose=options.verbose,
+            )
+            for preview in previews
         )
+    )
 
+    for preview in previews:
+        if preview.size_report is not None:
+            _report_image_size(preview, options)
 
-def _inner_main(options):
-    for command, package in (
-        (options.grub2_mkrescue, "Grub 2.x"),
-        ("mcopy", "mtools"),  # see issue #8
-        ("mformat", "mtools"),  # see issue #8
-        (options.qemu, "KVM/QEMU"),
-        (options.xorriso, "libisoburn"),
-    ):
-        try:
-            which(command)
-        except OSError:
-            raise _CommandNotFoundException(command, package)
+        if preview.abs_grub_debug_file is not None:
+            # Truncate any previous output so each run writes a fresh log
+            truncate_grub_debug_file(preview.abs_grub_debug_file)
 
-    normalized_source = os.path.normpath(os.path.abspath(options.source))
+    if options.benchmark_disk_bus:
+        await benchmark_disk_buses(previews, commands, settings)
+        return
 
-    source_type = _classify_source(options.source)
+    print("INFO: Please give GRUB a moment to show up in QEMU...")
 
-    if source_type != _SourceType.DIRECTORY:
-        font_files_to_load = []
-    else:
-        font_files_to_load = list(iterate_pf2_files_relative(normalized_source))
+    await asyncio.gather(*(run_qemu(preview, commands, settings) for preview in previews))
 
-    vm_serial_capture_path = options.grub_debug_file
-    serial_grub_debug = vm_serial_capture_path is not None
 
-    abs_grub_cfg_or_none = options.grub_cfg and os.path.abspath(options.grub_cfg)
-    grub_cfg_content = _make_final_grub_cfg_content(
-        source_type,
-        abs_grub_cfg_or_none,
-        options.resolution,
-        font_files_to_load,
-        options.timeout_seconds,
-        serial_grub_debug,
+def _prepare_source(options):
+    """
+    Return the ``preview.ThemeSource`` of the theme or image to preview
+    """
+    theme = prepare_source(
+        options.source,
+        grub_cfg=options.grub_cfg,
+        resolution=options.resolution,
+        timeout_seconds=options.timeout_seconds,
+        serial_grub_debug=options.grub_debug_file is not None,
+        serial_menu_marker=options.deadline_menu is not None,
     )
     if options.debug:
-        _dump_grub_cfg_content(grub_cfg_content, target=sys.stderr)
+        _dump_grub_cfg_content(theme.grub_cfg_content, target=sys.stderr)
+    return theme
+
+
+def _size_guest_memory(previews, options, theme):
+    """
+    Size the guest memory of each preview for the theme unless given by --memory
+    """
+    if options.memory != "auto":
+        print(f"INFO: Guest memory: {options.memory} MiB.")
+        return
+    abs_picture_paths = list(iterate_theme_pictures(theme.abs_path))
+    abs_font_paths = theme.abs_font_paths()
+    for preview in previews:
+        estimate = estimate_guest_memory(
+            preview.grub2_platform, abs_picture_paths, abs_font_paths, options.resolution
+        )
+        preview.memory_mib = estimate.mib
+        print(
+            f"INFO: Guest memory for {preview.grub2_platform}: {estimate.mib} MiB"
+            f" ({estimate.describe()})."
+        )
+
+
+def _check_fonts(options, theme):
+    font_set = FontSet(theme.abs_font_paths())
+    uses = collect_text_uses(theme.abs_theme_txt, theme.grub_cfg_content, options.timeout_seconds)
+    print("INFO: Fonts loaded (in order) and their glyph coverage:")
+    print(format_font_report(font_set, check_glyph_coverage(font_set, uses)))
+
+
+def _render_approximation(options, theme):
+    """
+    Render the theme and write it to PNG file ``options.render``;
+    return the rendering or ``None`` for unsupported sources
+    """
+    if theme.source_type == SourceType.FILE_JPEG and not is_jpeg_supported():
+        print("INFO: Skipping approximate rendering, JPEG images need Pillow.")
+        return None
+
+    resolution = options.resolution or _DEFAULT_RENDER_RESOLUTION
+    start_time = time.monotonic()
+    if theme.source_type == SourceType.DIRECTORY:
+        rendering = render_theme(
+            theme.abs_theme_txt,
+            theme.abs_font_paths(),
+            iterate_menu_entries(theme.grub_cfg_content),
+            resolution,
+            options.timeout_seconds,
+        )
+    else:
+        rendering = render_background(theme.abs_path, resolution)
+    write_png(options.render, rendering)
+    print(
+        f'INFO: Rendered an approximation of the theme to file "{options.render}"'
+        f" in {time.monotonic() - start_time:.2f} seconds."
+    )
+    return rendering
+
 
-    abs_tmp_folder = tempfile.mkdtemp()
+def _report_render_accuracy(rendering, previews):
+    for preview in previews:
+        if preview.screenshot is None:
+            continue
+        comparison = compare_images(preview.screenshot, rendering)
+        print(
+            f"INFO: Approximate rendering versus {preview.grub2_platform} screen:"
+            f" {comparison.summary()}."
+        )
+
+
+def _inner_main(options):
+    # NOTE: Rendering and font checks need no virtual machine unless its screen is wanted
+    offline_only = (
+        (options.render is not None or options.check_fonts)
+        and options.screenshot is None
+        and options.compare_baseline is None
+    )
+    commands = _make_commands(options)
+    if not offline_only:
+        commands.check(ffmpeg_needed=options.record is not None)
+
+    theme = _prepare_source(options)
+
+    if options.check_fonts:
+        _check_fonts(options, theme)
+
+    rendering = None
+    if options.render is not None:
+        rendering = _render_approximation(options, theme)
+
+    if offline_only:
+        return
+    serial_grub_debug = options.grub_debug_file is not None
+
+    platforms = grub2_platforms(options.platform_choice)
+    grub2_platform_directories = [
+        find_grub2_platform_directory(grub2_platform) for grub2_platform in platforms
+    ]
+    omvf_image_path = None
+    if any("efi" in grub2_platform for grub2_platform in platforms):
+        omvf_image_path = find_omvf_image()
+
+    required_bytes = estimate_staging_bytes(
+        [theme.abs_path]
+        + [request.partition("=")[2] for request in options.addition_requests]
+        + grub2_platform_directories,
+        image_count=len(platforms),
+    )
+    staging_area = choose_staging_area(options.staging, required_bytes)
+    print(f"INFO: Staging rescue image in {staging_area.describe()}.")
+
+    abs_tmp_folder = staging_area.make_folder()
     try:
         abs_tmp_grub_cfg_file = os.path.join(abs_tmp_folder, "grub.cfg")
         with open(abs_tmp_grub_cfg_file, "w") as f:
-            f.write(grub_cfg_content)
-
-        grub2_platform = _grub2_platform()
-        for grub2_platform_directory in _candidate_grub2_image_directories(grub2_platform):
-            if os.path.exists(grub2_platform_directory):
-                print(f"INFO: Found GRUB 2.x image directory at {grub2_platform_directory!r}.")
-                break
-        else:
-            raise OSError(
-                errno.ENOENT,
-                (
-                    f'GRUB 2.x image directory "{grub2_platform_directory}" not found'
-                    "; hint: please install the related GRUB 2.x package"
-                    " and/or set environment variable G2TP_GRUB_LIB to the correct path."
-                ),
-            )
-
-        is_efi_host = "efi" in grub2_platform
-        if is_efi_host:
-            omvf_image_path, omvf_image_path_hint, omvf_candidate_package_names = (
-                _grub2_ovmf_tuple()
-            )
-            if omvf_image_path is None:
-                package_names_hint = " or ".join(
-                    repr(package_name) for package_name in omvf_candidate_package_names
-                )
-                raise OSError(
-                    errno.ENOENT,
-                    (
-                        f'OVMF image file "{omvf_image_path_hint}" is missing'
-                        f"; hint: please install package {package_names_hint}"
-                        " and/or set environment variable G2TP_OVMF_IMAGE"
-                        " to the correct image location."
-                    ),
-                )
-            print(f"INFO: Found OVMF image at {omvf_image_path!r}.")
+            f.write(theme.grub_cfg_content)
 
+        previews = [
+            _make_platform_preview(grub2_platform, abs_tmp_folder, options, len(platforms) > 1)
+            for grub2_platform in platforms
+        ]
         try:
-            abs_tmp_img_file = os.path.join(abs_tmp_folder, "grub2_theme_demo.img")
-            assemble_cmd = [
-                options.grub2_mkrescue,
-                "--directory=%s" % grub2_platform_directory,
-                "--xorriso",
-                options.xorriso,
-                "--output",
-                abs_tmp_img_file,
-            ]
-
-            if not options.plain_rescue_image:
-                # Add boot loader entry files read by GRUB's blscfg command, e.g. on recent Fedora
-                abs_boot_loader_path = "/boot/loader/"
-                if os.path.exists(abs_boot_loader_path):
-                    try:
-                        _require_recursive_read_access_at(abs_boot_loader_path)
-                    except OSError as e:
-                        print("INFO: %s" % str(e))
-                        print(
-                            'INFO: Files at "%s" will NOT be added to the GRUB rescue image.'
-                            % abs_boot_loader_path
-                        )
-                    else:
-                        assemble_cmd.append("boot/loader=" + abs_boot_loader_path)
-
-                assemble_cmd.append("boot/grub/grub.cfg=%s" % abs_tmp_grub_cfg_file)
-
-                if source_type != _SourceType.DIRECTORY:
-                    assemble_cmd += [
-                        f"boot/grub/{_get_image_path_for(source_type)}={normalized_source}",
-                    ]
-                else:
-                    assemble_cmd += [
-                        f"boot/grub/{_PATH_FULL_THEME}/={normalized_source}",
-                    ]
-
-                assemble_cmd += options.addition_requests
-
-            try:
-                _run(assemble_cmd, options.verbose)
-
-                if not os.path.exists(abs_tmp_img_file):
-                    command = os.path.basename(options.grub2_mkrescue)
-                    raise OSError(errno.ENOENT, "%s failed to create the rescue image" % command)
-
-                run_command = [
-                    options.qemu,
-                    "-m",
-                    "256",
-                    "-drive",
-                    "file=%s,index=0,media=disk,format=raw" % abs_tmp_img_file,
-                ]
-                if options.enable_kvm:
-                    run_command.append("-enable-kvm")
-                if options.qemu_display is not None:
-                    run_command += ["-display", options.qemu_display]
-                if options.qemu_vga is not None:
-                    run_command += ["-vga", options.qemu_vga]
-                if options.qemu_full_screen:
-                    run_command.append("-full-screen")
+            for preview, grub2_platform_directory in zip(previews, grub2_platform_directories):
+                preview.grub2_platform_directory = grub2_platform_directory
+                if "efi" in preview.grub2_platform:
+                    preview.omvf_image_path = omvf_image_path
+                os.mkdir(preview.abs_tmp_folder)
 
-                if serial_grub_debug:
-                    # Truncate any previous output so each run writes a fresh log
-                    truncate_grub_debug_file(vm_serial_capture_path)
-                    run_command.extend(["-serial", f"file:{vm_serial_capture_path}"])
-
-                if is_efi_host:
-                    run_command += [
-                        "-drive",
-                        f"if=pflash,format=raw,readonly=on,file={omvf_image_path}",
-                    ]
+            _size_guest_memory(previews, options, theme)
 
-                print("INFO: Please give GRUB a moment to show up in QEMU...")
+            asyncio.run(
+                _preview_on_all_platforms(
+                    previews, commands, options, theme, abs_tmp_grub_cfg_file
+                )
+            )
 
-                qemu_exit_code = _run(run_command, options.verbose)
+            if staging_area.in_ram:
+                image_bytes = sum(os.path.getsize(preview.abs_img_file) for preview in previews)
+                print(
+                    "INFO: Staging in RAM kept %.1f MiB of rescue image writes"
+                    " (and QEMU's reads of them) off disk." % (image_bytes / 1024**2)
+                )
 
+            for preview in previews:
                 if serial_grub_debug:
                     print(
                         f"INFO: Wrote the virtual machine's serial log "
-                        f'(with the GRUB debug output) to file "{vm_serial_capture_path}".'
+                        f'(with the GRUB debug output) to file "{preview.abs_grub_debug_file}".'
                     )
 
-                if qemu_exit_code not in (0, _KILL_BY_SIGNAL + signal.SIGINT):
-                    raise RuntimeError(f"QEMU exited with code {qemu_exit_code}.")
-            finally:
-                with contextlib.suppress(OSError):
-                    os.remove(abs_tmp_img_file)
+                check_qemu_exit_code(preview)
+
+            if len(previews) > 1:
+                print("INFO: Timings in seconds:")
+                print(_format_timing_report(previews))
+
+            if rendering is not None:
+                _report_render_accuracy(rendering, previews)
+
+            _process_screenshots(previews, options)
         finally:
+            for preview in previews:
+                preview.remove_temporary_files()
             with contextlib.suppress(OSError):
                 os.remove(abs_tmp_grub_cfg_file)
     finally:
@@ -711,12 +1058,12 @@ def main(argv=None):
     try:
         options = parse_command_line(argv)
     except KeyboardInterrupt:
-        sys.exit(_KILL_BY_SIGNAL + signal.SIGINT)
+        sys.exit(KILL_BY_SIGNAL + signal.SIGINT)
 
     try:
         _inner_main(options)
     except KeyboardInterrupt:
-        sys.exit(_KILL_BY_SIGNAL + signal.SIGINT)
+        sys.exit(KILL_BY_SIGNAL + signal.SIGINT)
     except BaseException as e:
         if options.debug:
             traceback.print_exc()
@@ -0,0 +1,279 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import contextlib
+import errno
+import fnmatch
+import hashlib
+import io
+import os
+import posixpath
+import re
+import shutil
+import tarfile
+import tempfile
+import zipfile
+
+from .store import ContentStore
+
+# Where GRUB's gfxmenu looks up menu entry icons as <class>.png, relative to theme.txt
+ICON_DIR = "icons"
+
+_ARCHIVE_SUFFIXES = (
+    ".tar",
+    ".tar.bz2",
+    ".tar.gz",
+    ".tar.xz",
+    ".tbz2",
+    ".tgz",
+    ".txz",
+    ".zip",
+)
+
+_QUOTED_VALUE_PATTERN = re.compile(r'"([^"\n]*)"')
+
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def is_archive(path):
+    return path.lower().endswith(_ARCHIVE_SUFFIXES)
+
+
+def get_cache_directory():
+    try:
+        return os.environ["G2TP_CACHE_DIR"]
+    except KeyError:
+        cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+        return os.path.join(cache_home, "grub2-theme-preview")
+
+
+def file_digest(abs_path):
+    sha256 = hashlib.sha256()
+    with open(abs_path, "rb") as f:
+        for chunk in iter(lambda: f.read(_COPY_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _iterate_member_files(abs_path):
+    """
+    Yield normalized name and file object of each regular member in archive order;
+    tarballs are read in a single forward pass, so each file object
+    has to be consumed before advancing
+    """
+    if abs_path.lower().endswith(".zip"):
+        with zipfile.ZipFile(abs_path) as archive:
+            for member in archive.infolist():
+                name = _normalize_member_name(member.filename)
+                if not member.is_dir() and name is not None:
+                    with archive.open(member) as f:
+                        yield name, f
+    else:
+        with tarfile.open(abs_path, "r|*") as archive:
+            for member in archive:
+                name = _normalize_member_name(member.name)
+                if member.isfile() and name is not None:
+                    yield name, archive.extractfile(member)
+
+
+def _normalize_member_name(name):
+    """
+    Return the member name as a relative POSIX path or ``None`` if unsafe
+    """
+    normalized = posixpath.normpath(name.replace("\\", "/"))
+    if normalized.startswith(("/", "../")) or normalized in (".", ".."):
+        return None
+    return normalized
+
+
+def iterate_theme_references(theme_txt_content):
+    """
+    Yield all quoted values of a theme.txt, e.g. image file names,
+    styled box patterns like "menu_*.png" or an icon directory
+    """
+    for m in _QUOTED_VALUE_PATTERN.finditer(theme_txt_content):
+        value = m.group(1).strip()
+        if value.startswith("./"):
+            value = value[2:]
+        if value:
+            yield value
+
+
+class _ThemeFileSelector:
+    """
+    Decides which files (relative to the theme directory) a GRUB theme
+    with the given theme.txt could load: theme.txt itself, fonts picked up
+    by ``iterate_pf2_files_relative``, menu icons that gfxmenu looks up
+    by class in the icons directory, and files that theme.txt references
+    by name, pattern or directory
+    """
+
+    def __init__(self, theme_txt_content):
+        self._references = list(iterate_theme_references(theme_txt_content))
+
+    def selects(self, relative_path):
+        directory, basename = posixpath.split(relative_path)
+        if relative_path == "theme.txt":
+            return True
+        if basename.lower().endswith(".pf2") and directory in ("", "f"):
+            return True
+        if relative_path.startswith(ICON_DIR + "/"):
+            return True
+        return any(
+            relative_path == reference
+            or relative_path.startswith(reference.rstrip("/") + "/")
+            or ("*" in reference and fnmatch.fnmatchcase(relative_path, reference))
+            for reference in self._references
+        )
+
+
+def select_referenced_files(relative_paths, theme_txt_content):
+    """
+    Return the subset of ``relative_paths`` (relative to the theme directory)
+    that a GRUB theme with the given theme.txt could load
+    """
+    selector = _ThemeFileSelector(theme_txt_content)
+    return {relative_path for relative_path in relative_paths if selector.selects(relative_path)}
+
+
+def _theme_txt_rank(name):
+    # NOTE: The shallowest theme.txt wins, ties broken by name
+    return name.count("/"), name
+
+
+def _relative_to_theme(name, theme_txt_name):
+    """
+    Return ``name`` relative to the directory of ``theme_txt_name`` or ``None`` if outside
+    """
+    theme_root = posixpath.dirname(theme_txt_name)
+    if not theme_root:
+        return name
+    if name.startswith(theme_root + "/"):
+        return name[len(theme_root) + 1 :]
+    return None
+
+
+class _ThemeStager:
+    """
+    Links the selected files of a theme into ``abs_target_dir``
+    through the content store
+    """
+
+    def __init__(self, abs_target_dir, store):
+        self._abs_target_dir = abs_target_dir
+        self._store = store
+        self.staged = set()  # relative paths
+
+    def stage(self, relative_path, source):
+        abs_target_path = os.path.join(self._abs_target_dir, *relative_path.split("/"))
+        os.makedirs(os.path.dirname(abs_target_path), exist_ok=True)
+        self._store.link(self._store.add_stream(source), abs_target_path)
+        self.staged.add(relative_path)
+
+
+def _stream_theme_members(abs_archive_path, abs_target_dir, abs_spool_dir, store, theme_txt=None):
+    """
+    Stage the theme files of an archive in a single forward pass; return
+    ``(staged relative paths, number of files under the theme root), None``
+    or ``None, (name, content)`` of a shallower theme.txt that turned up
+    after members were decided for another one, for a second pass to use
+
+    Members are decided on arrival once a theme.txt has been read;
+    members ahead of the first theme.txt are spooled to ``abs_spool_dir``
+    until then and dropped if not selected.
+    """
+    stager = _ThemeStager(abs_target_dir, store)
+    theme_txt_name, selector = None, None
+    if theme_txt is not None:
+        theme_txt_name, selector = theme_txt[0], _ThemeFileSelector(theme_txt[1])
+    spooled = []  # (name, absolute spool path) in archive order
+    names = []
+
+    with contextlib.closing(_iterate_member_files(abs_archive_path)) as member_files:
+        for name, f in member_files:
+            names.append(name)
+            if (
+                theme_txt is None
+                and posixpath.basename(name) == "theme.txt"
+                and (
+                    theme_txt_name is None
+                    or _theme_txt_rank(name) < _theme_txt_rank(theme_txt_name)
+                )
+            ):
+                content = f.read()
+                if theme_txt_name is not None:
+                    return None, (name, content.decode("utf-8", "replace"))
+                theme_txt_name = name
+                selector = _ThemeFileSelector(content.decode("utf-8", "replace"))
+                stager.stage("theme.txt", io.BytesIO(content))
+                for spooled_name, abs_spool_path in spooled:
+                    relative_path = _relative_to_theme(spooled_name, theme_txt_name)
+                    if relative_path is not None and selector.selects(relative_path):
+                        with open(abs_spool_path, "rb") as source:
+                            stager.stage(relative_path, source)
+                    os.remove(abs_spool_path)
+                spooled = []
+            elif selector is None:
+                abs_spool_path = os.path.join(abs_spool_dir, str(len(names)))
+                with open(abs_spool_path, "wb") as target:
+                    shutil.copyfileobj(f, target, _COPY_CHUNK_SIZE)
+                spooled.append((name, abs_spool_path))
+            else:
+                relative_path = _relative_to_theme(name, theme_txt_name)
+                if relative_path is not None and selector.selects(relative_path):
+                    stager.stage(relative_path, f)
+
+    if theme_txt_name is None:
+        raise OSError(errno.ENOENT, f'No theme.txt found in archive "{abs_archive_path}"')
+    member_count = sum(1 for name in names if _relative_to_theme(name, theme_txt_name) is not None)
+    return (stager.staged, member_count), None
+
+
+def stage_theme_archive(abs_archive_path, abs_cache_dir):
+    """
+    Stream the files of the theme inside a .tar[.gz|.xz|.bz2] or .zip archive
+    that its theme.txt references into a cache directory keyed by archive digest;
+    return the absolute path of the theme directory
+
+    File content is kept once in a content store shared by all archives
+    and linked into the theme directory, so that fonts and icons that
+    many themes have in common take up disk space only once.
+    """
+    abs_archives_dir = os.path.join(abs_cache_dir, "archives")
+    abs_theme_dir = os.path.join(abs_archives_dir, file_digest(abs_archive_path))
+    if os.path.isdir(abs_theme_dir):
+        print(f"INFO: Re-using cached theme files at {abs_theme_dir!r}.")
+        return abs_theme_dir
+
+    os.makedirs(abs_archives_dir, exist_ok=True)
+    store = ContentStore(os.path.join(abs_cache_dir, "objects"))
+    abs_tmp_dir = tempfile.mkdtemp(dir=abs_archives_dir, prefix=".incomplete-")
+    try:
+        abs_spool_dir = os.path.join(abs_tmp_dir, "spool")
+        abs_theme_tmp_dir = os.path.join(abs_tmp_dir, "theme")
+        os.mkdir(abs_spool_dir)
+        staged, theme_txt = _stream_theme_members(
+            abs_archive_path, abs_theme_tmp_dir, abs_spool_dir, store
+        )
+        if staged is None:
+            # A shallower theme.txt came after members decided for another one
+            shutil.rmtree(abs_theme_tmp_dir)
+            staged, _ = _stream_theme_members(
+                abs_archive_path, abs_theme_tmp_dir, abs_spool_dir, store, theme_txt
+            )
+        staged_paths, member_count = staged
+        try:
+            os.rename(abs_theme_tmp_dir, abs_theme_dir)
+        except OSError as e:
+            if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                raise
+            # A concurrent run staged the same archive first, which is just as good
+    finally:
+        with contextlib.suppress(OSError):
+            shutil.rmtree(abs_tmp_dir)
+
+    print(
+        f"INFO: Staged {len(staged_paths)} of {member_count} theme file(s)"
+        f" from archive to {abs_theme_dir!r} ({store.statistics.describe()})."
+    )
+    return abs_theme_dir
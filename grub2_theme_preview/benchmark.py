@@ -0,0 +1,181 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import json
+import statistics
+import time
+
+# Walks the menu, enters and leaves the "Reboot / Shutdown" submenu
+# that is always appended as the last entry, and returns to the first entry
+DEFAULT_KEYS = ("down", "up", "end", "ret", "down", "up", "esc", "home")
+
+_QUIET_SECONDS = 0.3
+_KEY_TIMEOUT_SECONDS = 10.0
+
+
+class KeyLatency:
+    def __init__(self, key, first_update_seconds, settled_seconds, damaged_pixels):
+        self.key = key
+        self.first_update_seconds = first_update_seconds  # None if nothing was redrawn
+        self.settled_seconds = settled_seconds  # None if nothing was redrawn
+        self.damaged_pixels = damaged_pixels
+
+
+async def measure_key_latency(
+    qmp, vnc, key, quiet_seconds=_QUIET_SECONDS, timeout_seconds=_KEY_TIMEOUT_SECONDS
+):
+    """
+    Press ``key`` and measure the time until the framebuffer
+    received its first and its last update before going quiet
+    """
+    frame_number = vnc.frame_number
+    damaged_pixel_count = vnc.damaged_pixel_count
+    start_time = time.monotonic()
+    deadline = start_time + timeout_seconds
+
+    await qmp.send_key(key)
+
+    first_update_time = None
+    while True:
+        if first_update_time is None:
+            wait_seconds = deadline - time.monotonic()
+        else:
+            wait_seconds = quiet_seconds
+        if wait_seconds <= 0 or not await vnc.wait_for_update(frame_number, wait_seconds):
+            break
+        frame_number = vnc.frame_number
+        if first_update_time is None:
+            first_update_time = vnc.last_update_time
+
+    if first_update_time is None:
+        return KeyLatency(key, None, None, 0)
+
+    return KeyLatency(
+        key,
+        first_update_time - start_time,
+        vnc.last_update_time - start_time,
+        vnc.damaged_pixel_count - damaged_pixel_count,
+    )
+
+
+async def measure_key_latencies(qmp, vnc, keys, repeat):
+    latencies = []
+    for _ in range(repeat):
+        for key in keys:
+            latencies.append(await measure_key_latency(qmp, vnc, key))
+    return latencies
+
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, round(fraction * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def format_latency_report(latencies):
+    """
+    Return a table of settled latency distributions per key, in milliseconds
+    """
+    keys = list(dict.fromkeys(latency.key for latency in latencies))
+    lines = [
+        "%-8s %5s %8s %8s %8s %8s %8s %12s"
+        % ("key", "count", "first", "min", "median", "p90", "max", "pixels/key")
+    ]
+    for key in keys:
+        redrawn = [
+            latency
+            for latency in latencies
+            if latency.key == key and latency.settled_seconds is not None
+        ]
+        count = sum(1 for latency in latencies if latency.key == key)
+        if not redrawn:
+            lines.append("%-8s %5d %s" % (key, count, "(no redraw)"))
+            continue
+        settled = sorted(latency.settled_seconds * 1000 for latency in redrawn)
+        first = statistics.median(latency.first_update_seconds * 1000 for latency in redrawn)
+        pixels = statistics.mean(latency.damaged_pixels for latency in redrawn)
+        lines.append(
+            "%-8s %5d %8.1f %8.1f %8.1f %8.1f %8.1f %12d"
+            % (
+                key,
+                count,
+                first,
+                settled[0],
+                statistics.median(settled),
+                _percentile(settled, 0.9),
+                settled[-1],
+                pixels,
+            )
+        )
+    return "\n".join(lines)
+
+
+def fastest_disk_bus(boot_times, grub2_platform):
+    """
+    Return the storage attachment with the lowest median time to menu
+    on ``grub2_platform`` among those that booted every time, or ``None``
+    """
+    candidates = [
+        (statistics.median(seconds), disk_bus)
+        for (platform, disk_bus), seconds in boot_times.items()
+        if platform == grub2_platform and seconds and None not in seconds
+    ]
+    return min(candidates)[1] if candidates else None
+
+
+def load_fastest_disk_buses(abs_path):
+    """
+    Return the storage attachment per GRUB platform recorded in JSON file ``abs_path``,
+    or an empty dict if there is no (readable) record
+    """
+    try:
+        with open(abs_path) as f:
+            fastest_disk_buses = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return fastest_disk_buses if isinstance(fastest_disk_buses, dict) else {}
+
+
+def record_fastest_disk_buses(abs_path, fastest_disk_buses):
+    """
+    Merge dict ``fastest_disk_buses`` (GRUB platform to storage attachment)
+    into JSON file ``abs_path``, keeping the records of other platforms
+    """
+    merged = load_fastest_disk_buses(abs_path)
+    merged.update(fastest_disk_buses)
+    with open(abs_path, "w") as f:
+        json.dump(merged, f, indent=2, sort_keys=True)
+        print(file=f)
+
+
+def format_boot_time_report(boot_times):
+    """
+    Return a table of time to menu per platform and storage attachment in seconds,
+    given a dict mapping ``(grub2_platform, disk_bus)`` to a list of seconds
+    (``None`` for boots that failed)
+    """
+    lines = ["%-12s %-8s %5s %8s %8s %8s" % ("platform", "bus", "boots", "min", "median", "max")]
+    for (grub2_platform, disk_bus), seconds in boot_times.items():
+        booted = sorted(value for value in seconds if value is not None)
+        if len(booted) < len(seconds):
+            lines.append(
+                "%-12s %-8s %5d %s"
+                % (
+                    grub2_platform,
+                    disk_bus,
+                    len(seconds),
+                    f"({len(seconds) - len(booted)} failed)",
+                )
+            )
+            continue
+        lines.append(
+            "%-12s %-8s %5d %8.2f %8.2f %8.2f"
+            % (
+                grub2_platform,
+                disk_bus,
+                len(seconds),
+                booted[0],
+                statistics.median(booted),
+                booted[-1],
+            )
+        )
+    return "\n".join(lines)
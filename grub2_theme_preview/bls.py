@@ -0,0 +1,118 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import glob
+import os
+import re
+
+# Keys that may occur more than once per entry
+_MULTI_VALUE_KEYS = {"initrd", "grub_class", "devicetree_overlay"}
+
+_BLSCFG_LINE_PATTERN = re.compile("^([ \\t]*)(insmod[ \\t]+)?blscfg[ \\t]*$", re.MULTILINE)
+
+
+def parse_bls_entry(content):
+    """
+    Parse a Boot Loader Specification entry (type #1) into a dict;
+    values of keys that may repeat are lists of strings
+
+    See https://uapi-group.org/specifications/specs/boot_loader_specification/
+    """
+    entry = {}
+    for line in content.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        key, _, value = line.partition(" ")
+        value = value.strip()
+        if key in _MULTI_VALUE_KEYS:
+            entry.setdefault(key, []).append(value)
+        elif key == "options" and key in entry:
+            entry[key] += " " + value
+        else:
+            entry[key] = value
+    return entry
+
+
+def _version_sort_key(text):
+    # Roughly rpmvercmp: numeric segments sort above alphabetic ones
+    return tuple(
+        (1, int(segment)) if segment.isdigit() else (0, segment)
+        for segment in re.findall("[0-9]+|[A-Za-z]+", text)
+    )
+
+
+def read_bls_entries(abs_entries_dir):
+    """
+    Return ``(basename, entry)`` pairs of all readable ``*.conf`` files,
+    newest version first like GRUB's ``blscfg`` command
+    """
+    entries = []
+    for path in glob.iglob(os.path.join(abs_entries_dir, "*.conf")):
+        try:
+            with open(path) as f:
+                content = f.read()
+        except OSError as e:
+            print("INFO: %s" % str(e))
+            continue
+        basename = os.path.basename(path)
+        entries.append((basename, parse_bls_entry(content)))
+
+    def sort_key(basename_and_entry):
+        basename, entry = basename_and_entry
+        return (
+            _version_sort_key(entry.get("version", "")),
+            _version_sort_key(basename[: -len(".conf")]),
+        )
+
+    return sorted(entries, key=sort_key, reverse=True)
+
+
+def _quote(text):
+    return "'%s'" % text.replace("'", "'\\''")
+
+
+def make_menu_entry(basename, entry):
+    title = entry.get("title") or entry.get("version") or basename[: -len(".conf")]
+    header = ["menuentry", _quote(title)]
+    for grub_class in entry.get("grub_class", ["kernel"]):
+        header += ["--class", grub_class]
+    header.append("{")
+
+    lines = [" ".join(header)]
+    if "linux" in entry:
+        lines.append(("    linux %s %s" % (entry["linux"], entry.get("options", ""))).rstrip())
+    if "initrd" in entry:
+        lines.append("    initrd %s" % " ".join(entry["initrd"]))
+    if "efi" in entry:
+        lines.append("    chainloader %s" % entry["efi"])
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def replace_blscfg(grub_cfg_content, abs_entries_dir):
+    """
+    Replace calls to GRUB's ``blscfg`` command (and loading its module)
+    by plain ``menuentry`` blocks generated from the entries on disk
+    """
+    if not _BLSCFG_LINE_PATTERN.search(grub_cfg_content):
+        return grub_cfg_content
+
+    menu_entries = [
+        make_menu_entry(basename, entry) for basename, entry in read_bls_entries(abs_entries_dir)
+    ]
+    print(
+        f"INFO: Translated {len(menu_entries)} boot loader entries"
+        f' from "{abs_entries_dir}" to menu entries.'
+    )
+
+    def replace(m):
+        indent = m.group(1)
+        if m.group(2):
+            return f"{indent}# insmod blscfg  # dropped by grub2-theme-preview"
+        chunks = [f"{indent}# blscfg  # replaced by grub2-theme-preview with:"]
+        for menu_entry in menu_entries:
+            chunks += [indent + line for line in menu_entry.splitlines()]
+        return "\n".join(chunks)
+
+    return _BLSCFG_LINE_PATTERN.sub(replace, grub_cfg_content)
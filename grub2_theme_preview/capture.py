@@ -0,0 +1,187 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import asyncio
+import errno
+
+from .imagediff import read_ppm
+
+_QMP_POLL_INTERVAL_SECONDS = 0.25
+_QMP_STABLE_POLLS = 2  # i.e. three identical frames in a row
+_VNC_QUIET_SECONDS = 0.5
+
+# Finer polling while timing GRUB's menu being drawn
+_REDRAW_POLL_INTERVAL_SECONDS = 0.05
+_REDRAW_QUIET_SECONDS = 0.5
+
+
+def _is_same_frame(frame, other):
+    return frame.size == other.size and frame.data == other.data
+
+
+class QmpScreenCapture:
+    """
+    Screen capture through QMP ``screendump``, one uncompressed PPM file per frame
+    """
+
+    def __init__(self, qmp, abs_frame_path):
+        self._qmp = qmp
+        self._abs_frame_path = abs_frame_path
+
+    async def screenshot(self):
+        await self._qmp.screendump(self._abs_frame_path)
+        return read_ppm(self._abs_frame_path)
+
+    async def wait_for_settled(self, timeout_seconds):
+        """
+        Poll until the screen stops changing; return the latest frame
+        and whether it settled before the timeout
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout_seconds
+        previous_frame = None
+        stable_polls = 0
+        while True:
+            frame = await self.screenshot()
+            if previous_frame is not None and _is_same_frame(frame, previous_frame):
+                stable_polls += 1
+                if stable_polls >= _QMP_STABLE_POLLS:
+                    return frame, True
+            else:
+                stable_polls = 0
+
+            if loop.time() >= deadline:
+                return frame, False
+
+            previous_frame = frame
+            await asyncio.sleep(_QMP_POLL_INTERVAL_SECONDS)
+
+    async def wait_for_redrawn(self, timeout_seconds):
+        """
+        Poll until the screen differs from how it looks now and then stays
+        the same for a while; return the event loop time at which that frame
+        first showed up, or ``None`` if the screen did not change in time
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout_seconds
+        initial_frame = previous_frame = await self.screenshot()
+        change_time = None
+        while loop.time() < deadline:
+            await asyncio.sleep(_REDRAW_POLL_INTERVAL_SECONDS)
+            poll_time = loop.time()
+            frame = await self.screenshot()
+            if not _is_same_frame(frame, previous_frame):
+                change_time = poll_time
+            elif (
+                change_time is not None
+                and poll_time - change_time >= _REDRAW_QUIET_SECONDS
+                and not _is_same_frame(frame, initial_frame)
+            ):
+                return change_time
+            previous_frame = frame
+        return None
+
+
+class VncScreenCapture:
+    """
+    Screen capture through an in-process VNC client
+    that receives damaged rectangles as they happen
+    """
+
+    def __init__(self, vnc):
+        self._vnc = vnc
+
+    async def screenshot(self):
+        return self._vnc.screenshot()
+
+    async def wait_for_settled(self, timeout_seconds):
+        """
+        Wait until no update arrived for a while; return the latest frame
+        and whether it settled before the timeout
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout_seconds
+        while True:
+            remaining_seconds = deadline - loop.time()
+            if remaining_seconds <= 0:
+                return self._vnc.screenshot(), False
+            wait_seconds = min(_VNC_QUIET_SECONDS, remaining_seconds)
+            updated = await self._vnc.wait_for_update(self._vnc.frame_number, wait_seconds)
+            if self._vnc.closed:
+                return self._vnc.screenshot(), False
+            if not updated:
+                return self._vnc.screenshot(), wait_seconds >= _VNC_QUIET_SECONDS
+
+
+async def _start_ffmpeg(ffmpeg, abs_output_path, width, height, fps):
+    try:
+        return await asyncio.create_subprocess_exec(
+            ffmpeg,
+            "-loglevel",
+            "error",
+            "-y",
+            "-f",
+            "rawvideo",
+            "-pix_fmt",
+            "bgr0",
+            "-s",
+            f"{width}x{height}",
+            "-r",
+            str(fps),
+            "-i",
+            "-",
+            abs_output_path,
+            stdin=asyncio.subprocess.PIPE,
+        )
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        raise OSError(errno.ENOENT, 'Command "%s" not found' % ffmpeg)
+
+
+async def _stop_ffmpeg(process):
+    process.stdin.close()
+    exit_code = await process.wait()
+    if exit_code != 0:
+        raise RuntimeError(f"ffmpeg exited with code {exit_code}.")
+
+
+async def record_video(vnc, ffmpeg, abs_output_path, fps, duration_seconds):
+    """
+    Feed the VNC framebuffer to ffmpeg at a fixed frame rate;
+    the container format (e.g. GIF, WebM, MP4) follows the file extension.
+
+    Recording restarts whenever the guest changes resolution
+    so that the file covers the final video mode.
+    """
+    loop = asyncio.get_running_loop()
+    start_time = loop.time()
+    frame_interval = 1.0 / fps
+    process = None
+    recorded_size = None
+    frames_written = 0
+    try:
+        for frame_index in range(int(duration_seconds * fps)):
+            await asyncio.sleep(max(0.0, start_time + frame_index * frame_interval - loop.time()))
+            if vnc.closed:
+                break
+
+            if (vnc.width, vnc.height) != recorded_size:
+                if process is not None:
+                    await _stop_ffmpeg(process)
+                    print(
+                        "INFO: Guest changed resolution to %dx%d, restarting recording."
+                        % (vnc.width, vnc.height)
+                    )
+                recorded_size = (vnc.width, vnc.height)
+                process = await _start_ffmpeg(ffmpeg, abs_output_path, *recorded_size, fps)
+                frames_written = 0
+
+            process.stdin.write(vnc.frame())
+            await process.stdin.drain()
+            frames_written += 1
+    finally:
+        if process is not None:
+            await _stop_ffmpeg(process)
+
+    return frames_written
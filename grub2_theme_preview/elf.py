@@ -0,0 +1,79 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import struct
+
+_ELF_MAGIC = b"\x7fELF"
+
+_ELFCLASS64 = 2
+_ELFDATA2MSB = 2
+
+_SHT_SYMTAB = 2
+_STT_OBJECT = 1
+_STT_FUNC = 2
+_SHN_UNDEF = 0
+_SHN_ABS = 0xFFF1
+
+
+class ElfSymbol:
+    def __init__(self, name, section_index, value, size, is_function):
+        self.name = name
+        self.section_index = section_index  # or None for absolute addresses
+        self.value = value  # offset into the section, or address
+        self.size = size
+        self.is_function = is_function  # or else a data object
+
+
+def read_symbols(content):
+    """
+    Return the defined function and data ``ElfSymbol``s of ELF file ``content``,
+    e.g. of a GRUB module (relocatable) or of GRUB's kernel.exec (executable)
+    """
+    if not content.startswith(_ELF_MAGIC):
+        raise ValueError("Not an ELF file")
+    is_64_bit = content[4] == _ELFCLASS64
+    byte_order = ">" if content[5] == _ELFDATA2MSB else "<"
+
+    if is_64_bit:
+        e_type, section_offset = struct.unpack_from(byte_order + "H22xQ", content, 16)
+        entry_size, section_count, _ = struct.unpack_from(byte_order + "HHH", content, 58)
+        section_header = struct.Struct(byte_order + "IIQQQQIIQQ")
+        symbol = struct.Struct(byte_order + "IBBHQQ")
+    else:
+        e_type, section_offset = struct.unpack_from(byte_order + "H14xI", content, 16)
+        entry_size, section_count, _ = struct.unpack_from(byte_order + "HHH", content, 46)
+        section_header = struct.Struct(byte_order + "IIIIIIIIII")
+        symbol = struct.Struct(byte_order + "IIIBBH")
+
+    sections = [
+        section_header.unpack_from(content, section_offset + index * entry_size)
+        for index in range(section_count)
+    ]
+    relocatable = e_type == 1
+
+    symbols = []
+    for section in sections:
+        if section[1] != _SHT_SYMTAB:
+            continue
+        _name, _type, _flags, _addr, offset, size, link, _info, _align, _entsize = section
+        strings_offset = sections[link][4]
+        for index in range(size // symbol.size):
+            fields = symbol.unpack_from(content, offset + index * symbol.size)
+            if is_64_bit:
+                name_offset, info, _other, shndx, value, symbol_size = fields
+            else:
+                name_offset, value, symbol_size, info, _other, shndx = fields
+            if info & 0xF not in (_STT_FUNC, _STT_OBJECT) or shndx == _SHN_UNDEF:
+                continue
+            name_end = content.index(b"\x00", strings_offset + name_offset)
+            name = content[strings_offset + name_offset : name_end].decode("utf-8", "replace")
+            section_index = shndx if relocatable and shndx != _SHN_ABS else None
+            symbols.append(
+                ElfSymbol(name, section_index, value, symbol_size, info & 0xF == _STT_FUNC)
+            )
+    return symbols
+
+
+def read_symbols_from_file(abs_path):
+    with open(abs_path, "rb") as f:
+        return read_symbols(f.read())
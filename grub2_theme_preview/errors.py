@@ -0,0 +1,44 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+
+class PreviewError(Exception):
+    """
+    Base class of all errors raised for a failed preview
+    """
+
+
+class CommandNotFoundError(PreviewError):
+    def __init__(self, command, package=None):
+        super().__init__(command, package)
+        self.command = command
+        self.package = package
+
+    def __str__(self):
+        if self.package is None:
+            return 'Command "%s" not found' % self.command
+        else:
+            return f'Command "{self.command}" of {self.package} not found'
+
+
+class ImageBuildError(PreviewError):
+    pass
+
+
+class QemuExitError(PreviewError):
+    def __init__(self, exit_code, grub2_platform):
+        super().__init__(exit_code, grub2_platform)
+        self.exit_code = exit_code
+        self.grub2_platform = grub2_platform
+
+    def __str__(self):
+        return f"QEMU exited with code {self.exit_code} on {self.grub2_platform}."
+
+
+class BaselineMismatchError(PreviewError):
+    def __init__(self, mismatches):
+        super().__init__(mismatches)
+        self.mismatches = mismatches  # one description per mismatching baseline
+
+    def __str__(self):
+        return " ".join(self.mismatches)
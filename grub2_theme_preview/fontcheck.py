@@ -0,0 +1,131 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import os
+
+from .render import expand_text, iterate_menu_entries, parse_theme_txt
+
+
+class TextUse:
+    """
+    A text that GRUB displays, with the name of the font it asks for
+    (or ``None`` for the fallback font)
+    """
+
+    def __init__(self, where, font_name, text):
+        self.where = where
+        self.font_name = font_name
+        self.text = text
+
+
+class GlyphGap:
+    def __init__(self, use, font, missing, unrenderable):
+        self.use = use
+        self.font = font  # the one asked for, or the fallback font
+        self.missing = missing  # code points lacking in that font
+        self.unrenderable = unrenderable  # code points lacking in all loaded fonts
+
+
+def _iterate_component_texts(components, menu_titles, timeout_seconds):
+    for component in components:
+        properties = component.properties
+        if component.kind in ("label", "progress_bar"):
+            text = expand_text(properties, timeout_seconds)
+            if text:
+                where = component.kind
+                if "id" in properties:
+                    where += f' "{properties["id"]}"'
+                yield TextUse(where, properties.get("font"), text)
+        elif component.kind == "boot_menu":
+            font_names = [properties.get("item_font")]
+            selected_font_name = properties.get("selected_item_font", "inherit")
+            if selected_font_name not in ("inherit", font_names[0]):
+                font_names.append(selected_font_name)
+            for title in menu_titles:
+                for font_name in font_names:
+                    yield TextUse(f'menu entry "{title}"', font_name, title)
+        yield from _iterate_component_texts(component.children, menu_titles, timeout_seconds)
+
+
+def collect_text_uses(abs_theme_txt, grub_cfg_content, timeout_seconds):
+    """
+    Return a list of ``TextUse`` for the menu titles of ``grub_cfg_content``
+    (including those of submenus) and the texts of the theme, if any
+    """
+    menu_titles = [title for title, _classes in iterate_menu_entries(grub_cfg_content, False)]
+    if abs_theme_txt is None:
+        # NOTE: Without a theme, gfxterm draws the menu with the fallback font
+        return [TextUse(f'menu entry "{title}"', None, title) for title in menu_titles]
+
+    with open(abs_theme_txt, encoding="utf-8", errors="replace") as f:
+        global_properties, components = parse_theme_txt(f.read())
+
+    uses = []
+    title = global_properties.get("title-text")
+    if title:
+        uses.append(TextUse("title-text", global_properties.get("title-font"), title))
+    uses += _iterate_component_texts(components, menu_titles, timeout_seconds)
+    return uses
+
+
+def check_glyph_coverage(font_set, uses):
+    """
+    Return a list of ``GlyphGap`` for all ``uses`` whose font lacks glyphs
+    """
+    gaps = []
+    for use in uses:
+        font = font_set.get(use.font_name)
+        codepoints = sorted({ord(character) for character in use.text if ord(character) >= 32})
+        missing = [
+            codepoint for codepoint in codepoints if font is None or not font.has_glyph(codepoint)
+        ]
+        if missing:
+            unrenderable = [
+                codepoint for codepoint in missing if font_set.find_glyph_font(codepoint) is None
+            ]
+            gaps.append(GlyphGap(use, font, missing, unrenderable))
+    return gaps
+
+
+def _format_codepoints(codepoints):
+    return " ".join("U+%04X" % codepoint for codepoint in codepoints)
+
+
+def format_font_report(font_set, gaps):
+    """
+    Return a table of the loaded fonts with the bytes GRUB reads
+    at "loadfont" (header and character index) and the missing glyphs
+    """
+    lines = ["%-30s %12s %12s %7s %7s" % ("font", "index bytes", "file bytes", "glyphs", "ranges")]
+    for abs_path, font in zip(font_set.abs_paths, font_set.fonts):
+        lines.append(
+            "%-30s %12d %12d %7d %7d"
+            % (
+                os.path.basename(abs_path),
+                font.index_bytes,
+                font.file_bytes,
+                font.glyph_count,
+                len(font.coverage_ranges()),
+            )
+        )
+    lines.append(
+        "%-30s %12d %12d"
+        % (
+            "total",
+            sum(font.index_bytes for font in font_set.fonts),
+            sum(font.file_bytes for font in font_set.fonts),
+        )
+    )
+
+    lines.append("")
+    if not gaps:
+        lines.append("missing glyphs: none")
+        return "\n".join(lines)
+
+    lines.append("missing glyphs:")
+    for gap in gaps:
+        font_name = gap.font.name if gap.font is not None else "no font"
+        lines.append(f'  {gap.use.where} in font "{font_name}": {_format_codepoints(gap.missing)}')
+        if gap.unrenderable:
+            lines.append(f"    not in any loaded font: {_format_codepoints(gap.unrenderable)}")
+    return "\n".join(lines)
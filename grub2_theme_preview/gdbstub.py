@@ -0,0 +1,108 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import asyncio
+
+from .unixsocket import open_unix_connection_with_retry
+
+# Program counter per QEMU target as (gdb register number, size in bytes)
+PC_REGISTERS = {
+    "aarch64": (32, 8),
+    "i386": (8, 4),
+    "x86_64": (16, 8),
+}
+
+
+class GdbStubError(Exception):
+    pass
+
+
+def _checksum(payload):
+    return "%02x" % (sum(payload) & 0xFF)
+
+
+class GdbStubClient:
+    """
+    Minimal client for the GDB Remote Serial Protocol as served
+    by QEMU's gdbstub over a Unix domain socket
+
+    See https://sourceware.org/gdb/current/onlinedocs/gdb.html/Remote-Protocol.html
+    """
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._lock = asyncio.Lock()
+        self._acknowledging = True
+
+    @classmethod
+    async def connect(cls, socket_path, timeout_seconds=10.0, poll_interval_seconds=0.05):
+        reader, writer = await open_unix_connection_with_retry(
+            socket_path, timeout_seconds, poll_interval_seconds
+        )
+        client = cls(reader, writer)
+        if await client.request("QStartNoAckMode") == "OK":
+            client._acknowledging = False
+        # NOTE: QEMU pauses the virtual machine when a debugger attaches
+        await client.resume()
+        return client
+
+    async def _read_packet(self):
+        while True:
+            start = await self._reader.read(1)
+            if not start:
+                raise GdbStubError("gdbstub connection closed by QEMU")
+            if start == b"$":
+                break  # i.e. skip acknowledgements and stray bytes
+        payload = await self._reader.readuntil(b"#")
+        payload = payload[:-1]
+        checksum = await self._reader.readexactly(2)
+        if self._acknowledging:
+            self._writer.write(b"+")
+        if checksum.decode("ascii").lower() != _checksum(payload):
+            raise GdbStubError(f"gdbstub packet with bad checksum: {payload!r}")
+        return payload.decode("ascii")
+
+    def _write_packet(self, payload):
+        encoded = payload.encode("ascii")
+        self._writer.write(b"$" + encoded + b"#" + _checksum(encoded).encode("ascii"))
+
+    async def request(self, payload):
+        async with self._lock:
+            self._write_packet(payload)
+            await self._writer.drain()
+            return await self._read_packet()
+
+    async def interrupt(self):
+        """
+        Stop the virtual machine, return the stop reply (e.g. "T05thread:01;")
+        """
+        async with self._lock:
+            self._writer.write(b"\x03")
+            await self._writer.drain()
+            return await self._read_packet()
+
+    async def resume(self):
+        # NOTE: There is no reply until the virtual machine stops again
+        async with self._lock:
+            self._write_packet("c")
+            await self._writer.drain()
+
+    async def read_register(self, number, size):
+        reply = await self.request("p%x" % number)
+        if reply.startswith("E") or len(reply) < 2 * size:
+            raise GdbStubError(f"Reading register {number} failed: {reply!r}")
+        return int.from_bytes(bytes.fromhex(reply[: 2 * size]), "little")
+
+    async def read_memory(self, address, length):
+        reply = await self.request("m%x,%x" % (address, length))
+        if reply.startswith("E") or len(reply) != 2 * length:
+            raise GdbStubError(f"Reading {length} byte(s) at 0x{address:x} failed: {reply!r}")
+        return bytes.fromhex(reply)
+
+    async def close(self):
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except OSError:
+            pass
@@ -0,0 +1,294 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import re
+
+try:
+    import numpy
+except ImportError:  # i.e. compare pixel by pixel in pure Python
+    numpy = None
+
+_PPM_HEADER_PATTERN = re.compile(rb"\AP6\s+(?:#[^\n]*\n\s*)*(\d+)\s+(\d+)\s+(\d+)\s")
+
+# Per-channel lookup table used to fade out unchanged pixels in diff images
+_FADE_TABLE = bytes(128 + v // 4 for v in range(256))
+
+_CHANGED_PIXEL_RGB = b"\xff\x00\x00"
+
+
+class Image:
+    """
+    An RGB image with 8 bits per channel, rows stored top to bottom without padding
+    """
+
+    def __init__(self, width, height, data):
+        if len(data) != width * height * 3:
+            raise ValueError(
+                f"Expected {width * height * 3} bytes of pixel data for {width}x{height}"
+                f", got {len(data)}"
+            )
+        self.width = width
+        self.height = height
+        self.data = data
+
+    @property
+    def stride(self):
+        return self.width * 3
+
+    @property
+    def size(self):
+        return (self.width, self.height)
+
+
+def parse_ppm(content):
+    m = _PPM_HEADER_PATTERN.match(content)
+    if not m:
+        raise ValueError("Not a binary PPM (P6) image")
+    width, height, max_value = (int(g) for g in m.groups())
+    if max_value != 255:
+        raise ValueError(f"Unsupported PPM maximum value {max_value}, expected 255")
+    return Image(width, height, bytes(content[m.end() : m.end() + width * height * 3]))
+
+
+def read_ppm(path):
+    with open(path, "rb") as f:
+        return parse_ppm(f.read())
+
+
+def write_ppm(path, image):
+    with open(path, "wb") as f:
+        f.write(b"P6\n%d %d\n255\n" % image.size)
+        f.write(image.data)
+
+
+def average_hash(image, hash_size=8, samples_per_cell=4):
+    """
+    Return a perceptual "average hash" of ``image`` as an integer
+    of ``hash_size ** 2`` bits.
+
+    Each bit stands for one cell of a ``hash_size`` x ``hash_size`` grid
+    and is set if the cell is brighter than the image on average.
+    Cells are estimated from a fixed number of sample points so that the cost
+    does not depend on image size.
+    """
+    data = image.data
+    stride = image.stride
+    grid = hash_size * samples_per_cell
+    xs = [(2 * i + 1) * image.width // (2 * grid) for i in range(grid)]
+    ys = [(2 * i + 1) * image.height // (2 * grid) for i in range(grid)]
+
+    cells = []
+    for cell_y in range(hash_size):
+        for cell_x in range(hash_size):
+            luma = 0
+            for y in ys[cell_y * samples_per_cell : (cell_y + 1) * samples_per_cell]:
+                row_offset = y * stride
+                for x in xs[cell_x * samples_per_cell : (cell_x + 1) * samples_per_cell]:
+                    i = row_offset + 3 * x
+                    luma += 299 * data[i] + 587 * data[i + 1] + 114 * data[i + 2]
+            cells.append(luma)
+
+    mean = sum(cells) / len(cells)
+    result = 0
+    for luma in cells:
+        result = (result << 1) | (luma > mean)
+    return result
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class ImageComparison:
+    def __init__(self, expected_size, actual_size):
+        self.expected_size = expected_size
+        self.actual_size = actual_size
+        self.identical = False
+        self.hash_distance = None
+        self.changed_blocks = []  # list of (x, y, width, height)
+        self.changed_pixels = 0
+        self.max_channel_delta = 0
+        self.changed_pixel_mask = None  # bytearray with one byte per pixel or None
+
+    @property
+    def size_mismatch(self):
+        return self.expected_size != self.actual_size
+
+    @property
+    def total_pixels(self):
+        return self.expected_size[0] * self.expected_size[1]
+
+    @property
+    def changed_ratio(self):
+        if self.size_mismatch:
+            return 1.0
+        return self.changed_pixels / self.total_pixels
+
+    def passed(self, max_changed_ratio=0.0):
+        if self.size_mismatch:
+            return False
+        return self.changed_ratio <= max_changed_ratio
+
+    def summary(self):
+        if self.size_mismatch:
+            return "size mismatch: expected %dx%d, got %dx%d" % (
+                self.expected_size + self.actual_size
+            )
+        if self.identical:
+            return "identical"
+        parts = [
+            f"{self.changed_pixels} of {self.total_pixels} pixels"
+            f" ({self.changed_ratio:.3%}) differ in {len(self.changed_blocks)} block(s)"
+        ]
+        if self.max_channel_delta is not None:  # i.e. pixels were compared one by one
+            parts.append(f"max channel delta {self.max_channel_delta}")
+        parts.append(f"perceptual hash distance {self.hash_distance}")
+        return ", ".join(parts)
+
+
+def _iterate_changed_blocks(expected, actual, block_size):
+    """
+    Yield ``(x, y, width, height)`` of blocks whose bytes differ.
+
+    Unchanged rows are skipped with a single C-level comparison each,
+    so cost grows with the changed area rather than with image size.
+    """
+    e = expected.data
+    a = actual.data
+    stride = expected.stride
+    width = expected.width
+    height = expected.height
+
+    for block_y in range(0, height, block_size):
+        block_height = min(block_size, height - block_y)
+        changed_columns = set()
+        for y in range(block_y, block_y + block_height):
+            row_start = y * stride
+            row_end = row_start + stride
+            if e[row_start:row_end] == a[row_start:row_end]:
+                continue
+            for block_x in range(0, width, block_size):
+                if block_x in changed_columns:
+                    continue
+                start = row_start + 3 * block_x
+                end = row_start + 3 * min(block_x + block_size, width)
+                if e[start:end] != a[start:end]:
+                    changed_columns.add(block_x)
+        for block_x in sorted(changed_columns):
+            yield (block_x, block_y, min(block_size, width - block_x), block_height)
+
+
+def compare_images(
+    expected, actual, tolerance=0, block_size=16, max_hash_distance=None, want_mask=False
+):
+    """
+    Compare two images of type ``Image``.
+
+    Pixels count as changed if any of their channels differs by more than ``tolerance``.
+    If ``max_hash_distance`` is given and the perceptual hashes of both images
+    are further apart than that, the per-pixel pass is skipped and all pixels
+    of changed blocks count as changed (unless ``want_mask`` asks for exact pixels).
+    """
+    comparison = ImageComparison(expected.size, actual.size)
+    if comparison.size_mismatch:
+        return comparison
+
+    if expected.data == actual.data:
+        comparison.identical = True
+        comparison.hash_distance = 0
+        return comparison
+
+    comparison.hash_distance = hamming_distance(average_hash(expected), average_hash(actual))
+    comparison.changed_blocks = list(_iterate_changed_blocks(expected, actual, block_size))
+
+    if (
+        max_hash_distance is not None
+        and comparison.hash_distance > max_hash_distance
+        and not want_mask
+    ):
+        comparison.changed_pixels = sum(w * h for _x, _y, w, h in comparison.changed_blocks)
+        comparison.max_channel_delta = None
+        return comparison
+
+    if numpy is not None:
+        _compare_pixels_vectorized(expected, actual, tolerance, want_mask, comparison)
+        return comparison
+
+    e = expected.data
+    a = actual.data
+    stride = expected.stride
+    mask = bytearray(expected.width * expected.height) if want_mask else None
+    changed_pixels = 0
+    max_delta = 0
+
+    for block_x, block_y, block_width, block_height in comparison.changed_blocks:
+        for y in range(block_y, block_y + block_height):
+            start = y * stride + 3 * block_x
+            end = start + 3 * block_width
+            if e[start:end] == a[start:end]:
+                continue
+            for i in range(start, end, 3):
+                delta = max(
+                    abs(e[i] - a[i]),
+                    abs(e[i + 1] - a[i + 1]),
+                    abs(e[i + 2] - a[i + 2]),
+                )
+                if delta > tolerance:
+                    changed_pixels += 1
+                    if mask is not None:
+                        mask[i // 3] = 1
+                if delta > max_delta:
+                    max_delta = delta
+
+    comparison.changed_pixels = changed_pixels
+    comparison.max_channel_delta = max_delta
+    comparison.changed_pixel_mask = mask
+    return comparison
+
+
+def _compare_pixels_vectorized(expected, actual, tolerance, want_mask, comparison):
+    """
+    Count changed pixels of all of ``expected`` and ``actual`` at once with numpy
+    """
+    e = numpy.frombuffer(expected.data, dtype=numpy.uint8).astype(numpy.int16)
+    a = numpy.frombuffer(actual.data, dtype=numpy.uint8).astype(numpy.int16)
+    deltas = numpy.abs(e - a).reshape(-1, 3).max(axis=1)
+    changed = deltas > tolerance
+    comparison.changed_pixels = int(numpy.count_nonzero(changed))
+    comparison.max_channel_delta = int(deltas.max())
+    if want_mask:
+        comparison.changed_pixel_mask = bytearray(changed.astype(numpy.uint8).tobytes())
+
+
+def make_diff_image(actual, comparison):
+    """
+    Return an ``Image`` showing ``actual`` faded out with changed pixels in red.
+
+    Requires a comparison made with ``want_mask=True``.
+    """
+    data = bytearray(actual.data.translate(_FADE_TABLE))
+    mask = comparison.changed_pixel_mask
+    if mask is not None:
+        pixel = mask.find(1)
+        while pixel != -1:
+            data[3 * pixel : 3 * pixel + 3] = _CHANGED_PIXEL_RGB
+            pixel = mask.find(1, pixel + 1)
+    return Image(actual.width, actual.height, bytes(data))
+
+
+def combine_side_by_side(images):
+    """
+    Return an ``Image`` with ``images`` placed next to each other from left to right,
+    aligned at the top with black below images of lesser height
+    """
+    height = max(image.height for image in images)
+    rows = []
+    for y in range(height):
+        row = bytearray()
+        for image in images:
+            if y < image.height:
+                row += image.data[y * image.stride : (y + 1) * image.stride]
+            else:
+                row += bytes(image.stride)
+        rows.append(row)
+    return Image(sum(image.width for image in images), height, b"".join(rows))
@@ -0,0 +1,180 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import asyncio
+import json
+import re
+
+# NOTE: Boot loader entries end up in grub.cfg (see bls.py), so "config" covers them
+CATEGORIES = ("modules", "fonts", "theme", "additions", "config", "boot", "overhead")
+
+# e.g. "-r--r--r--    1 0        0          31744 Jan 13 12:00 '/boot/grub/i386-pc/acpi.mod'"
+_LSDL_LINE_PATTERN = re.compile(
+    r"^[-dlbcps][-rwxsStT]{9}\S*\s+\d+\s+\S+\s+\S+\s+(\d+)\s.*?'(.*)'$"
+)
+
+_PLATFORM_DIR_PATTERN = re.compile("^/boot/grub/[^/]+-[^/]+/")
+
+
+def parse_lsdl_output(text):
+    """
+    Return ``(path, size)`` pairs of files listed by xorriso command ``lsdl``
+    """
+    files = []
+    for line in text.splitlines():
+        m = _LSDL_LINE_PATTERN.match(line)
+        if m:
+            files.append((m.group(2).replace("'\\''", "'"), int(m.group(1))))
+    return files
+
+
+async def list_image_files(xorriso, abs_img_file):
+    """
+    Return ``(path, size)`` pairs of all regular files inside an ISO 9660 image
+    """
+    process = await asyncio.create_subprocess_exec(
+        xorriso,
+        "-indev",
+        abs_img_file,
+        "-find",
+        "/",
+        "-type",
+        "f",
+        "-exec",
+        "lsdl",
+        "--",
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    stdout, _ = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(
+            f'Listing the content of "{abs_img_file}" failed'
+            f" with xorriso exit code {process.returncode}."
+        )
+    return parse_lsdl_output(stdout.decode("utf-8", "replace"))
+
+
+def addition_targets(addition_requests):
+    """
+    Return the absolute in-image paths of ``TARGET=/SOURCE`` grafts
+    """
+    return ["/" + request.partition("=")[0].strip("/") for request in addition_requests]
+
+
+def categorize(path, targets=()):
+    for target in targets:
+        if path == target or path.startswith(target + "/"):
+            return "additions"
+    if path.lower().endswith(".pf2"):
+        return "fonts"
+    if path.startswith("/boot/grub/themes/"):
+        return "theme"
+    if path == "/boot/grub/grub.cfg":
+        return "config"
+    if _PLATFORM_DIR_PATTERN.match(path):
+        return "modules"
+    return "boot"
+
+
+class ImageSizeReport:
+    """
+    Attribution of the bytes of a rescue image to categories of files,
+    with whatever the file system and boot records take up as "overhead"
+    """
+
+    def __init__(self, image_bytes, files, targets=()):
+        self.image_bytes = image_bytes
+        self.files = dict(files)
+        self.categories = {category: [0, 0] for category in CATEGORIES}
+        for path, size in self.files.items():
+            tally = self.categories[categorize(path, targets)]
+            tally[0] += 1
+            tally[1] += size
+        self.categories["overhead"][1] = max(0, image_bytes - sum(self.files.values()))
+
+    def to_json(self):
+        return json.dumps(
+            {
+                "image_bytes": self.image_bytes,
+                "categories": {
+                    category: {"files": count, "bytes": size}
+                    for category, (count, size) in self.categories.items()
+                },
+                "files": self.files,
+            },
+            indent=2,
+            sort_keys=True,
+        )
+
+    @classmethod
+    def from_json(cls, content):
+        data = json.loads(content)
+        report = cls(data["image_bytes"], data["files"])
+        # NOTE: Categories are taken as recorded, e.g. with the --add grafts of that run
+        for category, tally in data["categories"].items():
+            report.categories[category] = [tally["files"], tally["bytes"]]
+        return report
+
+    def format(self, top_count=10, baseline=None):
+        """
+        Return a table of bytes per category, the largest files
+        and, given a baseline report, the differences to it
+        """
+
+        def format_delta(value):
+            return "%+12d" % value if value else "%12s" % "-"
+
+        header = "%-10s %6s %12s %7s" % ("category", "files", "bytes", "share")
+        if baseline is not None:
+            header += " %12s" % "delta"
+        lines = [header]
+        for category in CATEGORIES + ("total",):
+            if category == "total":
+                count = len(self.files)
+                size = self.image_bytes
+            else:
+                count, size = self.categories[category]
+            share = 100.0 * size / self.image_bytes if self.image_bytes else 0.0
+            line = "%-10s %6s %12d %6.1f%%" % (
+                category,
+                "-" if category == "overhead" else count,
+                size,
+                share,
+            )
+            if baseline is not None:
+                if category == "total":
+                    baseline_size = baseline.image_bytes
+                else:
+                    baseline_size = baseline.categories.get(category, [0, 0])[1]
+                line += " " + format_delta(size - baseline_size)
+            lines.append(line)
+
+        largest = sorted(self.files.items(), key=lambda item: (-item[1], item[0]))[:top_count]
+        if largest:
+            lines.append("")
+            lines.append("largest files:")
+            lines += ["%12d  %s" % (size, path) for path, size in largest]
+
+        if baseline is not None:
+            changes = [
+                (path, self.files.get(path, 0) - baseline.files.get(path, 0))
+                for path in set(self.files) | set(baseline.files)
+            ]
+            changes = sorted(
+                (change for change in changes if change[1]),
+                key=lambda item: (-abs(item[1]), item[0]),
+            )[:top_count]
+            if changes:
+                lines.append("")
+                lines.append("largest changes against baseline:")
+                for path, delta in changes:
+                    if path not in baseline.files:
+                        note = "  (new)"
+                    elif path not in self.files:
+                        note = "  (removed)"
+                    else:
+                        note = ""
+                    lines.append("%s  %s%s" % (format_delta(delta), path, note))
+
+        return "\n".join(lines)
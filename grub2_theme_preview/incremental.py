@@ -0,0 +1,161 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from .archive import file_digest
+
+# Every update appends a new ISO 9660 session; past this ratio of
+# image size to size after the last full build, rebuild from scratch
+_MAX_GROWTH_RATIO = 2.0
+
+
+def fingerprint(abs_paths):
+    """
+    Return sizes and modification times of all files at ``abs_paths``
+    """
+    fingerprint = []
+    for abs_path in abs_paths:
+        if os.path.isdir(abs_path):
+            for root, dirs, files in os.walk(abs_path):
+                dirs.sort()
+                fingerprint += [os.path.join(root, file) for file in sorted(files)]
+        else:
+            fingerprint.append(abs_path)
+    return tuple(
+        (path, stat.st_size, stat.st_mtime_ns)
+        for path, stat in ((path, os.stat(path)) for path in fingerprint)
+    )
+
+
+def make_build_key(grub2_platform, **identity):
+    """
+    Return a name for the cached image of ``grub2_platform``
+    that changes whenever anything in ``identity`` does
+    """
+    content = json.dumps(identity, sort_keys=True, default=list).encode("utf-8")
+    return f"{grub2_platform}-{hashlib.sha256(content).hexdigest()[:16]}"
+
+
+def make_manifest(grafts):
+    """
+    Return a dict mapping in-image paths to the digest and source
+    of each file grafted by ``TARGET=SOURCE`` pathspecs as taken by grub-mkrescue
+    """
+    manifest = {}
+    for graft in grafts:
+        target, _, abs_source = graft.partition("=")
+        target = "/" + target.strip("/")
+        if os.path.isdir(abs_source):
+            for root, _dirs, files in os.walk(abs_source):
+                for file in files:
+                    abs_file = os.path.join(root, file)
+                    relative_path = os.path.relpath(abs_file, abs_source).replace(os.sep, "/")
+                    manifest[f"{target}/{relative_path}"] = {
+                        "sha256": file_digest(abs_file),
+                        "source": abs_file,
+                    }
+        else:
+            manifest[target] = {"sha256": file_digest(abs_source), "source": abs_source}
+    return manifest
+
+
+def diff_manifests(old_manifest, new_manifest):
+    """
+    Return sorted lists of in-image paths to update (changed or added) and to remove
+    """
+    updates = sorted(
+        path
+        for path, entry in new_manifest.items()
+        if old_manifest.get(path, {}).get("sha256") != entry["sha256"]
+    )
+    removals = sorted(set(old_manifest) - set(new_manifest))
+    return updates, removals
+
+
+def make_update_command(xorriso, abs_img_file, manifest, updates, removals):
+    """
+    Return the xorriso command that appends a session to the image
+    with ``updates`` taken from the sources in ``manifest`` and ``removals`` gone
+    """
+    # NOTE: "replay" has xorriso re-create the boot equipment found in the image,
+    #       i.e. El Torito boot images, MBR, GPT and the EFI partition of grub-mkrescue,
+    #       adjusted to the grown image rather than merely keeping El Torito boot images
+    command = [xorriso, "-dev", abs_img_file, "-boot_image", "any", "replay"]
+    for path in updates:
+        command += ["-update", manifest[path]["source"], path]
+    for path in removals:
+        command += ["-rm", path]
+    command.append("-commit")
+    return command
+
+
+class CachedImage:
+    """
+    The rescue image of the last build with a given build key
+    and the manifest of the files that were grafted into it
+    """
+
+    def __init__(self, abs_cache_dir, build_key):
+        self._abs_cache_dir = abs_cache_dir
+        self.build_key = build_key
+        self.abs_directory = os.path.join(abs_cache_dir, build_key)
+        self.abs_img_file = os.path.join(self.abs_directory, "rescue.img")
+        self._abs_manifest_file = os.path.join(self.abs_directory, "manifest.json")
+
+    def load_manifest(self):
+        """
+        Return the manifest of the cached image or ``None`` if unusable
+        """
+        try:
+            with open(self._abs_manifest_file) as f:
+                content = json.load(f)
+            if not os.path.isfile(self.abs_img_file):
+                return None
+            if os.path.getsize(self.abs_img_file) > content["base_bytes"] * _MAX_GROWTH_RATIO:
+                print("INFO: Cached rescue image has grown too much, building from scratch.")
+                return None
+            return content["files"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _write_manifest(self, manifest, base_bytes):
+        fd, abs_tmp_path = tempfile.mkstemp(dir=self.abs_directory, prefix=".manifest-")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"base_bytes": base_bytes, "files": manifest}, f, indent=1, sort_keys=True)
+        os.replace(abs_tmp_path, self._abs_manifest_file)
+
+    def update_manifest(self, manifest):
+        with open(self._abs_manifest_file) as f:
+            base_bytes = json.load(f)["base_bytes"]
+        self._write_manifest(manifest, base_bytes)
+
+    def store(self, abs_img_file, manifest):
+        """
+        Keep a copy of freshly built ``abs_img_file`` and drop images
+        of earlier build keys of the same platform
+        """
+        platform_prefix = self.build_key.rpartition("-")[0] + "-"
+        with contextlib.suppress(FileNotFoundError):
+            for name in os.listdir(self._abs_cache_dir):
+                if name.startswith(platform_prefix) and name != self.build_key:
+                    shutil.rmtree(os.path.join(self._abs_cache_dir, name), ignore_errors=True)
+
+        os.makedirs(self.abs_directory, exist_ok=True)
+        fd, abs_tmp_path = tempfile.mkstemp(dir=self.abs_directory, prefix=".incoming-")
+        os.close(fd)
+        try:
+            shutil.copyfile(abs_img_file, abs_tmp_path)
+            os.replace(abs_tmp_path, self.abs_img_file)
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(abs_tmp_path)
+        self._write_manifest(manifest, os.path.getsize(self.abs_img_file))
+
+    def discard(self):
+        shutil.rmtree(self.abs_directory, ignore_errors=True)
@@ -0,0 +1,88 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import math
+import os
+import struct
+
+from .pictures import read_picture_size
+
+# Guest memory for firmware, GRUB's core image and modules, per GRUB platform;
+# OVMF needs considerably more than SeaBIOS
+_BASE_MIB_BIOS = 48
+_BASE_MIB_EFI = 112
+
+# GRUB's heap gets fragmented by loading and scaling images,
+# so leave room for at least as much again as the theme needs
+_HEADROOM_FACTOR = 2
+
+# Sizes are rounded up to a multiple of this (and hence of 2 MiB huge pages)
+_GRANULARITY_MIB = 16
+
+# What gfxmode "auto" is assumed to pick at most when no --resolution is given
+_AUTO_RESOLUTION = (1920, 1080)
+
+# Framebuffer, gfxterm's double buffer and the background scaled to the screen
+_SCREEN_BUFFERS = 3
+
+# GRUB keeps decoded images as 32 bits per pixel
+_BYTES_PER_PIXEL = 4
+
+_PICTURE_EXTENSIONS = (".png", ".tga", ".jpg", ".jpeg")
+
+
+def iterate_theme_pictures(abs_source):
+    """
+    Yield the image files of theme directory (or image file) ``abs_source``
+    """
+    if not os.path.isdir(abs_source):
+        yield abs_source
+        return
+    for root, dirs, files in os.walk(abs_source):
+        dirs.sort()
+        for file in sorted(files):
+            if file.lower().endswith(_PICTURE_EXTENSIONS):
+                yield os.path.join(root, file)
+
+
+class MemoryEstimate:
+    def __init__(self, image_bytes, font_bytes, screen_bytes, resolution, mib):
+        self.image_bytes = image_bytes  # decoded, at their own size
+        self.font_bytes = font_bytes
+        self.screen_bytes = screen_bytes
+        self.resolution = resolution
+        self.mib = mib
+
+    def describe(self):
+        return "decoded images %.1f MiB, fonts %.1f MiB, screen buffers %.1f MiB at %dx%d" % (
+            self.image_bytes / 1024**2,
+            self.font_bytes / 1024**2,
+            self.screen_bytes / 1024**2,
+            *self.resolution,
+        )
+
+
+def estimate_guest_memory(grub2_platform, abs_picture_paths, abs_font_paths, resolution):
+    """
+    Return a ``MemoryEstimate`` of the guest memory that GRUB needs for showing
+    a theme with pictures and fonts at ``resolution`` (or ``None`` for "auto")
+    """
+    image_bytes = 0
+    for abs_path in abs_picture_paths:
+        try:
+            width, height = read_picture_size(abs_path)
+        except (OSError, ValueError, struct.error):
+            continue
+        image_bytes += width * height * _BYTES_PER_PIXEL
+
+    # NOTE: File sizes are an upper bound for the character index
+    #       and the glyphs cached by GRUB's font loader
+    font_bytes = sum(os.path.getsize(abs_path) for abs_path in abs_font_paths)
+
+    resolution = resolution or _AUTO_RESOLUTION
+    screen_bytes = _SCREEN_BUFFERS * resolution[0] * resolution[1] * _BYTES_PER_PIXEL
+
+    theme_mib = (image_bytes + font_bytes + screen_bytes) * _HEADROOM_FACTOR / 1024**2
+    base_mib = _BASE_MIB_EFI if "efi" in grub2_platform else _BASE_MIB_BIOS
+    mib = math.ceil((base_mib + theme_mib) / _GRANULARITY_MIB) * _GRANULARITY_MIB
+    return MemoryEstimate(image_bytes, font_bytes, screen_bytes, resolution, mib)
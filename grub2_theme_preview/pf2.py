@@ -0,0 +1,215 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import bisect
+import mmap
+import os
+import struct
+
+# Section holding the glyph bitmaps, running until the end of the file
+_DATA_SECTION = b"DATA"
+
+# Bytes per entry of section CHIX: code point, storage flags, offset of glyph
+_CHIX_ENTRY = struct.Struct(">IBI")
+
+_CODEPOINT = struct.Struct(">I")
+
+_GLYPH_HEADER = struct.Struct(">HHhhh")
+
+_UINT16_SECTIONS = {
+    b"PTSZ": "point_size",
+    b"MAXW": "max_width",
+    b"MAXH": "max_height",
+    b"ASCE": "ascent",
+    b"DESC": "descent",
+}
+
+
+class Glyph:
+    def __init__(self, width, height, x_offset, y_offset, device_width, bitmap):
+        self.width = width
+        self.height = height
+        self.x_offset = x_offset
+        self.y_offset = y_offset  # of the bottom edge above the baseline
+        self.device_width = device_width
+        self.bitmap = bitmap  # 1 bit per pixel, row after row, MSB first, no row padding
+
+    def is_set(self, x, y):
+        bit = y * self.width + x
+        return bool(self.bitmap[bit >> 3] & (0x80 >> (bit & 7)))
+
+
+class _ChixCodepoints:
+    """
+    Read-only sequence view of the code points in section CHIX,
+    unpacked on access so that lookups only touch what they bisect over
+    """
+
+    def __init__(self, content, offset, count):
+        self._content = content
+        self._offset = offset
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return _CODEPOINT.unpack_from(self._content, self._offset + index * _CHIX_ENTRY.size)[0]
+
+
+class Pf2Font:
+    """
+    A bitmap font in GRUB's PF2 format
+
+    Only the header sections are parsed upfront; the character index
+    is searched in place, glyphs are decoded on demand — like GRUB does.
+
+    See https://www.gnu.org/software/grub/manual/grub-dev/html_node/PFF2-Font-File-Format.html
+    """
+
+    def __init__(self, content):
+        self._content = content
+        self._chix_offset = 0
+        self._codepoints = _ChixCodepoints(content, 0, 0)
+        self._coverage_ranges = None
+        self.name = None
+        self.family = None
+        self.point_size = 0
+        self.max_width = 0
+        self.max_height = 0
+        self.ascent = 0
+        self.descent = 0
+        self.index_bytes = 0  # i.e. what GRUB reads at "loadfont"
+
+        offset = 0
+        while offset + 8 <= len(content):
+            section, length = struct.unpack_from(">4sI", content, offset)
+            offset += 8
+            if section == _DATA_SECTION:
+                break
+            if section == b"FILE" and content[offset : offset + length] != b"PFF2":
+                raise ValueError("Not a PF2 font")
+            elif section in (b"NAME", b"FAMI"):
+                text = content[offset : offset + length].rstrip(b"\x00").decode("utf-8", "replace")
+                setattr(self, "name" if section == b"NAME" else "family", text)
+            elif section in _UINT16_SECTIONS:
+                setattr(
+                    self, _UINT16_SECTIONS[section], struct.unpack_from(">H", content, offset)[0]
+                )
+            elif section == b"CHIX":
+                self._chix_offset = offset
+                self._codepoints = _ChixCodepoints(content, offset, length // _CHIX_ENTRY.size)
+            offset += length
+        self.index_bytes = min(offset, len(content))
+
+    @property
+    def height(self):
+        return self.ascent + self.descent
+
+    @property
+    def file_bytes(self):
+        return len(self._content)
+
+    @property
+    def glyph_count(self):
+        return len(self._codepoints)
+
+    def _find_entry(self, codepoint):
+        # NOTE: GRUB requires section CHIX to be sorted by code point, too
+        index = bisect.bisect_left(self._codepoints, codepoint)
+        if index < len(self._codepoints) and self._codepoints[index] == codepoint:
+            return index
+        return None
+
+    def has_glyph(self, codepoint):
+        return self._find_entry(codepoint) is not None
+
+    def get_glyph(self, codepoint):
+        """
+        Return the ``Glyph`` of ``codepoint`` or ``None`` if the font lacks it
+        """
+        index = self._find_entry(codepoint)
+        if index is None:
+            return None
+        _codepoint, _flags, glyph_offset = _CHIX_ENTRY.unpack_from(
+            self._content, self._chix_offset + index * _CHIX_ENTRY.size
+        )
+        width, height, x_offset, y_offset, device_width = _GLYPH_HEADER.unpack_from(
+            self._content, glyph_offset
+        )
+        bitmap_offset = glyph_offset + _GLYPH_HEADER.size
+        bitmap = self._content[bitmap_offset : bitmap_offset + (width * height + 7) // 8]
+        return Glyph(width, height, x_offset, y_offset, device_width, bitmap)
+
+    def coverage_ranges(self):
+        """
+        Return the covered code points as a list of inclusive ``(first, last)`` ranges
+        """
+        if self._coverage_ranges is None:
+            ranges = []
+            for codepoint, _flags, _offset in _CHIX_ENTRY.iter_unpack(
+                self._content[
+                    self._chix_offset : self._chix_offset + self.glyph_count * _CHIX_ENTRY.size
+                ]
+            ):
+                if ranges and ranges[-1][1] == codepoint - 1:
+                    ranges[-1][1] = codepoint
+                else:
+                    ranges.append([codepoint, codepoint])
+            self._coverage_ranges = [tuple(r) for r in ranges]
+        return self._coverage_ranges
+
+
+def read_pf2(abs_path):
+    """
+    Open a PF2 font file, memory-mapped so that only the pages
+    of the index and of glyphs actually used get read
+    """
+    with open(abs_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError("Not a PF2 font")
+        return Pf2Font(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+class FontSet:
+    """
+    The fonts loaded with "loadfont", in loading order
+    """
+
+    def __init__(self, abs_font_paths):
+        self.fonts = []
+        self.abs_paths = []
+        self._by_name = {}
+        for abs_font_path in abs_font_paths:
+            try:
+                font = read_pf2(abs_font_path)
+            except (OSError, ValueError, struct.error) as e:
+                print(f'INFO: Leaving out font "{abs_font_path}": {e}')
+                continue
+            self.fonts.append(font)
+            self.abs_paths.append(abs_font_path)
+            if font.name is not None:
+                self._by_name[font.name] = font
+
+    @property
+    def fallback(self):
+        # NOTE: The last font loaded becomes the default/fallback font in GRUB
+        return self.fonts[-1] if self.fonts else None
+
+    def get(self, name):
+        """
+        Return the font of ``name`` (e.g. "DejaVu Sans Regular 14")
+        or the fallback font if there is no such font
+        """
+        return self._by_name.get(name, self.fallback)
+
+    def find_glyph_font(self, codepoint):
+        """
+        Return the first loaded font having a glyph for ``codepoint`` or ``None``
+        """
+        for font in self.fonts:
+            if font.has_glyph(codepoint):
+                return font
+        return None
@@ -0,0 +1,462 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import operator
+import struct
+import zlib
+
+try:
+    import PIL.Image
+except ImportError:  # i.e. decode PNG and TGA in pure Python, no JPEG
+    PIL = None
+
+try:
+    import numpy
+except ImportError:  # i.e. scale row by row in pure Python
+    numpy = None
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Channels per pixel by PNG color type
+_PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+_OPAQUE = b"\xff"
+
+# Pillow modes that convert to RGBA just like the pure Python decoders do;
+# e.g. 16-bit grayscale would be clipped rather than cut to its top 8 bits
+_PILLOW_EXACT_MODES = {"1", "L", "LA", "P", "PA", "RGB", "RGBA"}
+
+
+class RgbaImage:
+    """
+    An RGBA image with 8 bits per channel (not premultiplied),
+    rows stored top to bottom without padding
+    """
+
+    def __init__(self, width, height, data):
+        if len(data) != width * height * 4:
+            raise ValueError(
+                f"Expected {width * height * 4} bytes of pixel data for {width}x{height}"
+                f", got {len(data)}"
+            )
+        self.width = width
+        self.height = height
+        self.data = data
+
+    @property
+    def stride(self):
+        return self.width * 4
+
+    @property
+    def size(self):
+        return (self.width, self.height)
+
+    def row(self, y):
+        return self.data[y * self.stride : (y + 1) * self.stride]
+
+
+def _rgba_from_channels(pixel_count, red, green, blue, alpha=None):
+    data = bytearray(pixel_count * 4)
+    data[0::4] = red
+    data[1::4] = green
+    data[2::4] = blue
+    data[3::4] = alpha if alpha is not None else _OPAQUE * pixel_count
+    return bytes(data)
+
+
+def _unfilter_average(row, previous, filter_unit):
+    """
+    Undo filter Average of ``row``, one channel at a time
+    since each byte depends on the decoded byte to its left
+    """
+    decoded = bytearray(len(row))
+    for channel in range(filter_unit):
+        lane = bytearray(len(row[channel::filter_unit]))
+        a = 0
+        for j, (x, b) in enumerate(zip(row[channel::filter_unit], previous[channel::filter_unit])):
+            a = (x + ((a + b) >> 1)) & 0xFF
+            lane[j] = a
+        decoded[channel::filter_unit] = lane
+    return decoded
+
+
+def _unfilter_paeth(row, previous, filter_unit):
+    """
+    Undo filter Paeth of ``row``, one channel at a time
+    since each byte depends on the decoded byte to its left
+    """
+    decoded = bytearray(len(row))
+    for channel in range(filter_unit):
+        lane = bytearray(len(row[channel::filter_unit]))
+        a = c = 0
+        for j, (x, b) in enumerate(zip(row[channel::filter_unit], previous[channel::filter_unit])):
+            # NOTE: Same as choosing the closest of a, b and c to p = a + b - c
+            pa = b - c  # i.e. p - a
+            pb = a - c  # i.e. p - b
+            pc = pa + pb  # i.e. p - c
+            if pa < 0:
+                pa = -pa
+            if pb < 0:
+                pb = -pb
+            if pc < 0:
+                pc = -pc
+            if pa <= pb and pa <= pc:
+                a = (x + a) & 0xFF
+            elif pb <= pc:
+                a = (x + b) & 0xFF
+            else:
+                a = (x + c) & 0xFF
+            lane[j] = a
+            c = b
+        decoded[channel::filter_unit] = lane
+    return decoded
+
+
+def _unfilter_png(raw, height, row_bytes, filter_unit):
+    """
+    Undo the per-row PNG filters, return the plain scanlines joined
+
+    Filters Sub and Up are undone for whole rows at once, with the bytes
+    of a row as 8-bit lanes of a single integer; carries are kept
+    from crossing lanes by adding the low 7 bits and the top bits separately.
+    """
+    low_bits = int.from_bytes(b"\x7f" * row_bytes, "little")
+    high_bits = int.from_bytes(b"\x80" * row_bytes, "little")
+    all_bits = low_bits | high_bits
+
+    def add_lanes(a, b):
+        return ((a & low_bits) + (b & low_bits)) ^ ((a ^ b) & high_bits)
+
+    scanlines = bytearray(height * row_bytes)
+    previous = bytes(row_bytes)
+    offset = 0
+    for y in range(height):
+        filter_type = raw[offset]
+        row = raw[offset + 1 : offset + 1 + row_bytes]
+        offset += 1 + row_bytes
+        if filter_type == 4 and y == 0:
+            filter_type = 1  # i.e. Paeth with nothing above always picks the left byte
+        if filter_type == 1:  # Sub
+            # NOTE: Prefix sums by doubling the distance to add from per step
+            value = int.from_bytes(row, "little")
+            shift_bits = filter_unit * 8
+            while shift_bits < row_bytes * 8:
+                value = add_lanes(value, (value << shift_bits) & all_bits)
+                shift_bits *= 2
+            row = value.to_bytes(row_bytes, "little")
+        elif filter_type == 2:  # Up
+            row = add_lanes(
+                int.from_bytes(row, "little"), int.from_bytes(previous, "little")
+            ).to_bytes(row_bytes, "little")
+        elif filter_type == 3:  # Average
+            row = _unfilter_average(row, previous, filter_unit)
+        elif filter_type == 4:  # Paeth
+            row = _unfilter_paeth(row, previous, filter_unit)
+        elif filter_type != 0:
+            raise ValueError(f"Unsupported PNG filter type {filter_type}")
+        scanlines[y * row_bytes : (y + 1) * row_bytes] = row
+        previous = row
+    return scanlines
+
+
+def _unpack_samples(scanlines, width, height, row_bytes, bit_depth):
+    """
+    Return one byte per sample for bit depths below 8
+    """
+    samples = bytearray()
+    mask = (1 << bit_depth) - 1
+    for y in range(height):
+        row = scanlines[y * row_bytes : (y + 1) * row_bytes]
+        for x in range(width):
+            bit_offset = x * bit_depth
+            shift = 8 - bit_depth - (bit_offset & 7)
+            samples.append((row[bit_offset >> 3] >> shift) & mask)
+    return samples
+
+
+def decode_png(content):
+    """
+    Decode a non-interlaced PNG image of any color type into an ``RgbaImage``
+    """
+    if not content.startswith(_PNG_SIGNATURE):
+        raise ValueError("Not a PNG image")
+
+    header = None
+    palette = b""
+    transparency = b""
+    compressed = []
+    offset = len(_PNG_SIGNATURE)
+    while offset + 8 <= len(content):
+        length, chunk_type = struct.unpack_from(">I4s", content, offset)
+        chunk = content[offset + 8 : offset + 8 + length]
+        offset += 12 + length
+        if chunk_type == b"IHDR":
+            header = struct.unpack(">IIBBBBB", chunk)
+        elif chunk_type == b"PLTE":
+            palette = chunk
+        elif chunk_type == b"tRNS":
+            transparency = chunk
+        elif chunk_type == b"IDAT":
+            compressed.append(chunk)
+        elif chunk_type == b"IEND":
+            break
+
+    if header is None:
+        raise ValueError("PNG image lacks a header")
+    width, height, bit_depth, color_type, _compression, _filter, interlace = header
+    if interlace:
+        raise ValueError("Interlaced PNG images are not supported")
+    if color_type not in _PNG_CHANNELS:
+        raise ValueError(f"Unsupported PNG color type {color_type}")
+
+    channels = _PNG_CHANNELS[color_type]
+    bits_per_pixel = channels * bit_depth
+    row_bytes = (width * bits_per_pixel + 7) // 8
+    scanlines = _unfilter_png(
+        zlib.decompress(b"".join(compressed)),
+        height,
+        row_bytes,
+        max(1, bits_per_pixel // 8),
+    )
+
+    if bit_depth == 16:
+        scanlines = scanlines[0::2]  # i.e. keep the most significant byte of each sample
+    elif bit_depth < 8:
+        scanlines = _unpack_samples(scanlines, width, height, row_bytes, bit_depth)
+        if color_type == 0:
+            scale = 255 // ((1 << bit_depth) - 1)
+            scanlines = scanlines.translate(bytes(min(255, v * scale) for v in range(256)))
+
+    pixel_count = width * height
+    if color_type == 6:
+        data = bytes(scanlines)
+    elif color_type == 2:
+        data = _rgba_from_channels(pixel_count, scanlines[0::3], scanlines[1::3], scanlines[2::3])
+    elif color_type == 0:
+        data = _rgba_from_channels(pixel_count, scanlines, scanlines, scanlines)
+    elif color_type == 4:
+        gray = scanlines[0::2]
+        data = _rgba_from_channels(pixel_count, gray, gray, gray, scanlines[1::2])
+    else:
+        padded_palette = palette.ljust(768, b"\x00")
+        alphas = transparency.ljust(256, _OPAQUE)[:256]
+        indices = bytes(scanlines)
+        data = _rgba_from_channels(
+            pixel_count,
+            indices.translate(padded_palette[0::3]),
+            indices.translate(padded_palette[1::3]),
+            indices.translate(padded_palette[2::3]),
+            indices.translate(alphas),
+        )
+    return RgbaImage(width, height, data)
+
+
+def decode_tga(content):
+    """
+    Decode an uncompressed or RLE-compressed true color
+    or grayscale TGA image into an ``RgbaImage``
+    """
+    if len(content) < 18:
+        raise ValueError("Not a TGA image")
+    (
+        id_length,
+        color_map_type,
+        image_type,
+        _color_map_first,
+        color_map_length,
+        color_map_entry_bits,
+        _x_origin,
+        _y_origin,
+        width,
+        height,
+        pixel_bits,
+        descriptor,
+    ) = struct.unpack_from("<BBBHHBHHHHBB", content)
+    if image_type not in (2, 3, 10, 11) or pixel_bits not in (8, 24, 32):
+        raise ValueError(f"Unsupported TGA image type {image_type} with {pixel_bits} bits")
+
+    pixel_bytes = pixel_bits // 8
+    offset = 18 + id_length
+    if color_map_type:
+        offset += color_map_length * ((color_map_entry_bits + 7) // 8)
+    pixel_count = width * height
+
+    if image_type in (2, 3):
+        pixels = content[offset : offset + pixel_count * pixel_bytes]
+    else:
+        pixels = bytearray()
+        while len(pixels) < pixel_count * pixel_bytes:
+            packet = content[offset]
+            count = (packet & 0x7F) + 1
+            offset += 1
+            if packet & 0x80:
+                pixels += content[offset : offset + pixel_bytes] * count
+                offset += pixel_bytes
+            else:
+                pixels += content[offset : offset + count * pixel_bytes]
+                offset += count * pixel_bytes
+        pixels = bytes(pixels[: pixel_count * pixel_bytes])
+
+    if len(pixels) != pixel_count * pixel_bytes:
+        raise ValueError("Truncated TGA image")
+
+    if pixel_bytes == 1:
+        data = _rgba_from_channels(pixel_count, pixels, pixels, pixels)
+    elif pixel_bytes == 3:
+        data = _rgba_from_channels(pixel_count, pixels[2::3], pixels[1::3], pixels[0::3])
+    else:
+        data = _rgba_from_channels(
+            pixel_count, pixels[2::4], pixels[1::4], pixels[0::4], pixels[3::4]
+        )
+
+    image = RgbaImage(width, height, data)
+    if not descriptor & 0x20:  # i.e. bottom-up
+        image = RgbaImage(
+            width,
+            height,
+            b"".join(image.row(y) for y in reversed(range(height))),
+        )
+    return image
+
+
+def is_jpeg_supported():
+    return PIL is not None
+
+
+def _decode_with_pillow(abs_path, exact_modes_only):
+    """
+    Decode an image file in C with Pillow, return ``None``
+    if its mode needs the pure Python decoder to match GRUB
+    """
+    with PIL.Image.open(abs_path) as image:
+        if exact_modes_only and image.mode not in _PILLOW_EXACT_MODES:
+            return None
+        image = image.convert("RGBA")
+        return RgbaImage(image.width, image.height, image.tobytes())
+
+
+def load_picture(abs_path):
+    """
+    Load a PNG, TGA or JPEG image file as an ``RgbaImage``
+
+    Pillow is used when available; without it, PNG and TGA images
+    are decoded in pure Python and JPEG images are not supported.
+    """
+    lower_path = abs_path.lower()
+    is_jpeg = lower_path.endswith((".jpg", ".jpeg"))
+    if PIL is not None and (is_jpeg or lower_path.endswith((".png", ".tga"))):
+        picture = _decode_with_pillow(abs_path, exact_modes_only=not is_jpeg)
+        if picture is not None:
+            return picture
+    if is_jpeg:
+        raise ValueError("JPEG images are not supported without Pillow")
+
+    with open(abs_path, "rb") as f:
+        content = f.read()
+    if lower_path.endswith(".png"):
+        return decode_png(content)
+    if lower_path.endswith(".tga"):
+        return decode_tga(content)
+    raise ValueError("Unsupported image file type")
+
+
+def _read_jpeg_size(f):
+    if f.read(2) != b"\xff\xd8":
+        raise ValueError("Not a JPEG image")
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            raise ValueError("JPEG image without frame header")
+        if marker[1] in (0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xFF):
+            continue  # i.e. markers without payload
+        (length,) = struct.unpack(">H", f.read(2))
+        if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">xHH", f.read(5))
+            return width, height
+        f.seek(length - 2, 1)
+
+
+def read_picture_size(abs_path):
+    """
+    Return width and height of a PNG, TGA or JPEG image file
+    from its headers, without decoding any pixels
+    """
+    lower_path = abs_path.lower()
+    with open(abs_path, "rb") as f:
+        if lower_path.endswith((".jpg", ".jpeg")):
+            return _read_jpeg_size(f)
+        header = f.read(24)
+    if lower_path.endswith(".png"):
+        if not header.startswith(_PNG_SIGNATURE) or header[12:16] != b"IHDR":
+            raise ValueError("Not a PNG image")
+        return struct.unpack_from(">II", header, 16)
+    if lower_path.endswith(".tga"):
+        if len(header) < 18:
+            raise ValueError("Not a TGA image")
+        return struct.unpack_from("<HH", header, 12)
+    raise ValueError("Unsupported image file type")
+
+
+def scale_nearest(image, width, height):
+    """
+    Return ``image`` scaled to ``width`` x ``height`` by nearest neighbor
+    """
+    if image.size == (width, height):
+        return image
+    if width <= 0 or height <= 0 or image.width == 0 or image.height == 0:
+        return RgbaImage(max(0, width), max(0, height), bytes(max(0, width) * max(0, height) * 4))
+
+    if numpy is not None:
+        pixels = numpy.frombuffer(image.data, dtype=numpy.uint8).reshape(
+            image.height, image.width, 4
+        )
+        source_ys = numpy.arange(height) * image.height // height
+        source_xs = numpy.arange(width) * image.width // width
+        return RgbaImage(width, height, pixels[source_ys][:, source_xs].tobytes())
+
+    byte_indices = []
+    for x in range(width):
+        source_x = x * image.width // width
+        byte_indices += range(source_x * 4, source_x * 4 + 4)
+    pick = operator.itemgetter(*byte_indices)
+
+    scaled_rows = {}
+    rows = []
+    for y in range(height):
+        source_y = y * image.height // height
+        if source_y not in scaled_rows:
+            scaled_rows[source_y] = bytes(pick(image.row(source_y)))
+        rows.append(scaled_rows[source_y])
+    return RgbaImage(width, height, b"".join(rows))
+
+
+def encode_png(image):
+    """
+    Encode RGB ``imagediff.Image`` ``image`` as a PNG file
+    """
+
+    def chunk(chunk_type, payload):
+        return (
+            struct.pack(">I", len(payload))
+            + chunk_type
+            + payload
+            + struct.pack(">I", zlib.crc32(chunk_type + payload))
+        )
+
+    stride = image.stride
+    raw = b"".join(
+        b"\x00" + image.data[y * stride : (y + 1) * stride] for y in range(image.height)
+    )
+    return b"".join(
+        [
+            _PNG_SIGNATURE,
+            chunk(b"IHDR", struct.pack(">IIBBBBB", image.width, image.height, 8, 2, 0, 0, 0)),
+            chunk(b"IDAT", zlib.compress(raw, 6)),
+            chunk(b"IEND", b""),
+        ]
+    )
+
+
+def write_png(path, image):
+    with open(path, "wb") as f:
+        f.write(encode_png(image))
@@ -0,0 +1,1091 @@
+# Copyright (C) 2015 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import asyncio
+import contextlib
+import errno
+import glob
+import os
+import platform
+import re
+import shutil
+import signal
+import subprocess
+from enum import Enum
+from textwrap import dedent
+
+from .archive import get_cache_directory, is_archive, stage_theme_archive
+from .benchmark import (
+    DEFAULT_KEYS,
+    fastest_disk_bus,
+    format_boot_time_report,
+    format_latency_report,
+    load_fastest_disk_buses,
+    measure_key_latencies,
+    record_fastest_disk_buses,
+)
+from .bls import replace_blscfg
+from .capture import QmpScreenCapture, VncScreenCapture, record_video
+from .errors import CommandNotFoundError, ImageBuildError, QemuExitError
+from .gdbstub import PC_REGISTERS, GdbStubClient
+from .imagesize import ImageSizeReport, addition_targets, list_image_files
+from .incremental import (
+    CachedImage,
+    diff_manifests,
+    fingerprint,
+    make_build_key,
+    make_manifest,
+    make_update_command,
+)
+from .profiler import GuestProfiler, format_profile_report, write_folded_stacks
+from .qmp import QmpClient
+from .render import find_unicode_pf2
+from .supervisor import MENU_READY_MARKER, QemuSupervisor, SupervisionError
+from .version import VERSION_STR
+from .vnc import VncClient
+from .which import which
+
+_PATH_IMAGE_ONLY_PNG = "themes/DEMO.png"
+_PATH_IMAGE_ONLY_TGA = "themes/DEMO.tga"
+_PATH_IMAGE_ONLY_JPEG = "themes/DEMO.jpeg"
+_PATH_FULL_THEME = "themes/DEMO"
+GRUB_DEBUG_SPEC = "all,-efidisk,-lexer,-scripting,-verify"
+_BLS_ENTRIES_DIR = "/boot/loader/entries"
+
+KILL_BY_SIGNAL = 128
+
+_SCREENSHOT_SETTLE_TIMEOUT_SECONDS = 30
+
+# How QEMU can attach the rescue image, see _make_drive_arguments
+DISK_BUSES = ("ide", "ahci", "virtio", "cdrom")
+
+# Storage attachment for "auto" until --benchmark-disk-bus has measured
+# the fastest one for a GRUB platform, as always used before there was a choice
+DEFAULT_DISK_BUS = "ide"
+
+# Guest memory when not sized for a theme
+DEFAULT_MEMORY_MIB = 256
+
+# How QEMU can back guest memory, see _make_memory_arguments
+MEMORY_BACKINGS = ("ram", "prealloc", "hugepages")
+
+HUGEPAGES_MOUNT = "/dev/hugepages"
+
+
+class SourceType(Enum):
+    DIRECTORY = 1
+    FILE_PNG = 2
+    FILE_TGA = 3
+    FILE_JPEG = 4
+    ARCHIVE = 5
+
+
+def _classify_source(abspath_source):
+    abspath_source_lower = abspath_source.lower()
+    if abspath_source_lower.endswith(".tga"):
+        return SourceType.FILE_TGA
+    elif abspath_source_lower.endswith(".png"):
+        return SourceType.FILE_PNG
+    elif abspath_source_lower.endswith(".jpeg"):
+        return SourceType.FILE_JPEG
+    elif abspath_source_lower.endswith(".jpg"):
+        return SourceType.FILE_JPEG
+    elif is_archive(abspath_source_lower):
+        return SourceType.ARCHIVE
+    return SourceType.DIRECTORY
+
+
+def _get_image_path_for(source_type):
+    if source_type == SourceType.FILE_TGA:
+        return _PATH_IMAGE_ONLY_TGA
+    elif source_type == SourceType.FILE_JPEG:
+        return _PATH_IMAGE_ONLY_JPEG
+    return _PATH_IMAGE_ONLY_PNG
+
+
+class Commands:
+    """
+    External commands to build rescue images and run them with
+    """
+
+    def __init__(self, grub2_mkrescue=None, qemu=None, xorriso="xorriso", ffmpeg="ffmpeg"):
+        self.grub2_mkrescue = grub2_mkrescue or detect_grub2_mkrescue()
+        self.qemu = qemu or default_qemu()
+        self.xorriso = xorriso
+        self.ffmpeg = ffmpeg
+
+    def check(self, ffmpeg_needed=False):
+        """
+        Raise ``CommandNotFoundError`` for the first command missing,
+        otherwise resolve the commands to run to absolute paths
+        """
+        required_commands = [
+            ("grub2_mkrescue", self.grub2_mkrescue, "Grub 2.x"),
+            (None, "mcopy", "mtools"),  # see issue #8
+            (None, "mformat", "mtools"),  # see issue #8
+            ("qemu", self.qemu, "KVM/QEMU"),
+            ("xorriso", self.xorriso, "libisoburn"),
+        ]
+        if ffmpeg_needed:
+            required_commands.append(("ffmpeg", self.ffmpeg, "FFmpeg"))
+
+        for attribute, command, package in required_commands:
+            try:
+                abs_command = os.path.abspath(which(command))
+            except OSError:
+                raise CommandNotFoundError(command, package)
+            if attribute is not None:
+                setattr(self, attribute, abs_command)
+
+
+def default_qemu():
+    return "qemu-system-%s" % platform.machine()
+
+
+def detect_grub2_mkrescue():
+    try:
+        which("grub2-mkrescue")
+    except OSError:
+        return "grub-mkrescue"  # without "2"
+    else:
+        return "grub2-mkrescue"  # with "2"
+
+
+def qemu_target(qemu):
+    """
+    Return the QEMU target of system emulator ``qemu``, e.g. "x86_64"
+    """
+    basename = os.path.basename(qemu)
+    prefix = "qemu-system-"
+    if basename.startswith(prefix):
+        return basename[len(prefix) :]
+    return platform.machine()
+
+
+def _pointer_size(grub2_platform):
+    return 4 if grub2_platform.startswith("i386-") else 8
+
+
+async def _start_process(cmd, verbose, env=None):
+    if verbose:
+        print("# %s" % " ".join(cmd))
+        stdout = None
+    else:
+        stdout = subprocess.DEVNULL
+
+    try:
+        return await asyncio.create_subprocess_exec(*cmd, stdout=stdout, stderr=stdout, env=env)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        raise CommandNotFoundError(cmd[0])
+
+
+async def _run_process(cmd, verbose, env=None):
+    process = await _start_process(cmd, verbose, env)
+    return await process.wait()
+
+
+async def _cancel_if_pending(task):
+    if task is None or task.done():
+        return
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+
+
+def _generate_dummy_menu_entries():
+    return dedent("""\
+        menuentry 'Debian' --class debian --class gnu-linux --class linux --class gnu --class os {
+            reboot
+        }
+
+        menuentry 'FreeBSD' --class freebsd --class bsd --class os {
+            reboot
+        }
+
+        menuentry 'Gentoo' --class gentoo --class gnu-linux --class linux --class gnu --class os {
+            reboot
+        }
+
+        menuentry 'macOS' --class macos --class darwin --class os {
+            reboot
+        }
+
+        menuentry 'Memtest86+' --class memtest {
+            reboot
+        }
+
+        menuentry 'Windows' --class windows --class os {
+            reboot
+        }
+    """)
+
+
+def _make_grub_cfg_load_our_theme(
+    grub_cfg_content,
+    source_type,
+    resolution_or_none,
+    font_files_to_load,
+    timeout_seconds,
+    serial_grub_debug,
+    serial_menu_marker=False,
+):
+    prolog_chunks = []
+    if serial_grub_debug:
+        # Adding debug to GRUB's config emits it on serial and QEMU -serial file records COM1.
+        # See https://www.gnu.org/software/grub/manual/grub/html_node/serial.html
+        prolog_chunks.append(f"set debug={GRUB_DEBUG_SPEC}")
+        prolog_chunks.append("serial")
+
+    # NOTE: The last font loaded becomes the default/fallback font
+    #       So if we load fonts first, the remaining default font
+    #       will remain unchanged and the theme will display unchanged.
+    prolog_chunks.append("loadfont $prefix/fonts/unicode.pf2")
+
+    for relative_path in font_files_to_load:
+        prolog_chunks.append(f"loadfont $prefix/{_PATH_FULL_THEME}/{relative_path}")
+
+    prolog_chunks += [
+        "insmod all_video",
+        "insmod gfxterm",
+        "insmod png",
+        "insmod tga",
+        "insmod jpeg",
+    ]
+
+    terminal_output_line = "terminal_output gfxterm"
+    if serial_grub_debug:
+        terminal_output_line += " serial"
+
+    if resolution_or_none is not None:
+        # We need to be the first call to 'terminal_output gfxterm'
+        # if we want to have a say with resolution
+        prolog_chunks.append("set gfxmode=%dx%d" % resolution_or_none)
+        prolog_chunks.append(terminal_output_line)
+
+    prolog_chunks.append("")  # blank line
+    prolog_chunks.append("")  # trailing new line
+
+    epilog_chunks = [
+        # Ensure that we always have one or more menu entries
+        "",
+        "submenu 'Reboot / Shutdown' --class shutdown {",
+        "    menuentry Reboot --class restart { reboot }",
+        "    menuentry Shutdown --class shutdown { halt }",
+        "}",
+        "",
+        "set default=0",  # i.e. move cursor to first entry
+        "set timeout=%d" % timeout_seconds,
+    ]
+
+    if resolution_or_none is None:
+        # If we haven't ensured GFX mode earlier, do it now
+        # so it's done at least once
+        epilog_chunks.append(terminal_output_line)
+
+    if source_type == SourceType.DIRECTORY:
+        epilog_chunks.append("set theme=$prefix/%s/theme.txt" % _PATH_FULL_THEME)
+    else:
+        epilog_chunks.append("background_image $prefix/%s" % _get_image_path_for(source_type))
+
+    if serial_menu_marker:
+        # Announce on COM1 that the menu is about to show, for menu deadlines
+        if serial_grub_debug:
+            epilog_chunks.append(f"echo {MENU_READY_MARKER}")
+        else:
+            epilog_chunks += [
+                "serial",
+                "terminal_output --append serial",
+                f"echo {MENU_READY_MARKER}",
+                "terminal_output --remove serial",
+            ]
+
+    # Make sure that lines like "set root='hd0,msdos1'" do not get us
+    # into unnecessary "unknown filesystem" error situations
+    grub_cfg_content = re.sub(
+        "^([ \\t]*set root=)(.+)",
+        "\\1'hd0'  # replaced by grub2-theme-preview, was \\2",
+        grub_cfg_content,
+        flags=re.MULTILINE,
+    )
+
+    return "\n".join(prolog_chunks) + grub_cfg_content + "\n".join(epilog_chunks)
+
+
+def _make_final_grub_cfg_content(
+    source_type,
+    source_grub_cfg,
+    resolution_or_none,
+    font_files_to_load,
+    timeout_seconds,
+    serial_grub_debug,
+    serial_menu_marker=False,
+):
+    if source_grub_cfg is not None:
+        files_to_try_to_read = [source_grub_cfg]
+        fail_if_missing = True
+    else:
+        files_to_try_to_read = [
+            "/boot/grub2/grub.cfg",
+            "/boot/grub/grub.cfg",
+        ]
+        fail_if_missing = False
+
+    for candidate in files_to_try_to_read:
+        if not os.path.exists(candidate):
+            if fail_if_missing:
+                raise OSError(errno.ENOENT, os.strerror(errno.ENOENT), candidate)
+            continue
+
+        try:
+            f = open(candidate)
+            content = f.read()
+            f.close()
+        except OSError as e:
+            print("INFO: %s" % str(e))
+        else:
+            break
+    else:
+        print(
+            "INFO: Could not read external GRUB config file"
+            ", falling back to internal example config"
+        )
+        content = _generate_dummy_menu_entries()
+
+    # Boot loader entries as used by GRUB's blscfg command, e.g. on recent Fedora
+    content = replace_blscfg(content, _BLS_ENTRIES_DIR)
+
+    return _make_grub_cfg_load_our_theme(
+        content,
+        source_type,
+        resolution_or_none,
+        font_files_to_load,
+        timeout_seconds,
+        serial_grub_debug,
+        serial_menu_marker,
+    )
+
+
+def find_pf2_files_relative(abs_theme_dir):
+    # Imitate /etc/grub.d/00_header:
+    # for x in "$themedir"/*.pf2 "$themedir"/f/*.pf2; do
+    for pattern in (
+        os.path.join(abs_theme_dir, "*.pf2"),
+        os.path.join(abs_theme_dir, "f", "*.pf2"),
+    ):
+        for path in sorted(glob.iglob(pattern), key=lambda path: path.lower()):
+            yield os.path.relpath(path, abs_theme_dir)
+
+
+def iterate_pf2_files_relative(abs_theme_dir):
+    for relative_path in find_pf2_files_relative(abs_theme_dir):
+        print("INFO: Appending to fonts to load: %s" % relative_path)
+        yield relative_path
+
+
+class ThemeSource:
+    """
+    A theme directory or background image file to preview,
+    with the grub.cfg to build into the rescue image
+    """
+
+    def __init__(self, source_type, abs_path, grub_cfg_content):
+        self.source_type = source_type  # never ARCHIVE, those are staged into a directory
+        self.abs_path = abs_path
+        self.grub_cfg_content = grub_cfg_content
+
+    @property
+    def abs_theme_txt(self):
+        if self.source_type != SourceType.DIRECTORY:
+            return None
+        return os.path.join(self.abs_path, "theme.txt")
+
+    def abs_font_paths(self):
+        """
+        Return the host paths of the fonts that the generated grub.cfg loads, in order
+        """
+        abs_font_paths = []
+        abs_unicode_pf2 = find_unicode_pf2()
+        if abs_unicode_pf2 is not None:
+            abs_font_paths.append(abs_unicode_pf2)
+        if self.source_type == SourceType.DIRECTORY:
+            abs_font_paths += [
+                os.path.join(self.abs_path, relative_path)
+                for relative_path in find_pf2_files_relative(self.abs_path)
+            ]
+        return abs_font_paths
+
+    def make_grafts(self, abs_grub_cfg_file, addition_requests=()):
+        """
+        Return the ``TARGET=SOURCE`` pathspecs to pass to grub-mkrescue
+        """
+        grafts = ["boot/grub/grub.cfg=%s" % abs_grub_cfg_file]
+        if self.source_type != SourceType.DIRECTORY:
+            grafts.append(f"boot/grub/{_get_image_path_for(self.source_type)}={self.abs_path}")
+        else:
+            grafts.append(f"boot/grub/{_PATH_FULL_THEME}/={self.abs_path}")
+        return grafts + list(addition_requests)
+
+
+def prepare_source(
+    source,
+    grub_cfg=None,
+    resolution=None,
+    timeout_seconds=30,
+    serial_grub_debug=False,
+    serial_menu_marker=False,
+):
+    """
+    Return a ``ThemeSource`` for theme directory, image file or archive ``source``
+    """
+    normalized_source = os.path.normpath(os.path.abspath(source))
+
+    source_type = _classify_source(source)
+
+    if source_type == SourceType.ARCHIVE:
+        normalized_source = stage_theme_archive(normalized_source, get_cache_directory())
+        source_type = SourceType.DIRECTORY
+
+    if source_type != SourceType.DIRECTORY:
+        font_files_to_load = []
+    else:
+        font_files_to_load = list(iterate_pf2_files_relative(normalized_source))
+
+    abs_grub_cfg_or_none = grub_cfg and os.path.abspath(grub_cfg)
+    grub_cfg_content = _make_final_grub_cfg_content(
+        source_type,
+        abs_grub_cfg_or_none,
+        resolution,
+        font_files_to_load,
+        timeout_seconds,
+        serial_grub_debug,
+        serial_menu_marker,
+    )
+    return ThemeSource(source_type, normalized_source, grub_cfg_content)
+
+
+def candidate_grub2_image_directories(platform):
+    try:
+        candidate_dirs = [
+            os.environ["G2TP_GRUB_LIB"],
+        ]
+    except KeyError:
+        candidate_dirs = [
+            "/usr/share/grub2",  # openSUSE
+            "/usr/lib/grub",  # everyone else
+        ]
+    return [f"{d}/{platform}" for d in candidate_dirs]
+
+
+def grub2_platforms(platform_choice):
+    """
+    Return the GRUB platforms for "auto", "bios", "efi" or "both"
+    """
+    if platform_choice == "auto":
+        return [_grub2_platform()]
+    grub2_platforms = []
+    if platform_choice in ("bios", "both"):
+        grub2_platforms.append("i386-pc")
+    if platform_choice in ("efi", "both"):
+        grub2_platforms.append(f"{platform.machine()}-efi")
+    return grub2_platforms
+
+
+def _grub2_platform():
+    if os.path.exists("/sys/firmware/efi"):
+        _cpu = platform.machine()
+        _platform = "efi"
+    else:
+        # for BIOS-based machines
+        # https://www.gnu.org/software/grub/manual/grub/grub.html#Installation
+        _cpu = "i386"
+        _platform = "pc"
+    return f"{_cpu}-{_platform}"
+
+
+def _grub2_ovmf_tuple():
+    """
+    Returns a 3-tuple with:
+    1. the absolute filename of the OVMF image to use or None if missing
+    2. a display hint for humans where the file is located, roughly
+    3. a list of package names to try install, potentially
+    """
+    omvf_image = os.environ.get("G2TP_OVMF_IMAGE")
+    if omvf_image is not None:  # Support non-standard locations e.g. NixOS
+        candidates = [omvf_image]
+    else:
+        candidates = [
+            "/usr/share/edk2-ovmf/OVMF_CODE.fd",  # Gentoo and its derivatives
+            "/usr/share/edk2-ovmf/x64/OVMF_CODE.fd",  # Older Arch Linux and its derivatives
+            "/usr/share/edk2/x64/OVMF.4m.fd",  # Arch Linux and its derivatives
+            "/usr/share/edk2/x64/OVMF_CODE.4m.fd",  # Arch Linux and its derivatives
+            "/usr/share/OVMF/OVMF_CODE.fd",  # Older Debian and its derivatives
+            "/usr/share/OVMF/OVMF_CODE_4M.fd",  # Debian and its derivatives
+            "/usr/share/edk2/ovmf/OVMF_CODE.fd",  # Fedora (and its derivatives?)
+            "/usr/share/qemu/edk2-x86_64-code.fd",  # Void Linux
+            "/usr/share/qemu/ovmf-x86_64.bin",  # openSUSE (and its derivatives?)
+            "/usr/share/qemu/ovmf-x86_64-4m.bin",  # openSUSE (and its derivatives?)
+            "/usr/share/qemu/ovmf-x86_64-sev.bin",  # openSUSE (and its derivatives?)
+        ]
+
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            return candidate, None, []
+    else:
+        return None, "/usr/share/[..]/OVMF_CODE.fd", ["edk2-ovmf", "ovmf"]
+
+
+def find_grub2_platform_directory(grub2_platform):
+    for grub2_platform_directory in candidate_grub2_image_directories(grub2_platform):
+        if os.path.exists(grub2_platform_directory):
+            print(f"INFO: Found GRUB 2.x image directory at {grub2_platform_directory!r}.")
+            return grub2_platform_directory
+    raise OSError(
+        errno.ENOENT,
+        (
+            f'GRUB 2.x image directory "{grub2_platform_directory}" not found'
+            "; hint: please install the related GRUB 2.x package"
+            " and/or set environment variable G2TP_GRUB_LIB to the correct path."
+        ),
+    )
+
+
+def find_omvf_image():
+    omvf_image_path, omvf_image_path_hint, omvf_candidate_package_names = _grub2_ovmf_tuple()
+    if omvf_image_path is None:
+        package_names_hint = " or ".join(
+            repr(package_name) for package_name in omvf_candidate_package_names
+        )
+        raise OSError(
+            errno.ENOENT,
+            (
+                f'OVMF image file "{omvf_image_path_hint}" is missing'
+                f"; hint: please install package {package_names_hint}"
+                " and/or set environment variable G2TP_OVMF_IMAGE"
+                " to the correct image location."
+            ),
+        )
+    print(f"INFO: Found OVMF image at {omvf_image_path!r}.")
+    return omvf_image_path
+
+
+def truncate_grub_debug_file(abs_path):
+    try:
+        with open(abs_path, "wb"):
+            pass
+    except OSError as e:
+        raise OSError(
+            e.errno,
+            f"Cannot create or truncate grub serial capture '{abs_path}': {e}",
+        )
+
+
+class PlatformPreview:
+    """
+    Files and outcome of previewing on a single GRUB platform, e.g. "i386-pc"
+
+    Paths of output files are for this platform alone;
+    ``None`` means that the related output is not wanted.
+    """
+
+    def __init__(
+        self,
+        grub2_platform,
+        abs_tmp_folder,
+        disk_bus=DEFAULT_DISK_BUS,
+        memory_mib=DEFAULT_MEMORY_MIB,
+        serial_menu_marker=False,
+        abs_record_file=None,
+        abs_compare_baseline=None,
+        abs_compare_diff=None,
+        abs_grub_debug_file=None,
+        abs_size_baseline=None,
+        abs_profile_file=None,
+    ):
+        self.grub2_platform = grub2_platform
+        self.grub2_platform_directory = None
+        self.omvf_image_path = None  # i.e. no EFI
+
+        self.abs_tmp_folder = os.path.join(abs_tmp_folder, grub2_platform)
+        self.abs_img_file = os.path.join(self.abs_tmp_folder, "grub2_theme_demo.img")
+        self.abs_qmp_socket = os.path.join(self.abs_tmp_folder, "qmp.sock")
+        self.abs_vnc_socket = os.path.join(self.abs_tmp_folder, "vnc.sock")
+        self.abs_frame_file = os.path.join(self.abs_tmp_folder, "screendump.ppm")
+        self.abs_serial_file = os.path.join(self.abs_tmp_folder, "serial.log")
+        self.abs_gdb_socket = os.path.join(self.abs_tmp_folder, "gdb.sock")
+
+        self.disk_bus = disk_bus
+        self.memory_mib = memory_mib
+
+        self.abs_record_file = abs_record_file
+        self.abs_compare_baseline = abs_compare_baseline
+        self.abs_compare_diff = abs_compare_diff
+        self.abs_grub_debug_file = abs_grub_debug_file
+        self.abs_size_baseline = abs_size_baseline
+        self.abs_profile_file = abs_profile_file
+
+        if self.abs_grub_debug_file is not None:
+            self.abs_serial_capture_file = self.abs_grub_debug_file
+        elif serial_menu_marker:
+            self.abs_serial_capture_file = self.abs_serial_file
+        else:
+            self.abs_serial_capture_file = None
+
+        self.build_seconds = None
+        self.menu_seconds = None
+        self.run_seconds = None
+        self.qemu_exit_code = None  # i.e. shut down by us or not run
+        self.screenshot = None
+        self.size_report = None
+
+    def remove_temporary_files(self):
+        for abs_tmp_file in (
+            self.abs_img_file,
+            self.abs_qmp_socket,
+            self.abs_vnc_socket,
+            self.abs_frame_file,
+            self.abs_serial_file,
+            self.abs_gdb_socket,
+        ):
+            with contextlib.suppress(OSError):
+                os.remove(abs_tmp_file)
+        with contextlib.suppress(OSError):
+            os.rmdir(self.abs_tmp_folder)
+
+
+class RunSettings:
+    """
+    How to run QEMU and what to do with the running virtual machine
+    """
+
+    def __init__(
+        self,
+        enable_kvm=True,
+        display=None,
+        vga=None,
+        full_screen=False,
+        memory_backing="ram",
+        headless=False,
+        capture="qmp",
+        screenshot=False,
+        screenshot_delay=3.0,
+        record_fps=10,
+        record_seconds=10.0,
+        benchmark=False,
+        benchmark_keys=DEFAULT_KEYS,
+        benchmark_repeat=5,
+        deadline_menu=None,
+        deadline_total=None,
+        profile_rate=100,
+        verbose=False,
+    ):
+        self.enable_kvm = enable_kvm
+        self.display = display
+        self.vga = vga
+        self.full_screen = full_screen
+        self.memory_backing = memory_backing
+        self.headless = headless  # i.e. "-display none" unless a display is given
+        self.capture = capture  # "qmp" or "vnc"
+        self.screenshot = screenshot  # i.e. keep the settled screen
+        self.screenshot_delay = screenshot_delay
+        self.record_fps = record_fps
+        self.record_seconds = record_seconds
+        self.benchmark = benchmark
+        self.benchmark_keys = benchmark_keys
+        self.benchmark_repeat = benchmark_repeat
+        self.deadline_menu = deadline_menu
+        self.deadline_total = deadline_total
+        self.profile_rate = profile_rate
+        self.verbose = verbose
+
+    def is_capture_requested(self, preview):
+        return self.screenshot or self.benchmark or preview.abs_record_file is not None
+
+    def is_qmp_needed(self, preview):
+        return (
+            self.is_capture_requested(preview)
+            or self.deadline_menu is not None
+            or self.deadline_total is not None
+        )
+
+
+async def _update_cached_image(preview, commands, cached_image, manifest, verbose):
+    """
+    Bring the cached image up to date with ``manifest`` by appending
+    an ISO 9660 session and copy it into place; return ``False``
+    if a full build is needed instead
+    """
+    previous_manifest = cached_image.load_manifest()
+    if previous_manifest is None:
+        return False
+
+    updates, removals = diff_manifests(previous_manifest, manifest)
+    if updates or removals:
+        update_cmd = make_update_command(
+            commands.xorriso, cached_image.abs_img_file, manifest, updates, removals
+        )
+        if await _run_process(update_cmd, verbose) != 0:
+            print("INFO: Incremental update of the cached rescue image failed, rebuilding.")
+            cached_image.discard()
+            return False
+        cached_image.update_manifest(manifest)
+
+    print(
+        f"INFO: Reused cached rescue image for {preview.grub2_platform}"
+        f" with {len(updates)} file(s) updated and {len(removals)} removed."
+    )
+    shutil.copyfile(cached_image.abs_img_file, preview.abs_img_file)
+    return True
+
+
+async def build_image(
+    preview,
+    commands,
+    grafts,
+    incremental=False,
+    size_report=False,
+    addition_requests=(),
+    verbose=False,
+):
+    """
+    Build the rescue image of ``preview`` with ``grafts`` (``TARGET=SOURCE`` pathspecs),
+    storing build time and (if requested) a size report in ``preview``
+    """
+    assemble_cmd = [
+        commands.grub2_mkrescue,
+        "--directory=%s" % preview.grub2_platform_directory,
+        "--xorriso",
+        commands.xorriso,
+        "--output",
+        preview.abs_img_file,
+    ] + grafts
+
+    cached_image = None
+    if incremental:
+        # NOTE: Anything that changes the output of grub-mkrescue beyond
+        #       the content of the grafted files calls for a full build
+        cached_image = CachedImage(
+            os.path.join(get_cache_directory(), "images"),
+            make_build_key(
+                preview.grub2_platform,
+                version=VERSION_STR,
+                grub2_mkrescue=commands.grub2_mkrescue,
+                xorriso=commands.xorriso,
+                grub2_platform_directory=fingerprint([preview.grub2_platform_directory]),
+            ),
+        )
+        manifest = make_manifest(grafts)
+
+    start_time = asyncio.get_running_loop().time()
+    if cached_image is None or not await _update_cached_image(
+        preview, commands, cached_image, manifest, verbose
+    ):
+        # NOTE: grub-mkrescue and xorriso put their intermediate files into ${TMPDIR}
+        env = dict(os.environ, TMPDIR=preview.abs_tmp_folder)
+        await _run_process(assemble_cmd, verbose, env)
+
+        if not os.path.exists(preview.abs_img_file):
+            command = os.path.basename(commands.grub2_mkrescue)
+            raise ImageBuildError(
+                "%s failed to create the rescue image for %s" % (command, preview.grub2_platform)
+            )
+
+        if cached_image is not None:
+            cached_image.store(preview.abs_img_file, manifest)
+    preview.build_seconds = asyncio.get_running_loop().time() - start_time
+
+    if size_report:
+        preview.size_report = ImageSizeReport(
+            os.path.getsize(preview.abs_img_file),
+            await list_image_files(commands.xorriso, preview.abs_img_file),
+            addition_targets(addition_requests),
+        )
+
+
+def _make_drive_arguments(disk_bus, abs_img_file):
+    if disk_bus == "ahci":
+        return [
+            "-device",
+            "ahci,id=ahci",
+            "-drive",
+            f"file={abs_img_file},if=none,id=disk0,media=disk,format=raw",
+            "-device",
+            "ide-hd,drive=disk0,bus=ahci.0,bootindex=0",
+        ]
+    if disk_bus == "virtio":
+        return ["-drive", f"file={abs_img_file},if=virtio,media=disk,format=raw"]
+    if disk_bus == "cdrom":
+        return ["-drive", f"file={abs_img_file},index=0,media=cdrom,format=raw"]
+    return ["-drive", f"file={abs_img_file},index=0,media=disk,format=raw"]
+
+
+def _make_memory_arguments(memory_backing, memory_mib):
+    if memory_backing == "prealloc":
+        backend = f"memory-backend-ram,id=mem0,size={memory_mib}M,prealloc=on"
+    elif memory_backing == "hugepages":
+        backend = (
+            f"memory-backend-file,id=mem0,size={memory_mib}M"
+            f",mem-path={HUGEPAGES_MOUNT},prealloc=on"
+        )
+    else:
+        return ["-m", str(memory_mib)]
+    return ["-m", str(memory_mib), "-object", backend, "-machine", "memory-backend=mem0"]
+
+
+def _get_fastest_disk_buses_path():
+    return os.path.join(get_cache_directory(), "fastest-disk-buses.json")
+
+
+def resolve_disk_bus(disk_bus, grub2_platform):
+    """
+    Return ``disk_bus`` unless it is "auto", otherwise the storage attachment
+    that --benchmark-disk-bus measured to be fastest for ``grub2_platform``
+    or ``DEFAULT_DISK_BUS`` if there is no such measurement
+    """
+    if disk_bus != "auto":
+        return disk_bus
+    fastest = load_fastest_disk_buses(_get_fastest_disk_buses_path()).get(grub2_platform)
+    if fastest not in DISK_BUSES:
+        return DEFAULT_DISK_BUS
+    print(
+        f"INFO: Attaching the rescue image for {grub2_platform} as {fastest},"
+        " measured fastest by --benchmark-disk-bus earlier."
+    )
+    return fastest
+
+
+def make_run_command(preview, commands, settings, disk_bus=None):
+    run_command = [commands.qemu]
+    run_command += _make_memory_arguments(settings.memory_backing, preview.memory_mib)
+    run_command += _make_drive_arguments(disk_bus or preview.disk_bus, preview.abs_img_file)
+    if settings.enable_kvm:
+        run_command.append("-enable-kvm")
+    if settings.display is not None:
+        run_command += ["-display", settings.display]
+    elif settings.is_capture_requested(preview) or settings.headless:
+        run_command += ["-display", "none"]
+    if settings.vga is not None:
+        run_command += ["-vga", settings.vga]
+    if settings.full_screen:
+        run_command.append("-full-screen")
+
+    if preview.abs_serial_capture_file is not None:
+        run_command.extend(["-serial", f"file:{preview.abs_serial_capture_file}"])
+
+    if preview.omvf_image_path is not None:
+        run_command += [
+            "-drive",
+            f"if=pflash,format=raw,readonly=on,file={preview.omvf_image_path}",
+        ]
+
+    if settings.is_qmp_needed(preview):
+        run_command += ["-qmp", f"unix:{preview.abs_qmp_socket},server=on,wait=off"]
+    if settings.is_capture_requested(preview) and settings.capture == "vnc":
+        run_command += ["-vnc", f"unix:{preview.abs_vnc_socket}"]
+    if preview.abs_profile_file is not None:
+        run_command += [
+            "-chardev",
+            f"socket,id=gdb0,path={preview.abs_gdb_socket},server=on,wait=off",
+            "-gdb",
+            "chardev:gdb0",
+        ]
+
+    return run_command
+
+
+async def run_qemu(preview, commands, settings):
+    """
+    Launch QEMU under supervision and capture its screen as requested by ``settings``,
+    storing exit code (unless we shut QEMU down), screenshot and timings in ``preview``
+    """
+    process = await _start_process(make_run_command(preview, commands, settings), settings.verbose)
+    supervisor = QemuSupervisor(process, settings.deadline_menu, settings.deadline_total)
+    qmp = None
+    vnc = None
+    vnc_task = None
+    recording = None
+    gdb = None
+    profiler = None
+    try:
+        if settings.is_qmp_needed(preview):
+            qmp = await supervisor.guard(
+                QmpClient.connect(preview.abs_qmp_socket), "QMP to become available"
+            )
+            supervisor.watch_liveness(qmp)
+
+        if preview.abs_profile_file is not None:
+            gdb = await supervisor.guard(
+                GdbStubClient.connect(preview.abs_gdb_socket), "the gdbstub to become available"
+            )
+            profiler = GuestProfiler(gdb, PC_REGISTERS[qemu_target(commands.qemu)])
+            profiler.start(1.0 / settings.profile_rate)
+
+        if settings.deadline_menu is not None:
+            await supervisor.wait_for_menu(
+                preview.abs_serial_capture_file, QmpScreenCapture(qmp, preview.abs_frame_file)
+            )
+            preview.menu_seconds = supervisor.menu_seconds
+
+        if profiler is not None:
+            await supervisor.guard(profiler.stop(supervisor.menu_time), "sampling to stop")
+            folded = await supervisor.guard(
+                profiler.resolve(
+                    preview.grub2_platform_directory,
+                    preview.grub2_platform,
+                    _pointer_size(preview.grub2_platform),
+                ),
+                "symbols to resolve",
+            )
+            write_folded_stacks(preview.abs_profile_file, folded)
+            print(
+                f"INFO: Wrote {sum(folded.values())} sample(s) until the menu was drawn"
+                f' to file "{preview.abs_profile_file}".'
+            )
+            print(f"INFO: Hottest functions on {preview.grub2_platform}:")
+            print(format_profile_report(folded))
+
+        if not settings.is_capture_requested(preview):
+            preview.qemu_exit_code = await supervisor.wait()
+            return
+
+        if settings.capture == "vnc":
+            vnc = await supervisor.guard(
+                VncClient.connect(preview.abs_vnc_socket), "VNC to become available"
+            )
+            vnc_task = asyncio.ensure_future(vnc.run())
+            capture = VncScreenCapture(vnc)
+        else:
+            capture = QmpScreenCapture(qmp, preview.abs_frame_file)
+
+        if preview.abs_record_file is not None:
+            recording = asyncio.ensure_future(
+                record_video(
+                    vnc,
+                    commands.ffmpeg,
+                    preview.abs_record_file,
+                    settings.record_fps,
+                    settings.record_seconds,
+                )
+            )
+
+        screenshot = None
+        if settings.screenshot or settings.benchmark:
+            await supervisor.guard(
+                asyncio.sleep(settings.screenshot_delay), "the screenshot delay"
+            )
+            screenshot, settled = await supervisor.guard(
+                capture.wait_for_settled(_SCREENSHOT_SETTLE_TIMEOUT_SECONDS),
+                "the screen to settle",
+            )
+            if not settled:
+                print(
+                    "INFO: Screen did not settle within %d seconds, using latest frame."
+                    % _SCREENSHOT_SETTLE_TIMEOUT_SECONDS
+                )
+            if not settings.screenshot:
+                screenshot = None
+
+        if settings.benchmark:
+            print(
+                "INFO: Measuring input-to-redraw latency of %d key presses..."
+                % (len(settings.benchmark_keys) * settings.benchmark_repeat)
+            )
+            latencies = await supervisor.guard(
+                measure_key_latencies(
+                    qmp, vnc, settings.benchmark_keys, settings.benchmark_repeat
+                ),
+                "the key press benchmark",
+            )
+            print(f"INFO: Input-to-redraw latency in milliseconds on {preview.grub2_platform}:")
+            print(format_latency_report(latencies))
+
+        if recording is not None:
+            frames_written = await supervisor.guard(recording, "the recording")
+            print(f'INFO: Wrote {frames_written} frame(s) to file "{preview.abs_record_file}".')
+
+        preview.screenshot = screenshot
+    finally:
+        preview.run_seconds = supervisor.elapsed_seconds
+        await _cancel_if_pending(recording)
+        if profiler is not None:
+            await profiler.cancel()
+        await supervisor.shutdown()
+        await _cancel_if_pending(vnc_task)
+        if vnc is not None:
+            await vnc.close()
+        if qmp is not None:
+            await qmp.close()
+        if gdb is not None:
+            await gdb.close()
+
+
+def check_qemu_exit_code(preview):
+    if preview.qemu_exit_code not in (None, 0, KILL_BY_SIGNAL + signal.SIGINT):
+        raise QemuExitError(preview.qemu_exit_code, preview.grub2_platform)
+
+
+async def _measure_time_to_menu(preview, commands, settings, disk_bus):
+    """
+    Boot the rescue image attached as ``disk_bus``, return the seconds
+    until GRUB's themed menu was drawn or ``None`` if it was not
+    """
+    truncate_grub_debug_file(preview.abs_serial_capture_file)
+    process = await _start_process(
+        make_run_command(preview, commands, settings, disk_bus), settings.verbose
+    )
+    supervisor = QemuSupervisor(process, settings.deadline_menu, settings.deadline_total)
+    qmp = None
+    try:
+        qmp = await supervisor.guard(
+            QmpClient.connect(preview.abs_qmp_socket), "QMP to become available"
+        )
+        supervisor.watch_liveness(qmp)
+        await supervisor.wait_for_menu(
+            preview.abs_serial_capture_file, QmpScreenCapture(qmp, preview.abs_frame_file)
+        )
+    except SupervisionError as e:
+        print(f"INFO: Booting {preview.grub2_platform} from {disk_bus} failed: {e}")
+        return None
+    finally:
+        await supervisor.shutdown()
+        if qmp is not None:
+            await qmp.close()
+    return supervisor.menu_seconds
+
+
+async def benchmark_disk_buses(previews, commands, settings):
+    """
+    Boot each rescue image from each storage attachment in turn
+    (one at a time so that runs do not compete for the CPU), report time to menu
+    and record the fastest attachment per platform for "--disk-bus auto"
+    """
+    boot_times = {}
+    for preview in previews:
+        for disk_bus in DISK_BUSES:
+            print(
+                f"INFO: Booting {preview.grub2_platform} from {disk_bus}"
+                f" {settings.benchmark_repeat} time(s)..."
+            )
+            boot_times[(preview.grub2_platform, disk_bus)] = [
+                await _measure_time_to_menu(preview, commands, settings, disk_bus)
+                for _ in range(settings.benchmark_repeat)
+            ]
+
+    print("INFO: Time to GRUB menu in seconds by storage attachment:")
+    print(format_boot_time_report(boot_times))
+    fastest_disk_buses = {}
+    for preview in previews:
+        fastest = fastest_disk_bus(boot_times, preview.grub2_platform)
+        print(
+            f"INFO: Fastest storage attachment for {preview.grub2_platform}:"
+            f" {fastest or 'none booted'} (used so far: {preview.disk_bus})."
+        )
+        if fastest is not None:
+            fastest_disk_buses[preview.grub2_platform] = fastest
+
+    if fastest_disk_buses:
+        abs_path = _get_fastest_disk_buses_path()
+        os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+        record_fastest_disk_buses(abs_path, fastest_disk_buses)
+        print(f'INFO: Recorded fastest storage attachments for "--disk-bus auto" to "{abs_path}".')
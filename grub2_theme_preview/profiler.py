@@ -0,0 +1,264 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import asyncio
+import bisect
+import collections
+import contextlib
+import os
+
+from .elf import read_symbols_from_file
+from .gdbstub import GdbStubError
+
+# GRUB's kernel with symbols, as shipped next to the modules for use with gdb
+_KERNEL_FILE = "kernel.exec"
+
+# Head of the linked list of loaded modules (struct grub_dl) in GRUB's kernel
+_MODULE_LIST_HEAD = "grub_dl_head"
+
+# Platforms whose kernel runs at the addresses it was linked for,
+# which is what resolving the module list through kernel.exec takes;
+# on EFI, firmware relocates GRUB's kernel to wherever it has room
+STATIC_KERNEL_PLATFORMS = {"i386-pc"}
+
+# Pointer-sized fields of struct grub_dl that follow field "dep" up to field "next",
+# as in include/grub/dl.h of GRUB 2.06 and 2.12 on x86 (i.e. without
+# the got/tramp fields of other architectures):
+#
+#     struct grub_dl {
+#       char *name;
+#       int ref_count;
+#       int persistent;
+#       grub_dl_dep_t dep;
+#       grub_dl_segment_t segment;
+#       Elf_Sym *symtab;
+#       grub_size_t symsize;
+#       void (*init) (struct grub_dl *mod);
+#       void (*fini) (void);
+#       void *base;
+#       grub_size_t sz;
+#       struct grub_dl *next;
+#     };
+_GRUB_DL_FIELDS_AFTER_DEP = ("segment", "symtab", "symsize", "init", "fini", "base", "sz")
+
+# Bounds against walking garbage if the struct layout does not match
+_MAX_MODULES = 1024
+_MAX_SEGMENTS = 64
+_MAX_NAME_LENGTH = 128
+
+UNKNOWN_FRAME = "[unknown]"
+
+
+class LoadedModule:
+    def __init__(self, name, segments):
+        self.name = name
+        self.segments = segments  # ELF section index -> load address
+
+
+class SymbolTable:
+    """
+    Function address ranges of GRUB's kernel and loaded modules
+    """
+
+    def __init__(self):
+        self._entries = []  # (start, end, module name, function name)
+        self._starts = None
+
+    def add(self, module_name, function_name, start, size):
+        self._entries.append((start, start + max(1, size), module_name, function_name))
+        self._starts = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, address):
+        """
+        Return ``(module name, function name)`` of the function at ``address`` or ``None``
+        """
+        if self._starts is None:
+            self._entries.sort()
+            self._starts = [entry[0] for entry in self._entries]
+        index = bisect.bisect_right(self._starts, address) - 1
+        if index < 0:
+            return None
+        start, end, module_name, function_name = self._entries[index]
+        if address >= end:
+            return None
+        return module_name, function_name
+
+
+def find_kernel_symbols(abs_platform_dir):
+    """
+    Return the symbols of GRUB's kernel.exec in ``abs_platform_dir``
+    or an empty list if missing
+    """
+    abs_kernel_file = os.path.join(abs_platform_dir, _KERNEL_FILE)
+    if not os.path.isfile(abs_kernel_file):
+        return []
+    return read_symbols_from_file(abs_kernel_file)
+
+
+def find_module_list_head(grub2_platform, kernel_symbols):
+    """
+    Return the address of ``grub_dl_head`` or ``None`` if unknown at runtime
+    """
+    if grub2_platform not in STATIC_KERNEL_PLATFORMS:
+        return None
+    for symbol in kernel_symbols:
+        if symbol.name == _MODULE_LIST_HEAD and symbol.section_index is None:
+            return symbol.value
+    return None
+
+
+def _grub_dl_offsets(pointer_size):
+    """
+    Return offsets of fields ``segment`` and ``next`` of struct grub_dl on x86,
+    see _GRUB_DL_FIELDS_AFTER_DEP
+    """
+    # NOTE: Field "dep" follows "name" (a pointer) and two ints, aligned to a pointer
+    dep_offset = -(-(pointer_size + 8) // pointer_size) * pointer_size
+    segment_offset = dep_offset + pointer_size
+    next_offset = segment_offset + len(_GRUB_DL_FIELDS_AFTER_DEP) * pointer_size
+    return segment_offset, next_offset
+
+
+async def read_loaded_modules(stub, module_list_head, pointer_size):
+    """
+    Walk GRUB's list of loaded modules in guest memory (with the virtual machine stopped)
+    """
+    segment_offset, next_offset = _grub_dl_offsets(pointer_size)
+
+    async def read_pointer(address):
+        return int.from_bytes(await stub.read_memory(address, pointer_size), "little")
+
+    async def read_string(address):
+        content = await stub.read_memory(address, _MAX_NAME_LENGTH)
+        return content.split(b"\x00", 1)[0].decode("ascii", "replace")
+
+    modules = []
+    module = await read_pointer(module_list_head)
+    while module and len(modules) < _MAX_MODULES:
+        segments = {}
+        segment = await read_pointer(module + segment_offset)
+        while segment and len(segments) < _MAX_SEGMENTS:
+            address = await read_pointer(segment + pointer_size)
+            section_index = int.from_bytes(
+                await stub.read_memory(segment + 3 * pointer_size, 4), "little"
+            )
+            segments[section_index] = address
+            segment = await read_pointer(segment)
+        modules.append(LoadedModule(await read_string(await read_pointer(module)), segments))
+        module = await read_pointer(module + next_offset)
+    return modules
+
+
+def build_symbol_table(abs_platform_dir, kernel_symbols, modules):
+    table = SymbolTable()
+    for symbol in kernel_symbols:
+        if symbol.is_function and symbol.section_index is None:
+            table.add("kernel", symbol.name, symbol.value, symbol.size)
+    for module in modules:
+        abs_module_file = os.path.join(abs_platform_dir, module.name + ".mod")
+        if not os.path.isfile(abs_module_file):
+            continue
+        for symbol in read_symbols_from_file(abs_module_file):
+            if symbol.is_function and symbol.section_index in module.segments:
+                start = module.segments[symbol.section_index] + symbol.value
+                table.add(module.name, symbol.name, start, symbol.size)
+    return table
+
+
+class GuestProfiler:
+    """
+    Samples the guest's program counter through QEMU's gdbstub
+    by briefly stopping the virtual machine at a fixed rate
+    """
+
+    def __init__(self, stub, pc_register):
+        self._stub = stub
+        self._pc_register = pc_register  # (gdb register number, size in bytes)
+        self._running = False
+        self._task = None
+        self._sample_times = []  # (event loop time, program counter) per sample
+        self.samples = collections.Counter()  # program counter -> count
+
+    async def _sample(self, interval_seconds):
+        loop = asyncio.get_running_loop()
+        while self._running:
+            await asyncio.sleep(interval_seconds)
+            await self._stub.interrupt()
+            sample_time = loop.time()
+            try:
+                program_counter = await self._stub.read_register(*self._pc_register)
+            finally:
+                await self._stub.resume()
+            self._sample_times.append((sample_time, program_counter))
+            self.samples[program_counter] += 1
+
+    def start(self, interval_seconds):
+        self._running = True
+        self._task = asyncio.ensure_future(self._sample(interval_seconds))
+
+    async def stop(self, until_time=None):
+        """
+        Stop sampling after the current sample, leaving the virtual machine running;
+        samples taken after event loop time ``until_time`` (if given) are dropped
+        """
+        self._running = False
+        if self._task is not None:
+            await self._task
+        if until_time is not None:
+            for sample_time, program_counter in self._sample_times:
+                if sample_time > until_time:
+                    self.samples[program_counter] -= 1
+            self.samples = +self.samples  # i.e. without zero counts
+
+    async def cancel(self):
+        self._running = False
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError, GdbStubError):
+                await self._task
+
+    async def resolve(self, abs_platform_dir, grub2_platform, pointer_size):
+        """
+        Return the samples folded into ``;``-separated stacks
+        of the form "grub;<module>;<function>", counted
+        """
+        kernel_symbols = find_kernel_symbols(abs_platform_dir)
+        module_list_head = find_module_list_head(grub2_platform, kernel_symbols)
+        modules = []
+        if module_list_head is not None:
+            await self._stub.interrupt()
+            try:
+                modules = await read_loaded_modules(self._stub, module_list_head, pointer_size)
+            finally:
+                await self._stub.resume()
+        table = build_symbol_table(abs_platform_dir, kernel_symbols, modules)
+
+        folded = collections.Counter()
+        for program_counter, count in self.samples.items():
+            frames = table.lookup(program_counter) or (UNKNOWN_FRAME,)
+            folded[";".join(("grub",) + frames)] += count
+        return folded
+
+
+def write_folded_stacks(abs_path, folded):
+    """
+    Write stacks in the "folded" format of flamegraph.pl and compatible tools
+    """
+    with open(abs_path, "w") as f:
+        for stack, count in sorted(folded.items()):
+            print(f"{stack} {count}", file=f)
+
+
+def format_profile_report(folded, top_count=10):
+    """
+    Return a table of the functions with the most samples
+    """
+    total = sum(folded.values())
+    lines = ["%8s %7s  %s" % ("samples", "share", "function")]
+    for stack, count in sorted(folded.items(), key=lambda item: (-item[1], item[0]))[:top_count]:
+        share = 100.0 * count / total if total else 0.0
+        lines.append("%8d %6.1f%%  %s" % (count, share, stack.partition(";")[2]))
+    return "\n".join(lines)
@@ -0,0 +1,82 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import asyncio
+import json
+
+from .unixsocket import open_unix_connection_with_retry
+
+
+class QmpError(Exception):
+    pass
+
+
+class QmpClient:
+    """
+    Minimal client for the QEMU Machine Protocol (QMP) over a Unix domain socket
+
+    See https://www.qemu.org/docs/master/interop/qmp-spec.html
+    """
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._lock = asyncio.Lock()
+        self.events = []
+
+    @classmethod
+    async def connect(cls, socket_path, timeout_seconds=10.0, poll_interval_seconds=0.05):
+        reader, writer = await open_unix_connection_with_retry(
+            socket_path, timeout_seconds, poll_interval_seconds
+        )
+        client = cls(reader, writer)
+        greeting = await client._read_message()
+        if "QMP" not in greeting:
+            raise QmpError(f"Unexpected QMP greeting: {greeting!r}")
+        await client.execute("qmp_capabilities")
+        return client
+
+    async def _read_message(self):
+        line = await self._reader.readline()
+        if not line:
+            raise QmpError("QMP connection closed by QEMU")
+        return json.loads(line)
+
+    async def execute(self, command, **arguments):
+        request = {"execute": command}
+        if arguments:
+            request["arguments"] = arguments
+
+        # NOTE: Replies carry no request ID so commands must not interleave
+        async with self._lock:
+            self._writer.write(json.dumps(request).encode("utf-8") + b"\n")
+            await self._writer.drain()
+
+            while True:
+                message = await self._read_message()
+                if "event" in message:
+                    self.events.append(message)
+                    continue
+                if "error" in message:
+                    error = message["error"]
+                    raise QmpError(f"QMP command {command!r} failed: {error.get('desc', error)}")
+                return message.get("return")
+
+    async def screendump(self, filename):
+        await self.execute("screendump", filename=filename)
+
+    async def send_key(self, *qcodes):
+        await self.execute("send-key", keys=[{"type": "qcode", "data": q} for q in qcodes])
+
+    async def quit(self):
+        try:
+            await self.execute("quit")
+        except QmpError:
+            pass  # QEMU may close the connection before replying
+
+    async def close(self):
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except OSError:
+            pass
@@ -0,0 +1,602 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import os
+import re
+import struct
+
+try:
+    import numpy
+except ImportError:  # i.e. composite row by row in pure Python
+    numpy = None
+
+from .archive import ICON_DIR
+from .imagediff import Image
+from .pf2 import FontSet
+from .pictures import load_picture, scale_nearest
+
+# Locations of the font that grub-mkrescue puts at $prefix/fonts/unicode.pf2
+_UNICODE_PF2_CANDIDATES = (
+    "/usr/share/grub/unicode.pf2",
+    "/usr/share/grub2/unicode.pf2",
+)
+
+_STYLED_BOX_PIECES = ("nw", "n", "ne", "w", "c", "e", "sw", "s", "se")
+
+# Placeholders that GRUB replaces in the text of timeout labels and progress bars
+_TIMEOUT_TEXTS = {
+    "@TIMEOUT_NOTIFICATION_LONG@": "The highlighted entry will be executed automatically in %ds.",
+    "@TIMEOUT_NOTIFICATION_MIDDLE@": "%ds remaining.",
+    "@TIMEOUT_NOTIFICATION_SHORT@": "%ds",
+}
+
+_NAMED_COLORS = {
+    "black": (0, 0, 0),
+    "blue": (0, 0, 255),
+    "cyan": (0, 255, 255),
+    "gray": (128, 128, 128),
+    "green": (0, 128, 0),
+    "grey": (128, 128, 128),
+    "magenta": (255, 0, 255),
+    "red": (255, 0, 0),
+    "white": (255, 255, 255),
+    "yellow": (255, 255, 0),
+}
+
+# Defaults of GRUB's boot_menu component
+_MENU_DEFAULTS = {
+    "item_height": 42,
+    "item_padding": 14,
+    "item_spacing": 16,
+    "icon_width": 32,
+    "icon_height": 32,
+    "item_icon_space": 4,
+}
+
+_TOKEN_PATTERN = re.compile(r'"([^"]*)"|([+{}:=])|([^\s"{}:=]+)')
+
+_LENGTH_PATTERN = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*(%?)\s*(?:([+-])\s*(\d+))?\s*$")
+
+_MENU_ITEM_PATTERN = re.compile(
+    r"""^\s*(?:menuentry|submenu)\s+(?:'([^']*)'|"([^"]*)"|([^\s{]+))(.*)$"""
+)
+
+_QUOTED_PATTERN = re.compile(r"""'[^']*'|"[^"]*\"""")
+
+
+class ThemeComponent:
+    def __init__(self, kind):
+        self.kind = kind  # e.g. "boot_menu" or "label"
+        self.properties = {}
+        self.children = []
+
+
+def _tokenize_theme_txt(content):
+    for line in content.splitlines():
+        if line.lstrip().startswith("#"):
+            continue
+        for m in _TOKEN_PATTERN.finditer(line):
+            string, punctuation, word = m.groups()
+            if string is not None:
+                yield "value", string
+            elif punctuation is not None:
+                yield punctuation, punctuation
+            else:
+                yield "value", word
+
+
+def parse_theme_txt(content):
+    """
+    Return global properties (a dict) and top-level components
+    (a list of ``ThemeComponent``) of a GRUB theme.txt
+    """
+    tokens = list(_tokenize_theme_txt(content))
+    global_properties = {}
+    components = []
+    stack = []
+    i = 0
+    while i < len(tokens):
+        kind, value = tokens[i]
+        if kind == "+" and i + 2 < len(tokens) and tokens[i + 2][0] == "{":
+            component = ThemeComponent(tokens[i + 1][1])
+            (stack[-1].children if stack else components).append(component)
+            stack.append(component)
+            i += 3
+        elif kind == "}":
+            if stack:
+                stack.pop()
+            i += 1
+        elif (
+            kind == "value"
+            and i + 2 < len(tokens)
+            and tokens[i + 1][0] in (":", "=")
+            and tokens[i + 2][0] == "value"
+        ):
+            target = stack[-1].properties if stack else global_properties
+            target[value] = tokens[i + 2][1]
+            i += 3
+        else:
+            i += 1
+    return global_properties, components
+
+
+def resolve_length(text, parent_length, default):
+    """
+    Resolve a GRUB theme length like "20", "50%" or "50%-100"
+    relative to ``parent_length``
+    """
+    if text is None:
+        return default
+    m = _LENGTH_PATTERN.match(text)
+    if not m:
+        return default
+    number, percent, sign, offset = m.groups()
+    value = float(number) * parent_length / 100.0 if percent else float(number)
+    if sign:
+        value += int(offset) if sign == "+" else -int(offset)
+    return int(value)
+
+
+def parse_color(text, default=None):
+    if text is None:
+        return default
+    text = text.strip()
+    if text.startswith("#"):
+        digits = text[1:]
+        if len(digits) in (3, 4):
+            digits = "".join(digit * 2 for digit in digits)
+        try:
+            return tuple(int(digits[i : i + 2], 16) for i in (0, 2, 4))
+        except ValueError:
+            return default
+    if "," in text:
+        try:
+            return tuple(int(part) for part in text.split(",")[:3])
+        except ValueError:
+            return default
+    return _NAMED_COLORS.get(text.lower(), default)
+
+
+def expand_text(properties, timeout_seconds):
+    """
+    Return the text of a label or progress bar as GRUB displays it
+    at the start of the countdown
+    """
+    text = properties.get("text", "")
+    for placeholder, replacement in _TIMEOUT_TEXTS.items():
+        text = text.replace(placeholder, replacement)
+    if properties.get("id") == "__timeout__":
+        text = text.replace("%d", str(timeout_seconds))
+    return text
+
+
+def find_unicode_pf2():
+    for candidate in _UNICODE_PF2_CANDIDATES:
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def iterate_menu_entries(grub_cfg_content, top_level_only=True):
+    """
+    Yield ``(title, classes)`` of all ``menuentry`` and ``submenu`` items,
+    by default only of those shown before entering any submenu
+    """
+    depth = 0
+    for line in grub_cfg_content.splitlines():
+        if line.lstrip().startswith("#"):
+            continue
+        m = _MENU_ITEM_PATTERN.match(line)
+        if m and (depth == 0 or not top_level_only):
+            title = next(group for group in m.groups()[:3] if group is not None)
+            yield title, re.findall(r"--class[= ]\s*(\S+)", m.group(4))
+        unquoted = _QUOTED_PATTERN.sub("", line).split("#", 1)[0]
+        depth = max(0, depth + unquoted.count("{") - unquoted.count("}"))
+
+
+class Canvas:
+    """
+    An RGB framebuffer to composite RGBA pictures and text onto
+    """
+
+    def __init__(self, width, height, rgb=(0, 0, 0)):
+        self.width = width
+        self.height = height
+        self.data = bytearray(bytes(rgb) * (width * height))
+
+    def _clip(self, x, y, width, height):
+        left = max(0, x)
+        top = max(0, y)
+        right = min(self.width, x + width)
+        bottom = min(self.height, y + height)
+        return left, top, right, bottom
+
+    def fill(self, x, y, width, height, rgb):
+        left, top, right, bottom = self._clip(x, y, width, height)
+        if left >= right:
+            return
+        row = bytes(rgb) * (right - left)
+        for row_y in range(top, bottom):
+            offset = (row_y * self.width + left) * 3
+            self.data[offset : offset + len(row)] = row
+
+    def _pixels(self):
+        """
+        Return a writable numpy view of shape (height, width, 3) onto the framebuffer
+        """
+        return numpy.frombuffer(self.data, dtype=numpy.uint8).reshape(self.height, self.width, 3)
+
+    def blit(self, picture, x, y):
+        """
+        Composite RGBA ``picture`` with its top left corner at ``x``, ``y``
+        """
+        left, top, right, bottom = self._clip(x, y, picture.width, picture.height)
+        if left >= right or top >= bottom:
+            return
+        if numpy is not None:
+            source = (
+                numpy.frombuffer(picture.data, dtype=numpy.uint8)
+                .reshape(picture.height, picture.width, 4)[
+                    top - y : bottom - y, left - x : right - x
+                ]
+                .astype(numpy.uint16)
+            )
+            target = self._pixels()[top:bottom, left:right]
+            alpha = source[:, :, 3:]
+            # NOTE: Same rounding as the pure Python loop below, exact for alpha 0 and 255
+            target[...] = (source[:, :, :3] * alpha + target * (255 - alpha) + 127) // 255
+            return
+        columns = right - left
+        opaque = b"\xff" * columns
+        transparent = bytes(columns)
+        data = self.data
+        for row_y in range(top, bottom):
+            source_offset = (row_y - y) * picture.stride + (left - x) * 4
+            source = picture.data[source_offset : source_offset + columns * 4]
+            alpha = source[3::4]
+            target_offset = (row_y * self.width + left) * 3
+            if alpha == opaque:
+                row = bytearray(columns * 3)
+                row[0::3] = source[0::4]
+                row[1::3] = source[1::4]
+                row[2::3] = source[2::4]
+                data[target_offset : target_offset + columns * 3] = row
+            elif alpha != transparent:
+                for i, a in enumerate(alpha):
+                    if a == 255:
+                        data[target_offset : target_offset + 3] = source[4 * i : 4 * i + 3]
+                    elif a:
+                        for channel in range(3):
+                            data[target_offset + channel] = (
+                                source[4 * i + channel] * a
+                                + data[target_offset + channel] * (255 - a)
+                                + 127
+                            ) // 255
+                    target_offset += 3
+
+    def set_pixel(self, x, y, rgb):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            offset = (y * self.width + x) * 3
+            self.data[offset : offset + 3] = bytes(rgb)
+
+    def to_image(self):
+        return Image(self.width, self.height, bytes(self.data))
+
+
+def text_width(font, text):
+    width = 0
+    for character in text:
+        glyph = font.get_glyph(ord(character)) or font.get_glyph(ord("?"))
+        if glyph is not None:
+            width += glyph.device_width
+    return width
+
+
+def _draw_glyph_vectorized(canvas, glyph, glyph_left, glyph_top, rgb):
+    left, top, right, bottom = canvas._clip(glyph_left, glyph_top, glyph.width, glyph.height)
+    if left >= right or top >= bottom:
+        return
+    bits = numpy.unpackbits(numpy.frombuffer(glyph.bitmap, dtype=numpy.uint8))
+    mask = bits[: glyph.width * glyph.height].reshape(glyph.height, glyph.width)
+    mask = mask[top - glyph_top : bottom - glyph_top, left - glyph_left : right - glyph_left]
+    canvas._pixels()[top:bottom, left:right][mask.astype(bool)] = rgb
+
+
+def draw_text(canvas, font, text, x, baseline, rgb):
+    for character in text:
+        glyph = font.get_glyph(ord(character)) or font.get_glyph(ord("?"))
+        if glyph is None:
+            continue
+        glyph_left = x + glyph.x_offset
+        glyph_top = baseline - glyph.y_offset - glyph.height
+        if numpy is not None:
+            _draw_glyph_vectorized(canvas, glyph, glyph_left, glyph_top, rgb)
+        else:
+            for glyph_y in range(glyph.height):
+                for glyph_x in range(glyph.width):
+                    if glyph.is_set(glyph_x, glyph_y):
+                        canvas.set_pixel(glyph_left + glyph_x, glyph_top + glyph_y, rgb)
+        x += glyph.device_width
+
+
+class _Renderer:
+    def __init__(self, canvas, abs_theme_dir, fonts, menu_entries, timeout_seconds):
+        self._canvas = canvas
+        self._abs_theme_dir = abs_theme_dir
+        self._fonts = fonts
+        self._menu_entries = menu_entries
+        self._timeout_seconds = timeout_seconds
+        self._pictures = {}
+
+    def picture(self, relative_path, width=None, height=None):
+        abs_path = os.path.join(self._abs_theme_dir, relative_path)
+        if abs_path not in self._pictures:
+            try:
+                self._pictures[abs_path] = load_picture(abs_path)
+            except (OSError, ValueError, struct.error, IndexError) as e:
+                if os.path.exists(abs_path):
+                    print(f'INFO: Leaving out image "{abs_path}": {e}')
+                self._pictures[abs_path] = None
+        picture = self._pictures[abs_path]
+        if picture is not None and width is not None:
+            picture = scale_nearest(picture, width, height)
+        return picture
+
+    def styled_box(self, pattern, x, y, width, height):
+        """
+        Draw a 9-slice box with its borders inside the given rectangle,
+        return the inner rectangle
+        """
+        if not pattern:
+            return x, y, width, height
+        pieces = {name: self.picture(pattern.replace("*", name)) for name in _STYLED_BOX_PIECES}
+
+        def size(name, index):
+            piece = pieces[name]
+            return piece.size[index] if piece is not None else 0
+
+        left = max(size("nw", 0), size("w", 0), size("sw", 0))
+        right = max(size("ne", 0), size("e", 0), size("se", 0))
+        top = max(size("nw", 1), size("n", 1), size("ne", 1))
+        bottom = max(size("sw", 1), size("s", 1), size("se", 1))
+        inner_width = max(0, width - left - right)
+        inner_height = max(0, height - top - bottom)
+
+        placements = {
+            "nw": (x, y, left, top),
+            "n": (x + left, y, inner_width, top),
+            "ne": (x + left + inner_width, y, right, top),
+            "w": (x, y + top, left, inner_height),
+            "c": (x + left, y + top, inner_width, inner_height),
+            "e": (x + left + inner_width, y + top, right, inner_height),
+            "sw": (x, y + top + inner_height, left, bottom),
+            "s": (x + left, y + top + inner_height, inner_width, bottom),
+            "se": (x + left + inner_width, y + top + inner_height, right, bottom),
+        }
+        for name, (piece_x, piece_y, piece_width, piece_height) in placements.items():
+            if pieces[name] is not None and piece_width > 0 and piece_height > 0:
+                self._canvas.blit(
+                    scale_nearest(pieces[name], piece_width, piece_height), piece_x, piece_y
+                )
+        return x + left, y + top, inner_width, inner_height
+
+    def _text(self, properties):
+        return expand_text(properties, self._timeout_seconds)
+
+    def render_desktop(self, global_properties):
+        canvas = self._canvas
+        canvas.fill(
+            0,
+            0,
+            canvas.width,
+            canvas.height,
+            parse_color(global_properties.get("desktop-color"), (0, 0, 0)),
+        )
+
+        desktop_image = global_properties.get("desktop-image")
+        if desktop_image:
+            picture = self.picture(desktop_image)
+            if picture is not None:
+                method = global_properties.get("desktop-image-scale-method", "stretch")
+                if method == "stretch":
+                    width, height = canvas.width, canvas.height
+                elif method == "fitwidth":
+                    width = canvas.width
+                    height = picture.height * canvas.width // max(1, picture.width)
+                elif method == "fitheight":
+                    width = picture.width * canvas.height // max(1, picture.height)
+                    height = canvas.height
+                else:  # i.e. "crop" or "padding", at natural size
+                    width, height = picture.size
+                canvas.blit(
+                    scale_nearest(picture, width, height),
+                    (canvas.width - width) // 2,
+                    (canvas.height - height) // 2,
+                )
+
+        title = global_properties.get("title-text")
+        font = self._fonts.get(global_properties.get("title-font"))
+        if title and font is not None:
+            draw_text(
+                canvas,
+                font,
+                title,
+                (canvas.width - text_width(font, title)) // 2,
+                40 + font.ascent,
+                parse_color(global_properties.get("title-color"), (255, 255, 255)),
+            )
+
+    def render_components(self, components, x, y, width, height, layout="canvas"):
+        for component in components:
+            properties = component.properties
+            if properties.get("visible", "true") == "false":
+                continue
+            rect = (
+                x + resolve_length(properties.get("left"), width, 0),
+                y + resolve_length(properties.get("top"), height, 0),
+                resolve_length(properties.get("width"), width, width),
+                resolve_length(
+                    properties.get("height"), height, self._preferred_height(component)
+                ),
+            )
+            draw = getattr(self, "_draw_" + component.kind, None)
+            if draw is not None:
+                draw(component, *rect)
+            if layout == "vbox":
+                y += rect[3]
+                height -= rect[3]
+            elif layout == "hbox":
+                x += rect[2]
+                width -= rect[2]
+
+    def _preferred_height(self, component):
+        if component.kind in ("label", "progress_bar"):
+            font = self._fonts.get(component.properties.get("font"))
+            return font.height if font is not None else 0
+        return self._canvas.height
+
+    def _draw_canvas(self, component, x, y, width, height):
+        self.render_components(component.children, x, y, width, height)
+
+    def _draw_vbox(self, component, x, y, width, height):
+        self.render_components(component.children, x, y, width, height, layout="vbox")
+
+    def _draw_hbox(self, component, x, y, width, height):
+        self.render_components(component.children, x, y, width, height, layout="hbox")
+
+    def _draw_image(self, component, x, y, width, height):
+        file = component.properties.get("file")
+        picture = self.picture(file) if file else None
+        if picture is None:
+            return
+        if "width" in component.properties or "height" in component.properties:
+            picture = scale_nearest(picture, width, height)
+        self._canvas.blit(picture, x, y)
+
+    def _draw_aligned_text(self, properties, text, x, y, width, height, default_rgb):
+        font = self._fonts.get(properties.get("font"))
+        if not text or font is None:
+            return
+        text_x = x
+        align = properties.get("align", "left")
+        if align == "center":
+            text_x = x + (width - text_width(font, text)) // 2
+        elif align == "right":
+            text_x = x + width - text_width(font, text)
+        baseline = y + (height - font.height) // 2 + font.ascent
+        draw_text(self._canvas, font, text, text_x, baseline, default_rgb)
+
+    def _draw_label(self, component, x, y, width, height):
+        properties = component.properties
+        rgb = parse_color(properties.get("color"), (0, 0, 0))
+        self._draw_aligned_text(properties, self._text(properties), x, y, width, height, rgb)
+
+    def _draw_progress_bar(self, component, x, y, width, height):
+        properties = component.properties
+        # NOTE: Drawn at the start of the countdown, i.e. with no progress yet
+        if properties.get("bar_style"):
+            self.styled_box(properties["bar_style"], x, y, width, height)
+        else:
+            self._canvas.fill(
+                x, y, width, height, parse_color(properties.get("border_color"), (0, 0, 0))
+            )
+            self._canvas.fill(
+                x + 1,
+                y + 1,
+                width - 2,
+                height - 2,
+                parse_color(properties.get("bg_color"), (255, 255, 255)),
+            )
+        if properties.get("show_text", "true") != "false":
+            properties = dict(properties, align="center")
+            rgb = parse_color(properties.get("text_color"), (0, 0, 0))
+            self._draw_aligned_text(properties, self._text(properties), x, y, width, height, rgb)
+
+    def _draw_boot_menu(self, component, x, y, width, height):
+        properties = component.properties
+
+        def number(name):
+            return resolve_length(properties.get(name), 0, _MENU_DEFAULTS[name])
+
+        item_font = self._fonts.get(properties.get("item_font"))
+        selected_font = item_font
+        if properties.get("selected_item_font", "inherit") != "inherit":
+            selected_font = self._fonts.get(properties["selected_item_font"])
+        item_rgb = parse_color(properties.get("item_color"), (0, 0, 0))
+        selected_rgb = item_rgb
+        if properties.get("selected_item_color", "inherit") != "inherit":
+            selected_rgb = parse_color(properties["selected_item_color"], item_rgb)
+
+        inner_x, inner_y, inner_width, inner_height = self.styled_box(
+            properties.get("menu_pixmap_style"), x, y, width, height
+        )
+        item_height = number("item_height")
+        item_padding = number("item_padding")
+        icon_width = number("icon_width")
+        icon_height = number("icon_height")
+
+        item_x = inner_x + item_padding
+        item_width = inner_width - 2 * item_padding
+        item_y = inner_y + item_padding
+        for index, (title, classes) in enumerate(self._menu_entries):
+            if item_y + item_height > inner_y + inner_height:
+                break
+            selected = index == 0  # i.e. "set default=0"
+            style = properties.get(
+                "selected_item_pixmap_style" if selected else "item_pixmap_style"
+            )
+            self.styled_box(style, item_x, item_y, item_width, item_height)
+
+            for grub_class in classes:
+                icon = self.picture(os.path.join(ICON_DIR, grub_class + ".png"))
+                if icon is not None:
+                    self._canvas.blit(
+                        scale_nearest(icon, icon_width, icon_height),
+                        item_x,
+                        item_y + (item_height - icon_height) // 2,
+                    )
+                    break
+
+            font = selected_font if selected else item_font
+            if font is not None:
+                draw_text(
+                    self._canvas,
+                    font,
+                    title,
+                    item_x + icon_width + number("item_icon_space"),
+                    item_y + (item_height - font.height) // 2 + font.ascent,
+                    selected_rgb if selected else item_rgb,
+                )
+            item_y += item_height + number("item_spacing")
+
+
+def render_theme(abs_theme_txt, abs_font_paths, menu_entries, resolution, timeout_seconds):
+    """
+    Return an approximation of the GRUB menu that the theme would show
+    as an ``imagediff.Image`` of size ``resolution``, without booting anything
+    """
+    with open(abs_theme_txt, encoding="utf-8", errors="replace") as f:
+        global_properties, components = parse_theme_txt(f.read())
+
+    canvas = Canvas(*resolution)
+    renderer = _Renderer(
+        canvas,
+        os.path.dirname(abs_theme_txt),
+        FontSet(abs_font_paths),
+        list(menu_entries),
+        timeout_seconds,
+    )
+    renderer.render_desktop(global_properties)
+    renderer.render_components(components, 0, 0, canvas.width, canvas.height)
+    return canvas.to_image()
+
+
+def render_background(abs_image_path, resolution):
+    """
+    Return the background image stretched to ``resolution``
+    like GRUB command ``background_image`` does
+    """
+    canvas = Canvas(*resolution)
+    picture = load_picture(abs_image_path)
+    canvas.blit(scale_nearest(picture, canvas.width, canvas.height), 0, 0)
+    return canvas.to_image()
@@ -0,0 +1,212 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import asyncio
+import os
+import shutil
+import tempfile
+
+from .incremental import fingerprint
+from .memory import estimate_guest_memory, iterate_theme_pictures
+from .preview import (
+    DEFAULT_MEMORY_MIB,
+    Commands,
+    PlatformPreview,
+    RunSettings,
+    build_image,
+    check_qemu_exit_code,
+    find_grub2_platform_directory,
+    find_omvf_image,
+    grub2_platforms,
+    prepare_source,
+    resolve_disk_bus,
+    run_qemu,
+)
+from .staging import choose_staging_area, estimate_staging_bytes
+
+
+class PreviewSession:
+    """
+    Reusable context for previewing themes on a single GRUB platform from Python
+
+    Commands, the GRUB platform directory and the OVMF image are resolved once
+    on creation; rescue images are kept for the lifetime of the session
+    and only rebuilt when their inputs change, removing the outdated image.
+    Unless ``memory`` is given in MiB, guest memory is sized for the theme
+    of each rescue image. Failures are raised as
+    ``errors.PreviewError`` subclasses (or ``OSError``), never as ``SystemExit``.
+    """
+
+    def __init__(
+        self,
+        platform="auto",
+        grub2_mkrescue=None,
+        qemu=None,
+        xorriso="xorriso",
+        enable_kvm=True,
+        staging="auto",
+        disk_bus="auto",
+        memory="auto",
+        memory_backing="ram",
+        verbose=False,
+    ):
+        self.commands = Commands(grub2_mkrescue, qemu, xorriso)
+        self.commands.check()
+
+        platforms = grub2_platforms(platform)
+        if len(platforms) != 1:
+            raise ValueError(f"Platform {platform!r} needs one session per GRUB platform")
+        self.grub2_platform = platforms[0]
+        self.grub2_platform_directory = find_grub2_platform_directory(self.grub2_platform)
+        self.omvf_image_path = None  # i.e. no EFI
+        if "efi" in self.grub2_platform:
+            self.omvf_image_path = find_omvf_image()
+
+        self._enable_kvm = enable_kvm
+        self._disk_bus = resolve_disk_bus(disk_bus, self.grub2_platform)
+        self._memory = memory
+        self._memory_backing = memory_backing
+        self._verbose = verbose
+        self.staging_area = choose_staging_area(
+            staging, estimate_staging_bytes([self.grub2_platform_directory])
+        )
+        self._abs_tmp_folder = self.staging_area.make_folder()
+        self._images = {}  # build request -> (input fingerprint, absolute path of rescue image)
+        self._memory_mibs = {}  # absolute path of rescue image -> guest memory sized for it
+
+    def close(self):
+        """
+        Remove all rescue images and other temporary files of this session
+        """
+        self._images.clear()
+        shutil.rmtree(self._abs_tmp_folder, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _make_preview(self):
+        abs_tmp_folder = tempfile.mkdtemp(dir=self._abs_tmp_folder)
+        memory_mib = DEFAULT_MEMORY_MIB if self._memory == "auto" else self._memory
+        preview = PlatformPreview(
+            self.grub2_platform, abs_tmp_folder, disk_bus=self._disk_bus, memory_mib=memory_mib
+        )
+        preview.grub2_platform_directory = self.grub2_platform_directory
+        preview.omvf_image_path = self.omvf_image_path
+        os.mkdir(preview.abs_tmp_folder)
+        return preview
+
+    async def build_image_async(
+        self,
+        source,
+        grub_cfg=None,
+        resolution=None,
+        timeout_seconds=30,
+        addition_requests=(),
+        plain_rescue_image=False,
+    ):
+        """
+        Build a rescue image for theme directory (or image file or archive) ``source``
+        and return its absolute path; parameters match the command line options
+        """
+        theme = prepare_source(source, grub_cfg, resolution, timeout_seconds)
+        abs_addition_sources = [request.partition("=")[2] for request in addition_requests]
+        key = (
+            theme.abs_path,
+            theme.grub_cfg_content,
+            tuple(addition_requests),
+            plain_rescue_image,
+        )
+        input_fingerprint = fingerprint([theme.abs_path] + abs_addition_sources)
+        previous_fingerprint, abs_img_file = self._images.pop(key, (None, None))
+        if abs_img_file is not None:
+            if previous_fingerprint == input_fingerprint and os.path.exists(abs_img_file):
+                self._images[key] = (input_fingerprint, abs_img_file)
+                return abs_img_file
+            self._remove_image(abs_img_file)
+
+        preview = self._make_preview()
+        abs_grub_cfg_file = os.path.join(preview.abs_tmp_folder, "grub.cfg")
+        with open(abs_grub_cfg_file, "w") as f:
+            f.write(theme.grub_cfg_content)
+        grafts = (
+            [] if plain_rescue_image else theme.make_grafts(abs_grub_cfg_file, addition_requests)
+        )
+        await build_image(preview, self.commands, grafts, verbose=self._verbose)
+
+        if self._memory == "auto":
+            self._memory_mibs[preview.abs_img_file] = estimate_guest_memory(
+                self.grub2_platform,
+                list(iterate_theme_pictures(theme.abs_path)),
+                theme.abs_font_paths(),
+                resolution,
+            ).mib
+        self._images[key] = (input_fingerprint, preview.abs_img_file)
+        return preview.abs_img_file
+
+    def _remove_image(self, abs_img_file):
+        """
+        Remove an outdated rescue image together with the folder it was built in
+        """
+        self._memory_mibs.pop(abs_img_file, None)
+        # NOTE: See _make_preview for the two folder levels
+        shutil.rmtree(os.path.dirname(os.path.dirname(abs_img_file)), ignore_errors=True)
+
+    def _make_run_settings(self, **kwargs):
+        return RunSettings(
+            enable_kvm=self._enable_kvm,
+            memory_backing=self._memory_backing,
+            verbose=self._verbose,
+            **kwargs,
+        )
+
+    async def _run(self, abs_img_file, settings):
+        preview = self._make_preview()
+        preview.abs_img_file = os.path.abspath(abs_img_file)
+        preview.memory_mib = self._memory_mibs.get(preview.abs_img_file, preview.memory_mib)
+        try:
+            await run_qemu(preview, self.commands, settings)
+        finally:
+            shutil.rmtree(os.path.dirname(preview.abs_tmp_folder), ignore_errors=True)
+        check_qemu_exit_code(preview)
+        return preview
+
+    async def launch_async(
+        self, abs_img_file, display=None, vga=None, full_screen=False, deadline_seconds=None
+    ):
+        """
+        Run QEMU on a rescue image until it exits and return its exit code
+        """
+        settings = self._make_run_settings(
+            display=display, vga=vga, full_screen=full_screen, deadline_total=deadline_seconds
+        )
+        preview = await self._run(abs_img_file, settings)
+        return preview.qemu_exit_code
+
+    async def screenshot_async(
+        self, abs_img_file, delay_seconds=3.0, vga=None, capture="qmp", deadline_seconds=None
+    ):
+        """
+        Run QEMU on a rescue image without display and return
+        the settled GRUB screen as an ``imagediff.Image``
+        """
+        settings = self._make_run_settings(
+            vga=vga,
+            capture=capture,
+            screenshot=True,
+            screenshot_delay=delay_seconds,
+            deadline_total=deadline_seconds,
+        )
+        preview = await self._run(abs_img_file, settings)
+        return preview.screenshot
+
+    def build_image(self, *args, **kwargs):
+        return asyncio.run(self.build_image_async(*args, **kwargs))
+
+    def launch(self, *args, **kwargs):
+        return asyncio.run(self.launch_async(*args, **kwargs))
+
+    def screenshot(self, *args, **kwargs):
+        return asyncio.run(self.screenshot_async(*args, **kwargs))
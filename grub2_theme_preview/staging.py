@@ -0,0 +1,121 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import errno
+import os
+import tempfile
+
+# Shared memory that glibc uses for POSIX shared memory, tmpfs on all major distributions
+_SHM_DIRECTORY = "/dev/shm"
+
+# File systems whose content lives in memory rather than on disk
+_RAM_FILE_SYSTEM_TYPES = {"ramfs", "tmpfs"}
+
+# Room for ISO 9660 structures, El Torito and EFI boot images next to the staged files
+_IMAGE_OVERHEAD_BYTES = 16 * 1024 * 1024
+
+# Share of the available space in RAM that staging may take up at most
+_MAX_RAM_SHARE = 0.5
+
+
+def _iterate_mount_points(abs_mounts_file="/proc/mounts"):
+    try:
+        with open(abs_mounts_file) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 3:
+                    # NOTE: Spaces and such are octal-escaped, e.g. "\040"
+                    mount_point = fields[1].encode("latin-1").decode("unicode_escape")
+                    yield mount_point, fields[2]
+    except OSError:
+        return
+
+
+def get_file_system_type(abs_path, abs_mounts_file="/proc/mounts"):
+    """
+    Return the type of the file system that ``abs_path`` resides on, e.g. "tmpfs",
+    or ``None`` if unknown
+    """
+    abs_path = os.path.realpath(abs_path)
+    best_mount_point = None
+    best_type = None
+    for mount_point, file_system_type in _iterate_mount_points(abs_mounts_file):
+        if abs_path == mount_point or abs_path.startswith(mount_point.rstrip("/") + "/"):
+            if best_mount_point is None or len(mount_point) >= len(best_mount_point):
+                best_mount_point = mount_point
+                best_type = file_system_type
+    return best_type
+
+
+def get_available_bytes(abs_path):
+    stat = os.statvfs(abs_path)
+    return stat.f_bavail * stat.f_frsize
+
+
+def estimate_staging_bytes(abs_paths, image_count=1):
+    """
+    Estimate the bytes needed to stage ``image_count`` rescue images
+    made of the files at ``abs_paths``
+    """
+    total = 0
+    for abs_path in abs_paths:
+        if os.path.isdir(abs_path):
+            for root, _dirs, files in os.walk(abs_path):
+                for file in files:
+                    abs_file = os.path.join(root, file)
+                    if os.path.isfile(abs_file):
+                        total += os.path.getsize(abs_file)
+        elif os.path.isfile(abs_path):
+            total += os.path.getsize(abs_path)
+    return (total + _IMAGE_OVERHEAD_BYTES) * image_count
+
+
+class StagingArea:
+    """
+    Parent directory of the temporary folders that rescue images are assembled in
+    """
+
+    def __init__(self, abs_directory, file_system_type):
+        self.abs_directory = abs_directory
+        self.file_system_type = file_system_type  # None if unknown
+
+    @property
+    def in_ram(self):
+        return self.file_system_type in _RAM_FILE_SYSTEM_TYPES
+
+    def describe(self):
+        if self.in_ram:
+            backend = f"RAM ({self.file_system_type})"
+        else:
+            backend = f"disk ({self.file_system_type or 'unknown file system'})"
+        return f'{backend} at "{self.abs_directory}"'
+
+    def make_folder(self):
+        return tempfile.mkdtemp(dir=self.abs_directory)
+
+
+def choose_staging_area(preference, required_bytes, abs_shm_dir=_SHM_DIRECTORY):
+    """
+    Return a ``StagingArea`` in RAM (for preference "ram", or for "auto"
+    if there is enough room) or in the default temporary directory
+    """
+    default_dir = tempfile.gettempdir()
+    default_area = StagingArea(default_dir, get_file_system_type(default_dir))
+    if preference == "disk" or (preference == "auto" and default_area.in_ram):
+        return default_area
+
+    shm_area = StagingArea(abs_shm_dir, get_file_system_type(abs_shm_dir))
+    shm_usable = os.path.isdir(abs_shm_dir) and os.access(abs_shm_dir, os.W_OK) and shm_area.in_ram
+
+    if preference == "ram":
+        if not shm_usable:
+            raise OSError(
+                errno.ENOENT,
+                f'No writable RAM-backed file system at "{abs_shm_dir}" to stage images in',
+            )
+        return shm_area
+
+    if shm_usable and required_bytes <= get_available_bytes(abs_shm_dir) * _MAX_RAM_SHARE:
+        return shm_area
+
+    return default_area
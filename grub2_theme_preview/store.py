@@ -0,0 +1,153 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import contextlib
+import errno
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+
+# From <linux/fs.h>, _IOW(0x94, 9, int)
+_FICLONE = 0x40049409
+
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+# Content up to this size is hashed in memory before anything is written to disk
+_BUFFER_MAX_SIZE = 8 * 1024 * 1024
+
+# Errors that mean "not supported here" rather than "broken"
+_LINK_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EINVAL}
+
+
+class StoreStatistics:
+    def __init__(self):
+        self.bytes_stored = 0  # new unique content
+        self.bytes_deduplicated = 0  # content that was in the store already
+        self.link_methods = {"hardlink": 0, "reflink": 0, "copy": 0}
+
+    def describe(self):
+        methods = ", ".join(f"{count} {method}" for method, count in self.link_methods.items())
+        return (
+            f"{methods}; {self.bytes_stored} byte(s) new in store,"
+            f" {self.bytes_deduplicated} byte(s) deduplicated"
+        )
+
+
+def _reflink(abs_source_path, abs_target_path):
+    with open(abs_source_path, "rb") as source, open(abs_target_path, "wb") as target:
+        try:
+            fcntl.ioctl(target.fileno(), _FICLONE, source.fileno())
+        except OSError:
+            target.close()
+            os.remove(abs_target_path)
+            raise
+
+
+class ContentStore:
+    """
+    Directory of files named by the SHA-256 digest of their content,
+    to be linked into staging trees rather than copied over and over
+    """
+
+    def __init__(self, abs_root):
+        self.abs_root = abs_root
+        self.statistics = StoreStatistics()
+        self._hardlinks_supported = True
+        self._reflinks_supported = True
+
+    def _object_path(self, digest):
+        return os.path.join(self.abs_root, digest[:2], digest[2:])
+
+    def add_stream(self, source):
+        """
+        Store the content read from file object ``source``, return its digest
+        """
+        os.makedirs(self.abs_root, exist_ok=True)
+        sha256 = hashlib.sha256()
+        buffered = bytearray()
+        chunks = iter(lambda: source.read(_COPY_CHUNK_SIZE), b"")
+        digest = None
+        for chunk in chunks:
+            sha256.update(chunk)
+            buffered += chunk
+            if len(buffered) > _BUFFER_MAX_SIZE:
+                break
+        else:
+            # NOTE: Known small content never touches the disk again
+            digest = sha256.hexdigest()
+            if self._is_stored(digest, len(buffered)):
+                return digest
+
+        # NOTE: Large content is spooled next to the objects while hashing the rest
+        fd, abs_tmp_path = tempfile.mkstemp(dir=self.abs_root, prefix=".incoming-")
+        try:
+            with os.fdopen(fd, "wb") as target:
+                target.write(buffered)
+                size = len(buffered)
+                del buffered
+                for chunk in chunks:
+                    sha256.update(chunk)
+                    target.write(chunk)
+                    size += len(chunk)
+
+            if digest is None:
+                digest = sha256.hexdigest()
+                if self._is_stored(digest, size):
+                    return digest
+
+            # NOTE: Objects are shared by all hardlinks to them and must not change
+            os.chmod(abs_tmp_path, 0o444)
+            abs_object_path = self._object_path(digest)
+            os.makedirs(os.path.dirname(abs_object_path), exist_ok=True)
+            os.replace(abs_tmp_path, abs_object_path)
+            self.statistics.bytes_stored += size
+            return digest
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(abs_tmp_path)
+
+    def _is_stored(self, digest, size):
+        if not os.path.exists(self._object_path(digest)):
+            return False
+        self.statistics.bytes_deduplicated += size
+        return True
+
+    def add_file(self, abs_path):
+        with open(abs_path, "rb") as source:
+            return self.add_stream(source)
+
+    def link(self, digest, abs_target_path):
+        """
+        Make ``abs_target_path`` a hardlink to the stored object, or a reflink,
+        or a copy as a last resort; return the method used
+        """
+        abs_object_path = self._object_path(digest)
+
+        if self._hardlinks_supported:
+            try:
+                os.link(abs_object_path, abs_target_path)
+            except OSError as e:
+                if e.errno not in _LINK_UNSUPPORTED_ERRNOS:
+                    raise
+                self._hardlinks_supported = False
+            else:
+                return self._count("hardlink")
+
+        if self._reflinks_supported:
+            try:
+                _reflink(abs_object_path, abs_target_path)
+            except OSError as e:
+                if e.errno not in _LINK_UNSUPPORTED_ERRNOS | {errno.ENOTTY, errno.EOPNOTSUPP}:
+                    raise
+                self._reflinks_supported = False
+            else:
+                return self._count("reflink")
+
+        shutil.copyfile(abs_object_path, abs_target_path)
+        return self._count("copy")
+
+    def _count(self, method):
+        self.statistics.link_methods[method] += 1
+        return method
@@ -0,0 +1,201 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import asyncio
+import contextlib
+
+from .errors import PreviewError
+
+# Echoed to the serial port by the generated grub.cfg right before the menu shows
+MENU_READY_MARKER = "G2TP-MENU-READY"
+
+_SERIAL_POLL_INTERVAL_SECONDS = 0.1
+_LIVENESS_INTERVAL_SECONDS = 2.0
+_LIVENESS_TIMEOUT_SECONDS = 5.0
+_SHUTDOWN_GRACE_SECONDS = 3.0
+
+# How long the screen may take to change after the serial marker unless
+# the menu deadline ends sooner, e.g. for GRUB to decode large theme images
+_MENU_DRAWN_TIMEOUT_SECONDS = 30.0
+
+# QMP "query-status" states that will not recover by themselves
+_DEAD_RUN_STATES = {"guest-panicked", "internal-error", "io-error", "shutdown"}
+
+
+class SupervisionError(PreviewError):
+    pass
+
+
+class QemuSupervisor:
+    """
+    Watches over a running QEMU process: enforces a deadline for GRUB's menu
+    to show up and for the total runtime, checks liveness through QMP,
+    and shuts QEMU down with escalation (QMP "quit", SIGTERM, SIGKILL).
+    """
+
+    def __init__(self, process, menu_deadline_seconds=None, total_deadline_seconds=None):
+        self._process = process
+        self._loop = asyncio.get_running_loop()
+        self._start_time = self._loop.time()
+        self._menu_deadline_seconds = menu_deadline_seconds
+        self._total_deadline_seconds = total_deadline_seconds
+        self._qmp = None
+        self._liveness_task = None
+        self._failure = asyncio.get_running_loop().create_future()
+        self.menu_time = None  # event loop time of the menu, once known
+        self.menu_seconds = None  # time to menu, once known
+
+    @property
+    def elapsed_seconds(self):
+        return self._loop.time() - self._start_time
+
+    def _fail(self, reason):
+        if not self._failure.done():
+            self._failure.set_exception(SupervisionError(reason))
+
+    async def guard(self, awaitable, what):
+        """
+        Await ``awaitable`` unless QEMU exits, stops responding
+        or runs past its total deadline first
+        """
+        work = asyncio.ensure_future(awaitable)
+        exiting = asyncio.ensure_future(self._process.wait())
+        watched = {work, exiting, self._failure}
+        timeout_seconds = None
+        if self._total_deadline_seconds is not None:
+            timeout_seconds = max(0.0, self._total_deadline_seconds - self.elapsed_seconds)
+        try:
+            await asyncio.wait(
+                watched, timeout=timeout_seconds, return_when=asyncio.FIRST_COMPLETED
+            )
+            if work.done():
+                return work.result()
+            if self._failure.done():
+                self._failure.result()  # raises
+            if exiting.done():
+                raise SupervisionError(
+                    f"QEMU exited with code {self._process.returncode} while waiting for {what}."
+                )
+            raise SupervisionError(
+                f"Total deadline of {self._total_deadline_seconds:g} seconds exceeded"
+                f" while waiting for {what}."
+            )
+        finally:
+            for future in (work, exiting):
+                if not future.done():
+                    future.cancel()
+                    with contextlib.suppress(asyncio.CancelledError):
+                        await future
+
+    async def wait(self):
+        """
+        Wait for QEMU to exit by itself, return its exit code
+        """
+        return await self.guard(self._process.wait(), "QEMU to exit")
+
+    async def _wait_for_serial_marker(self, abs_serial_path):
+        offset = 0
+        pending = b""
+        marker = MENU_READY_MARKER.encode("ascii")
+        while True:
+            with contextlib.suppress(FileNotFoundError), open(abs_serial_path, "rb") as f:
+                f.seek(offset)
+                chunk = f.read()
+                offset += len(chunk)
+                pending += chunk
+                if marker in pending:
+                    return
+                pending = pending[-len(marker) :]
+            await asyncio.sleep(_SERIAL_POLL_INTERVAL_SECONDS)
+
+    async def _wait_for_menu_drawn(self, abs_serial_path, capture):
+        await self._wait_for_serial_marker(abs_serial_path)
+        marker_time = self._loop.time()
+        if capture is None:
+            return marker_time
+        # NOTE: The marker is echoed before GRUB loads the theme, so only a redrawn
+        #       and then settled screen tells that theme assets were read and drawn
+        drawn_time = await capture.wait_for_redrawn(_MENU_DRAWN_TIMEOUT_SECONDS)
+        if drawn_time is None:
+            print(
+                "INFO: Screen did not change after GRUB announced its menu,"
+                " timing the announcement instead."
+            )
+            return marker_time
+        return drawn_time
+
+    async def wait_for_menu(self, abs_serial_path, capture=None):
+        """
+        Wait for the generated grub.cfg to announce the menu on the serial port
+        and, given a ``capture.QmpScreenCapture``, for the menu to be drawn
+        """
+        waiting = self._wait_for_menu_drawn(abs_serial_path, capture)
+        if self._menu_deadline_seconds is not None:
+            remaining_seconds = max(0.0, self._menu_deadline_seconds - self.elapsed_seconds)
+            waiting = asyncio.wait_for(waiting, remaining_seconds)
+        try:
+            menu_time = await self.guard(waiting, "the GRUB menu")
+        except asyncio.TimeoutError:
+            raise SupervisionError(
+                f"GRUB menu did not show up within {self._menu_deadline_seconds:g} seconds."
+            )
+        self.menu_time = menu_time
+        self.menu_seconds = menu_time - self._start_time
+        print(f"INFO: GRUB menu showed up after {self.menu_seconds:.2f} seconds.")
+
+    def watch_liveness(self, qmp):
+        """
+        Start checking periodically that QEMU still answers QMP
+        and that the virtual machine is in a healthy state
+        """
+        self._qmp = qmp
+        self._liveness_task = asyncio.ensure_future(self._check_liveness())
+
+    async def _check_liveness(self):
+        while True:
+            await asyncio.sleep(_LIVENESS_INTERVAL_SECONDS)
+            try:
+                status = await asyncio.wait_for(
+                    self._qmp.execute("query-status"), _LIVENESS_TIMEOUT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                self._fail(
+                    f"QEMU did not answer QMP within {_LIVENESS_TIMEOUT_SECONDS:g} seconds."
+                )
+                return
+            except Exception:
+                return  # connection closed, process exit is noticed elsewhere
+            if status.get("status") in _DEAD_RUN_STATES:
+                self._fail(f"Virtual machine entered state {status['status']!r}.")
+                return
+
+    async def _wait_for_exit(self, timeout_seconds):
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self._process.wait(), timeout_seconds)
+        return self._process.returncode is not None
+
+    async def shutdown(self):
+        """
+        Stop QEMU, escalating from QMP "quit" to SIGTERM to SIGKILL
+        """
+        if self._liveness_task is not None:
+            self._liveness_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._liveness_task
+
+        if self._process.returncode is not None:
+            return
+
+        if self._qmp is not None:
+            with contextlib.suppress(Exception):
+                await asyncio.wait_for(self._qmp.quit(), _SHUTDOWN_GRACE_SECONDS)
+            if await self._wait_for_exit(_SHUTDOWN_GRACE_SECONDS):
+                return
+
+        self._process.terminate()
+        if await self._wait_for_exit(_SHUTDOWN_GRACE_SECONDS):
+            return
+
+        print("INFO: QEMU did not terminate in time, killing it.")
+        self._process.kill()
+        await self._process.wait()
@@ -0,0 +1,174 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import gzip
+import io
+import os
+import tarfile
+import unittest
+import zipfile
+from contextlib import redirect_stdout
+from tempfile import TemporaryDirectory
+from textwrap import dedent
+from unittest.mock import patch
+
+from parameterized import parameterized
+
+from ..archive import select_referenced_files, stage_theme_archive
+
+_THEME_TXT = dedent("""\
+    desktop-image: "background.png"
+    + boot_menu {
+        item_pixmap_style = "item_*.png"
+    }
+""")
+
+_MEMBERS = {
+    "mytheme/theme.txt": _THEME_TXT.encode("utf-8"),
+    "mytheme/background.png": b"background",
+    "mytheme/item_c.png": b"item",
+    "mytheme/icons/debian.png": b"icon",
+    "mytheme/icons/gentoo.png": b"icon",
+    "mytheme/f/unifont.pf2": b"font",
+    "mytheme/preview.png": b"not referenced",
+    "README.md": b"not referenced",
+}
+
+_EXPECTED_STAGED = {
+    "theme.txt",
+    "background.png",
+    "item_c.png",
+    "icons/debian.png",
+    "icons/gentoo.png",
+    "f/unifont.pf2",
+}
+
+
+def _write_tar(path, mode, members=_MEMBERS):
+    with tarfile.open(path, mode) as archive:
+        for name, content in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+
+
+def _write_zip(path, _mode):
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, content in _MEMBERS.items():
+            archive.writestr(name, content)
+
+
+def _list_files(abs_dir):
+    return {
+        os.path.relpath(os.path.join(root, basename), abs_dir)
+        for root, _directories, files in os.walk(abs_dir)
+        for basename in files
+    }
+
+
+class SelectReferencedFilesTest(unittest.TestCase):
+    def test_selection(self):
+        relative_paths = [name.split("/", 1)[1] for name in _MEMBERS if "/" in name]
+        self.assertEqual(select_referenced_files(relative_paths, _THEME_TXT), _EXPECTED_STAGED)
+
+
+class StageThemeArchiveTest(unittest.TestCase):
+    @parameterized.expand(
+        [
+            ("theme.tar.gz", _write_tar, "w:gz"),
+            ("theme.tar.xz", _write_tar, "w:xz"),
+            ("theme.zip", _write_zip, None),
+        ]
+    )
+    def test_stages_referenced_files_only(self, filename, write_archive, mode):
+        with TemporaryDirectory() as tempdir:
+            archive_path = os.path.join(tempdir, filename)
+            write_archive(archive_path, mode)
+            cache_dir = os.path.join(tempdir, "cache")
+
+            with redirect_stdout(io.StringIO()):
+                theme_dir = stage_theme_archive(archive_path, cache_dir)
+
+            self.assertEqual(_list_files(theme_dir), _EXPECTED_STAGED)
+            with open(os.path.join(theme_dir, "background.png"), "rb") as f:
+                self.assertEqual(f.read(), b"background")
+
+    def test_cache_is_reused(self):
+        with TemporaryDirectory() as tempdir:
+            archive_path = os.path.join(tempdir, "theme.tar")
+            _write_tar(archive_path, "w")
+            cache_dir = os.path.join(tempdir, "cache")
+
+            with redirect_stdout(io.StringIO()):
+                first_theme_dir = stage_theme_archive(archive_path, cache_dir)
+            with redirect_stdout(io.StringIO()) as stdout:
+                second_theme_dir = stage_theme_archive(archive_path, cache_dir)
+
+            self.assertEqual(first_theme_dir, second_theme_dir)
+            self.assertIn("Re-using cached theme files", stdout.getvalue())
+
+    def test_content_is_shared_between_archives(self):
+        with TemporaryDirectory() as tempdir:
+            tar_path = os.path.join(tempdir, "theme.tar")
+            _write_tar(tar_path, "w")
+            zip_path = os.path.join(tempdir, "theme.zip")
+            _write_zip(zip_path, None)
+            cache_dir = os.path.join(tempdir, "cache")
+
+            with redirect_stdout(io.StringIO()):
+                first_theme_dir = stage_theme_archive(tar_path, cache_dir)
+            with redirect_stdout(io.StringIO()) as stdout:
+                second_theme_dir = stage_theme_archive(zip_path, cache_dir)
+
+            self.assertNotEqual(first_theme_dir, second_theme_dir)
+            self.assertIn(" 0 byte(s) new in store", stdout.getvalue())
+            self.assertTrue(
+                os.path.samefile(
+                    os.path.join(first_theme_dir, "theme.txt"),
+                    os.path.join(second_theme_dir, "theme.txt"),
+                )
+            )
+
+    @parameterized.expand(
+        [
+            (
+                "theme.txt last",
+                {
+                    **{name: c for name, c in _MEMBERS.items() if name != "mytheme/theme.txt"},
+                    "mytheme/theme.txt": _MEMBERS["mytheme/theme.txt"],
+                },
+            ),
+            (
+                "shallower theme.txt late",
+                {
+                    "other/deeper/theme.txt": b'desktop-image: "x.png"',
+                    "other/deeper/x.png": b"x",
+                    **_MEMBERS,
+                },
+            ),
+        ]
+    )
+    def test_member_order(self, _label, members):
+        with TemporaryDirectory() as tempdir:
+            archive_path = os.path.join(tempdir, "theme.tar.gz")
+            _write_tar(archive_path, "w:gz", members)
+
+            with redirect_stdout(io.StringIO()):
+                theme_dir = stage_theme_archive(archive_path, os.path.join(tempdir, "cache"))
+
+            self.assertEqual(_list_files(theme_dir), _EXPECTED_STAGED)
+
+    def test_compressed_tarball_is_read_forward_only(self):
+        # NOTE: Random access to a .tar.gz goes through GzipFile.seek,
+        #       which rewinds and decompresses again for backward seeks
+        with TemporaryDirectory() as tempdir:
+            archive_path = os.path.join(tempdir, "theme.tar.gz")
+            _write_tar(archive_path, "w:gz")
+
+            with (
+                redirect_stdout(io.StringIO()),
+                patch.object(gzip.GzipFile, "seek", side_effect=AssertionError("seek")),
+            ):
+                theme_dir = stage_theme_archive(archive_path, os.path.join(tempdir, "cache"))
+
+            self.assertEqual(_list_files(theme_dir), _EXPECTED_STAGED)
@@ -0,0 +1,101 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import asyncio
+import time
+import unittest
+
+from ..benchmark import (
+    KeyLatency,
+    fastest_disk_bus,
+    format_boot_time_report,
+    format_latency_report,
+    measure_key_latency,
+)
+
+
+class _FakeVnc:
+    def __init__(self):
+        self.frame_number = 0
+        self.damaged_pixel_count = 0
+        self.last_update_time = None
+        self._pending_updates = []
+
+    async def wait_for_update(self, frame_number, timeout_seconds):
+        if not self._pending_updates:
+            await asyncio.sleep(timeout_seconds)
+            return False
+        delay_seconds, damaged_pixels = self._pending_updates.pop(0)
+        await asyncio.sleep(delay_seconds)
+        self.frame_number += 1
+        self.damaged_pixel_count += damaged_pixels
+        self.last_update_time = time.monotonic()
+        return True
+
+
+class _FakeQmp:
+    def __init__(self, vnc, updates):
+        self._vnc = vnc
+        self._updates = updates
+        self.keys_sent = []
+
+    async def send_key(self, *qcodes):
+        self.keys_sent += qcodes
+        self._vnc._pending_updates += self._updates
+
+
+class MeasureKeyLatencyTest(unittest.TestCase):
+    def test_redraw_is_timed_until_quiet(self):
+        vnc = _FakeVnc()
+        qmp = _FakeQmp(vnc, [(0.02, 100), (0.02, 50)])
+
+        latency = asyncio.run(measure_key_latency(qmp, vnc, "down", quiet_seconds=0.05))
+
+        self.assertEqual(qmp.keys_sent, ["down"])
+        self.assertEqual(latency.damaged_pixels, 150)
+        self.assertGreaterEqual(latency.first_update_seconds, 0.02)
+        self.assertGreaterEqual(latency.settled_seconds, 0.04)
+        self.assertLess(latency.settled_seconds, 0.09)
+
+    def test_no_redraw(self):
+        vnc = _FakeVnc()
+        qmp = _FakeQmp(vnc, [])
+
+        latency = asyncio.run(measure_key_latency(qmp, vnc, "up", timeout_seconds=0.01))
+
+        self.assertIsNone(latency.settled_seconds)
+        self.assertEqual(latency.damaged_pixels, 0)
+
+
+class FormatLatencyReportTest(unittest.TestCase):
+    def test_distribution_per_key(self):
+        report = format_latency_report(
+            [
+                KeyLatency("down", 0.010, 0.020, 100),
+                KeyLatency("down", 0.010, 0.040, 300),
+                KeyLatency("esc", None, None, 0),
+            ]
+        )
+        lines = report.splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(
+            lines[1].split(), ["down", "2", "10.0", "20.0", "30.0", "40.0", "40.0", "200"]
+        )
+        self.assertEqual(lines[2].split(), ["esc", "1", "(no", "redraw)"])
+
+
+class BootTimeReportTest(unittest.TestCase):
+    def test_fastest_excludes_failed_boots(self):
+        boot_times = {
+            ("i386-pc", "ide"): [2.0, 3.0, 4.0],
+            ("i386-pc", "virtio"): [0.5, None],
+            ("i386-pc", "cdrom"): [1.0, 9.0, 1.5],
+            ("x86_64-efi", "ide"): [0.1],
+        }
+
+        self.assertEqual(fastest_disk_bus(boot_times, "i386-pc"), "cdrom")
+        self.assertIsNone(fastest_disk_bus({("i386-pc", "ahci"): [None]}, "i386-pc"))
+
+        lines = format_boot_time_report(boot_times).splitlines()
+        self.assertEqual(lines[1].split(), ["i386-pc", "ide", "3", "2.00", "3.00", "4.00"])
+        self.assertEqual(lines[2].split(), ["i386-pc", "virtio", "2", "(1", "failed)"])
@@ -0,0 +1,78 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import io
+import os
+import unittest
+from contextlib import redirect_stdout
+from tempfile import TemporaryDirectory
+from textwrap import dedent
+
+from ..bls import make_menu_entry, parse_bls_entry, read_bls_entries, replace_blscfg
+
+_FEDORA_ENTRY = dedent("""\
+    # Written by kernel-install
+    title Fedora Linux (6.5.6-300.fc39.x86_64) 39
+    version 6.5.6-300.fc39.x86_64
+    linux /vmlinuz-6.5.6-300.fc39.x86_64
+    initrd /initramfs-6.5.6-300.fc39.x86_64.img
+    options root=UUID=1234 ro rhgb quiet
+    grub_users $grub_users
+    grub_arg --unrestricted
+    grub_class fedora
+""")
+
+
+class ParseBlsEntryTest(unittest.TestCase):
+    def test_fields(self):
+        entry = parse_bls_entry(_FEDORA_ENTRY)
+        self.assertEqual(entry["version"], "6.5.6-300.fc39.x86_64")
+        self.assertEqual(entry["initrd"], ["/initramfs-6.5.6-300.fc39.x86_64.img"])
+        self.assertEqual(entry["grub_class"], ["fedora"])
+        self.assertEqual(entry["options"], "root=UUID=1234 ro rhgb quiet")
+
+
+class MakeMenuEntryTest(unittest.TestCase):
+    def test_menu_entry(self):
+        menu_entry = make_menu_entry("a.conf", parse_bls_entry(_FEDORA_ENTRY))
+        self.assertEqual(
+            menu_entry,
+            dedent("""\
+                menuentry 'Fedora Linux (6.5.6-300.fc39.x86_64) 39' --class fedora {
+                    linux /vmlinuz-6.5.6-300.fc39.x86_64 root=UUID=1234 ro rhgb quiet
+                    initrd /initramfs-6.5.6-300.fc39.x86_64.img
+                }"""),
+        )
+
+    def test_quoting_and_fallback_title(self):
+        menu_entry = make_menu_entry("it's.conf", {})
+        self.assertEqual(menu_entry.splitlines()[0], "menuentry 'it'\\''s' --class kernel {")
+
+
+class ReplaceBlscfgTest(unittest.TestCase):
+    def test_newest_version_first(self):
+        with TemporaryDirectory() as tempdir:
+            for version in ("6.9.1", "6.10.2", "6.10.10"):
+                with open(os.path.join(tempdir, f"id-{version}.conf"), "w") as f:
+                    f.write(f"title Linux {version}\nversion {version}\n")
+
+            self.assertEqual(
+                [entry["version"] for _basename, entry in read_bls_entries(tempdir)],
+                ["6.10.10", "6.10.2", "6.9.1"],
+            )
+
+    def test_replaces_blscfg(self):
+        with TemporaryDirectory() as tempdir:
+            with open(os.path.join(tempdir, "a.conf"), "w") as f:
+                f.write("title Linux\n")
+
+            with redirect_stdout(io.StringIO()):
+                content = replace_blscfg("insmod blscfg\nblscfg\n", tempdir)
+
+        self.assertNotIn("\nblscfg", content)
+        self.assertNotIn("\ninsmod blscfg", content)
+        self.assertIn("menuentry 'Linux' --class kernel {\n}", content)
+
+    def test_without_blscfg_is_untouched(self):
+        content = "menuentry 'x' {\n    reboot\n}\n"
+        self.assertEqual(replace_blscfg(content, "/nonexistent"), content)
@@ -0,0 +1,56 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import asyncio
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from ..capture import QmpScreenCapture
+from ..imagediff import Image, write_ppm
+
+
+class _FakeQmp:
+    """
+    Answers ``screendump`` with the latest of ``(seconds, rgb)`` frames
+    that is due, counting from creation
+    """
+
+    def __init__(self, frames):
+        self._loop = asyncio.get_running_loop()
+        self._start_time = self._loop.time()
+        self._frames = frames
+
+    async def screendump(self, abs_path):
+        elapsed_seconds = self._loop.time() - self._start_time
+        rgb = [rgb for seconds, rgb in self._frames if seconds <= elapsed_seconds][-1]
+        write_ppm(abs_path, Image(2, 2, bytes(rgb) * 4))
+
+
+class QmpScreenCaptureTest(unittest.TestCase):
+    def _wait_for_redrawn(self, frames, timeout_seconds):
+        async def scenario(abs_frame_path):
+            qmp = _FakeQmp(frames)
+            capture = QmpScreenCapture(qmp, abs_frame_path)
+            drawn_time = await capture.wait_for_redrawn(timeout_seconds)
+            return None if drawn_time is None else drawn_time - qmp._start_time
+
+        with TemporaryDirectory() as tempdir:
+            return asyncio.run(scenario(os.path.join(tempdir, "screendump.ppm")))
+
+    def test_redrawn_screen_is_timed_when_it_first_showed_up(self):
+        # i.e. the console until GRUB has loaded the theme, then menu and highlight
+        frames = [(0.0, (0, 0, 0)), (0.3, (0, 0, 128)), (0.4, (0, 128, 128))]
+
+        drawn_seconds = self._wait_for_redrawn(frames, timeout_seconds=5)
+
+        self.assertGreaterEqual(drawn_seconds, 0.4)
+        self.assertLess(drawn_seconds, 0.6)
+
+    def test_unchanged_screen_times_out(self):
+        self.assertIsNone(self._wait_for_redrawn([(0.0, (0, 0, 0))], timeout_seconds=0.3))
+
+    def test_change_back_to_initial_screen_does_not_count(self):
+        frames = [(0.0, (0, 0, 0)), (0.1, (9, 9, 9)), (0.2, (0, 0, 0))]
+
+        self.assertIsNone(self._wait_for_redrawn(frames, timeout_seconds=1))
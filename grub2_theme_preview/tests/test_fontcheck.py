@@ -0,0 +1,92 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import os
+import unittest
+from io import StringIO
+from tempfile import TemporaryDirectory
+from textwrap import dedent
+from unittest.mock import patch
+
+from ..fontcheck import check_glyph_coverage, collect_text_uses, format_font_report
+from ..pf2 import FontSet
+from .test_render import make_pf2
+
+_GLYPH = (1, 1, 0, ["#"])
+
+_GRUB_CFG_CONTENT = dedent("""\
+    menuentry 'Linux' { reboot }
+    submenu 'Ελληνικά' {
+        menuentry 'Ωμέγα' { reboot }
+    }
+""")
+
+
+class FontCheckTest(unittest.TestCase):
+    def setUp(self):
+        self._tempdir = TemporaryDirectory()
+        self.addCleanup(self._tempdir.cleanup)
+        self.latin_path = os.path.join(self._tempdir.name, "latin.pf2")
+        with open(self.latin_path, "wb") as f:
+            f.write(make_pf2("Latin 1", 1, 0, {ord(c): _GLYPH for c in " :Labcdeinux"}))
+        self.greek_path = os.path.join(self._tempdir.name, "greek.pf2")
+        with open(self.greek_path, "wb") as f:
+            f.write(make_pf2("Greek 1", 1, 0, {ord(c): _GLYPH for c in "Ελληνικά"}))
+
+    def _write_theme_txt(self, content):
+        path = os.path.join(self._tempdir.name, "theme.txt")
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def test_collect_text_uses(self):
+        theme_txt = self._write_theme_txt(
+            dedent("""\
+            title-text: "Hello"
+            + boot_menu { item_font = "Latin 1" }
+            + vbox {
+                + label { id = "__timeout__" text = "Boot in %d" font = "Greek 1" }
+            }
+        """)
+        )
+
+        uses = collect_text_uses(theme_txt, _GRUB_CFG_CONTENT, 5)
+
+        self.assertEqual(
+            [(use.where, use.font_name, use.text) for use in uses],
+            [
+                ("title-text", None, "Hello"),
+                ('menu entry "Linux"', "Latin 1", "Linux"),
+                ('menu entry "Ελληνικά"', "Latin 1", "Ελληνικά"),
+                ('menu entry "Ωμέγα"', "Latin 1", "Ωμέγα"),
+                ('label "__timeout__"', "Greek 1", "Boot in 5"),
+            ],
+        )
+
+    def test_missing_glyphs_fall_back_to_other_fonts(self):
+        theme_txt = self._write_theme_txt('+ boot_menu { item_font = "Latin 1" }\n')
+        with patch("sys.stdout", StringIO()):
+            font_set = FontSet([self.latin_path, self.greek_path])
+
+        gaps = check_glyph_coverage(font_set, collect_text_uses(theme_txt, _GRUB_CFG_CONTENT, 5))
+
+        self.assertEqual([gap.use.text for gap in gaps], ["Ελληνικά", "Ωμέγα"])
+        self.assertEqual(gaps[0].unrenderable, [])
+        self.assertEqual(
+            gaps[1].unrenderable, sorted(ord(c) for c in set("Ωμέγα") - set("Ελληνικά"))
+        )
+
+        report = format_font_report(font_set, gaps)
+
+        self.assertIn("\nlatin.pf2 ", report)
+        self.assertIn('menu entry "Ωμέγα" in font "Latin 1": U+03A9 ', report)
+        self.assertIn("not in any loaded font: U+03A9 ", report)
+
+    def test_without_theme_the_fallback_font_is_checked(self):
+        with patch("sys.stdout", StringIO()):
+            font_set = FontSet([self.greek_path, self.latin_path])
+
+        gaps = check_glyph_coverage(font_set, collect_text_uses(None, _GRUB_CFG_CONTENT, 5))
+
+        self.assertEqual({gap.font.name for gap in gaps}, {"Latin 1"})
+        self.assertIn("missing glyphs:", format_font_report(font_set, gaps))
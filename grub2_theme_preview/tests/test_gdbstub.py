@@ -0,0 +1,81 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import asyncio
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from ..gdbstub import GdbStubClient, GdbStubError
+
+
+def _packet(payload):
+    return b"$%s#%02x" % (payload, sum(payload) & 0xFF)
+
+
+async def _serve_fake_gdbstub(reader, writer, memory, received):
+    acknowledging = True
+    while True:
+        start = await reader.read(1)
+        if not start:
+            break
+        if start == b"\x03":
+            received.append("<interrupt>")
+            writer.write(_packet(b"T05thread:01;"))
+            continue
+        if start != b"$":
+            continue  # i.e. acknowledgements
+        payload = (await reader.readuntil(b"#"))[:-1]
+        await reader.readexactly(2)
+        if acknowledging:
+            writer.write(b"+")
+        received.append(payload.decode("ascii"))
+        if payload == b"QStartNoAckMode":
+            acknowledging = False
+            writer.write(_packet(b"OK"))
+        elif payload == b"p8":
+            writer.write(_packet(b"78563412"))
+        elif payload.startswith(b"m"):
+            address, length = (int(field, 16) for field in payload[1:].split(b","))
+            if address + length > len(memory):
+                writer.write(_packet(b"E14"))
+            else:
+                writer.write(_packet(memory[address : address + length].hex().encode("ascii")))
+        elif payload != b"c":
+            writer.write(_packet(b""))
+        await writer.drain()
+    writer.close()
+
+
+class GdbStubClientTest(unittest.TestCase):
+    def test_sample_and_read_memory(self):
+        memory = b"\x00\x01\x02\x03gfxterm\x00"
+        received = []
+
+        async def scenario(socket_path):
+            server = await asyncio.start_unix_server(
+                lambda r, w: _serve_fake_gdbstub(r, w, memory, received), path=socket_path
+            )
+            async with server:
+                client = await GdbStubClient.connect(socket_path)
+                stop_reply = await client.interrupt()
+                program_counter = await client.read_register(8, 4)
+                content = await client.read_memory(4, 8)
+                with self.assertRaises(GdbStubError):
+                    await client.read_memory(8, 100)
+                await client.resume()
+                await client.close()
+                return stop_reply, program_counter, content
+
+        with TemporaryDirectory() as tempdir:
+            stop_reply, program_counter, content = asyncio.run(
+                scenario(os.path.join(tempdir, "gdb.sock"))
+            )
+
+        self.assertEqual(stop_reply, "T05thread:01;")
+        self.assertEqual(program_counter, 0x12345678)
+        self.assertEqual(content, b"gfxterm\x00")
+        self.assertEqual(
+            received,
+            ["QStartNoAckMode", "c", "<interrupt>", "p8", "m4,8", "m8,64", "c"],
+        )
@@ -0,0 +1,138 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import os
+import random
+import unittest
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from parameterized import parameterized
+
+from .. import imagediff
+from ..imagediff import (
+    Image,
+    average_hash,
+    combine_side_by_side,
+    compare_images,
+    make_diff_image,
+    parse_ppm,
+    read_ppm,
+    write_ppm,
+)
+
+
+def make_image(width, height, rgb=(0, 0, 0)):
+    return Image(width, height, bytes(rgb) * (width * height))
+
+
+def with_pixel(image, x, y, rgb):
+    data = bytearray(image.data)
+    i = y * image.stride + 3 * x
+    data[i : i + 3] = bytes(rgb)
+    return Image(image.width, image.height, bytes(data))
+
+
+class PpmTest(unittest.TestCase):
+    def test_round_trip(self):
+        image = with_pixel(make_image(3, 2, (10, 20, 30)), 2, 1, (255, 0, 7))
+        with TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "image.ppm")
+            write_ppm(path, image)
+            self.assertEqual(read_ppm(path).data, image.data)
+
+    def test_comments_in_header(self):
+        image = parse_ppm(b"P6\n# written by QEMU\n1 1\n255\n\x01\x02\x03")
+        self.assertEqual((image.size, image.data), ((1, 1), b"\x01\x02\x03"))
+
+    def test_rejects_other_formats(self):
+        with self.assertRaises(ValueError):
+            parse_ppm(b"P3\n1 1\n255\n1 2 3\n")
+
+
+class CompareImagesTest(unittest.TestCase):
+    def test_identical(self):
+        comparison = compare_images(make_image(40, 30), make_image(40, 30))
+        self.assertTrue(comparison.identical)
+        self.assertTrue(comparison.passed())
+
+    def test_size_mismatch(self):
+        comparison = compare_images(make_image(40, 30), make_image(30, 40))
+        self.assertTrue(comparison.size_mismatch)
+        self.assertFalse(comparison.passed(max_changed_ratio=1.0))
+
+    def test_changed_pixel_is_located(self):
+        expected = make_image(40, 30)
+        actual = with_pixel(expected, 35, 20, (0, 0, 100))
+        comparison = compare_images(expected, actual, block_size=16)
+        self.assertEqual(comparison.changed_blocks, [(32, 16, 8, 14)])
+        self.assertEqual(comparison.changed_pixels, 1)
+        self.assertEqual(comparison.max_channel_delta, 100)
+        self.assertFalse(comparison.passed())
+        self.assertTrue(comparison.passed(max_changed_ratio=0.01))
+
+    def test_tolerance(self):
+        expected = make_image(40, 30, (50, 50, 50))
+        actual = with_pixel(expected, 0, 0, (54, 50, 50))
+        self.assertEqual(compare_images(expected, actual, tolerance=4).changed_pixels, 0)
+        self.assertEqual(compare_images(expected, actual, tolerance=3).changed_pixels, 1)
+
+    def test_summary_after_hash_short_cut(self):
+        expected = make_image(16, 16)
+        actual = Image(16, 16, (b"\x00\x00\x00" * 8 + b"\xff\xff\xff" * 8) * 16)
+        comparison = compare_images(expected, actual, max_hash_distance=0)
+        self.assertIsNone(comparison.max_channel_delta)
+        self.assertEqual(
+            comparison.summary(),
+            "256 of 256 pixels (100.000%) differ in 1 block(s), perceptual hash distance 32",
+        )
+
+    @parameterized.expand([("tolerance 0", 0), ("tolerance 20", 20)])
+    @unittest.skipIf(imagediff.numpy is None, "needs numpy")
+    def test_vectorized_matches_pure_python(self, _label, tolerance):
+        rnd = random.Random(tolerance)
+        expected = Image(37, 29, rnd.randbytes(37 * 29 * 3))
+        data = bytearray(expected.data)
+        for i in rnd.sample(range(len(data)), 300):
+            data[i] = rnd.randrange(256)
+        actual = Image(37, 29, bytes(data))
+
+        vectorized = compare_images(expected, actual, tolerance=tolerance, want_mask=True)
+        with patch.object(imagediff, "numpy", None):
+            pure = compare_images(expected, actual, tolerance=tolerance, want_mask=True)
+
+        self.assertEqual(
+            (vectorized.changed_pixels, vectorized.max_channel_delta),
+            (pure.changed_pixels, pure.max_channel_delta),
+        )
+        self.assertEqual(vectorized.changed_pixel_mask, pure.changed_pixel_mask)
+        self.assertEqual(vectorized.summary(), pure.summary())
+
+    def test_diff_image_marks_changed_pixels(self):
+        expected = make_image(4, 4)
+        actual = with_pixel(expected, 1, 2, (0, 200, 0))
+        comparison = compare_images(expected, actual, want_mask=True)
+        diff = make_diff_image(actual, comparison)
+        i = 2 * diff.stride + 3 * 1
+        self.assertEqual(diff.data[i : i + 3], b"\xff\x00\x00")
+        self.assertEqual(diff.data[0:3], b"\x80\x80\x80")
+
+
+class AverageHashTest(unittest.TestCase):
+    def test_inverted_image_maximizes_distance(self):
+        left_half_white = Image(16, 16, (b"\xff\xff\xff" * 8 + b"\x00\x00\x00" * 8) * 16)
+        right_half_white = Image(16, 16, (b"\x00\x00\x00" * 8 + b"\xff\xff\xff" * 8) * 16)
+        distance = bin(average_hash(left_half_white) ^ average_hash(right_half_white)).count("1")
+        self.assertEqual(distance, 64)
+
+
+class CombineSideBySideTest(unittest.TestCase):
+    def test_pads_lower_image_with_black(self):
+        left = make_image(2, 2, (10, 20, 30))
+        right = make_image(1, 1, (40, 50, 60))
+        combined = combine_side_by_side([left, right])
+        self.assertEqual(combined.size, (3, 2))
+        self.assertEqual(
+            combined.data[: combined.stride], bytes((10, 20, 30)) * 2 + bytes((40, 50, 60))
+        )
+        self.assertEqual(combined.data[combined.stride :], bytes((10, 20, 30)) * 2 + bytes(3))
@@ -0,0 +1,61 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import unittest
+
+from parameterized import parameterized
+
+from ..imagesize import ImageSizeReport, addition_targets, categorize, parse_lsdl_output
+
+_LSDL_OUTPUT = """\
+-r--r--r--    1 0        0          31744 Jan 13 12:00 '/boot/grub/i386-pc/acpi.mod'
+-r--r--r--    1 0        0           2048 Jan 13 12:00 '/boot/grub/grub.cfg'
+-rw-r--r--    1 1000     1000      120000 Jan 13 12:00 '/boot/grub/themes/DEMO/it'\\''s.png'
+xorriso : NOTE : Some informational message
+"""
+
+
+class ParseLsdlOutputTest(unittest.TestCase):
+    def test_files_and_quoting(self):
+        self.assertEqual(
+            parse_lsdl_output(_LSDL_OUTPUT),
+            [
+                ("/boot/grub/i386-pc/acpi.mod", 31744),
+                ("/boot/grub/grub.cfg", 2048),
+                ("/boot/grub/themes/DEMO/it's.png", 120000),
+            ],
+        )
+
+
+class CategorizeTest(unittest.TestCase):
+    @parameterized.expand(
+        [
+            ("/boot/grub/x86_64-efi/normal.mod", "modules"),
+            ("/boot/grub/fonts/unicode.pf2", "fonts"),
+            ("/boot/grub/themes/DEMO/dejavu_12.pf2", "fonts"),
+            ("/boot/grub/themes/DEMO/theme.txt", "theme"),
+            ("/boot/grub/grub.cfg", "config"),
+            ("/efi.img", "boot"),
+            ("/extra/file.txt", "additions"),
+            ("/extra", "additions"),
+            ("/extras/file.txt", "boot"),
+        ]
+    )
+    def test_category(self, path, expected_category):
+        targets = addition_targets(["extra/=/home/user/extra"])
+        self.assertEqual(categorize(path, targets), expected_category)
+
+
+class ImageSizeReportTest(unittest.TestCase):
+    def test_overhead_and_baseline_delta(self):
+        baseline = ImageSizeReport(200000, parse_lsdl_output(_LSDL_OUTPUT))
+        self.assertEqual(baseline.categories["overhead"], [0, 200000 - 153792])
+
+        files = dict(baseline.files)
+        files["/boot/grub/grub.cfg"] += 100
+        report = ImageSizeReport(200100, files.items())
+        text = report.format(top_count=1, baseline=ImageSizeReport.from_json(baseline.to_json()))
+
+        self.assertIn("\n      120000  /boot/grub/themes/DEMO/it's.png\n", text)
+        self.assertRegex(text, r"\nconfig +1 +2148 +[0-9.]+% +\+100\n")
+        self.assertTrue(text.endswith("\n        +100  /boot/grub/grub.cfg"))
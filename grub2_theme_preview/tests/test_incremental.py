@@ -0,0 +1,219 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import os
+import shutil
+import subprocess
+import unittest
+from io import StringIO
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from ..incremental import (
+    CachedImage,
+    diff_manifests,
+    make_build_key,
+    make_manifest,
+    make_update_command,
+)
+from ..preview import candidate_grub2_image_directories
+
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def _find_real_grub2_toolchain():
+    """
+    Return grub-mkrescue, xorriso and a GRUB platform directory
+    to build real rescue images with, or ``None`` if not installed
+    """
+    grub2_mkrescue = shutil.which("grub-mkrescue") or shutil.which("grub2-mkrescue")
+    xorriso = shutil.which("xorriso")
+    if grub2_mkrescue is None or xorriso is None:
+        return None
+    for grub2_platform in ("i386-pc", "x86_64-efi"):
+        for grub2_platform_directory in candidate_grub2_image_directories(grub2_platform):
+            # NOTE: Part of every real platform directory, unlike in fakes
+            if os.path.isfile(os.path.join(grub2_platform_directory, "modinfo.sh")):
+                return grub2_mkrescue, xorriso, grub2_platform_directory
+    return None
+
+
+def _xorriso_report(xorriso, abs_img_file, *commands):
+    return subprocess.run(
+        [xorriso, "-indev", abs_img_file, *commands],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+
+class ManifestTest(unittest.TestCase):
+    def test_directory_and_file_grafts(self):
+        with TemporaryDirectory() as tempdir:
+            theme_dir = os.path.join(tempdir, "theme")
+            write_file(os.path.join(theme_dir, "theme.txt"), "title-text: x\n")
+            write_file(os.path.join(theme_dir, "icons", "os.png"), "png")
+            grub_cfg = os.path.join(tempdir, "grub.cfg")
+            write_file(grub_cfg, "set timeout=5\n")
+
+            manifest = make_manifest(
+                [f"boot/grub/grub.cfg={grub_cfg}", f"boot/grub/themes/DEMO/={theme_dir}"]
+            )
+
+        self.assertEqual(
+            sorted(manifest),
+            [
+                "/boot/grub/grub.cfg",
+                "/boot/grub/themes/DEMO/icons/os.png",
+                "/boot/grub/themes/DEMO/theme.txt",
+            ],
+        )
+        self.assertEqual(manifest["/boot/grub/grub.cfg"]["source"], grub_cfg)
+
+    def test_diff_and_update_command(self):
+        old_manifest = {
+            "/a": {"sha256": "1", "source": "/src/a"},
+            "/b": {"sha256": "2", "source": "/src/b"},
+            "/gone": {"sha256": "3", "source": "/src/gone"},
+        }
+        new_manifest = {
+            "/a": {"sha256": "1", "source": "/src/a"},
+            "/b": {"sha256": "22", "source": "/src/b"},
+            "/new": {"sha256": "4", "source": "/src/new"},
+        }
+
+        updates, removals = diff_manifests(old_manifest, new_manifest)
+
+        self.assertEqual((updates, removals), (["/b", "/new"], ["/gone"]))
+        self.assertEqual(
+            make_update_command("xorriso", "/img", new_manifest, updates, removals),
+            ["xorriso", "-dev", "/img", "-boot_image", "any", "replay"]
+            + ["-update", "/src/b", "/b", "-update", "/src/new", "/new"]
+            + ["-rm", "/gone", "-commit"],
+        )
+
+    def test_build_key(self):
+        key = make_build_key("i386-pc", grub2_mkrescue="grub-mkrescue")
+
+        self.assertTrue(key.startswith("i386-pc-"))
+        self.assertEqual(key, make_build_key("i386-pc", grub2_mkrescue="grub-mkrescue"))
+        self.assertNotEqual(key, make_build_key("i386-pc", grub2_mkrescue="grub2-mkrescue"))
+
+
+class CachedImageTest(unittest.TestCase):
+    def test_store_and_load(self):
+        with TemporaryDirectory() as tempdir:
+            image = os.path.join(tempdir, "built.img")
+            write_file(image, "x" * 100)
+            stale = CachedImage(tempdir, "i386-pc-stale")
+            stale.store(image, {})
+            other_platform = CachedImage(tempdir, "x86_64-efi-other")
+            other_platform.store(image, {})
+
+            cached_image = CachedImage(tempdir, "i386-pc-current")
+            self.assertIsNone(cached_image.load_manifest())
+            cached_image.store(image, {"/a": {"sha256": "1", "source": "/src/a"}})
+
+            self.assertEqual(
+                cached_image.load_manifest(), {"/a": {"sha256": "1", "source": "/src/a"}}
+            )
+            self.assertFalse(os.path.exists(stale.abs_directory))
+            self.assertTrue(os.path.exists(other_platform.abs_directory))
+
+            # Appended sessions past twice the size of the full build
+            with open(cached_image.abs_img_file, "a") as f:
+                f.write("x" * 101)
+            with patch("sys.stdout", StringIO()) as stdout:
+                self.assertIsNone(cached_image.load_manifest())
+            self.assertIn("grown too much", stdout.getvalue())
+
+
+@unittest.skipIf(_find_real_grub2_toolchain() is None, "needs grub-mkrescue, xorriso and GRUB")
+class UpdateCommandIntegrationTest(unittest.TestCase):
+    def test_update_keeps_boot_equipment(self):
+        grub2_mkrescue, xorriso, grub2_platform_directory = _find_real_grub2_toolchain()
+        with TemporaryDirectory() as tempdir:
+            theme_dir = os.path.join(tempdir, "theme")
+            theme_txt = os.path.join(theme_dir, "theme.txt")
+            write_file(theme_txt, 'title-text: "before"\n')
+            grub_cfg = os.path.join(tempdir, "grub.cfg")
+            write_file(grub_cfg, "set timeout=5\n")
+            grafts = [f"boot/grub/grub.cfg={grub_cfg}", f"boot/grub/themes/DEMO/={theme_dir}"]
+            abs_img_file = os.path.join(tempdir, "rescue.img")
+            subprocess.run(
+                [
+                    grub2_mkrescue,
+                    f"--directory={grub2_platform_directory}",
+                    "--xorriso",
+                    xorriso,
+                    "--output",
+                    abs_img_file,
+                ]
+                + grafts,
+                check=True,
+                capture_output=True,
+                env=dict(os.environ, TMPDIR=tempdir),
+            )
+            old_manifest = make_manifest(grafts)
+            system_area_before = _xorriso_report(
+                xorriso, abs_img_file, "-report_system_area", "plain"
+            )
+            el_torito_before = _xorriso_report(xorriso, abs_img_file, "-report_el_torito", "plain")
+
+            write_file(theme_txt, 'title-text: "after"\n')
+            new_manifest = make_manifest(grafts)
+            updates, removals = diff_manifests(old_manifest, new_manifest)
+            subprocess.run(
+                make_update_command(xorriso, abs_img_file, new_manifest, updates, removals),
+                check=True,
+                capture_output=True,
+            )
+
+            system_area_after = _xorriso_report(
+                xorriso, abs_img_file, "-report_system_area", "plain"
+            )
+            el_torito_after = _xorriso_report(xorriso, abs_img_file, "-report_el_torito", "plain")
+            found = _xorriso_report(
+                xorriso, abs_img_file, "-find", "/boot/grub/themes/DEMO", "-name", "theme.txt"
+            )
+            abs_extracted = os.path.join(tempdir, "extracted.txt")
+            _xorriso_report(
+                xorriso,
+                abs_img_file,
+                "-osirrox",
+                "on",
+                "-extract",
+                "/boot/grub/themes/DEMO/theme.txt",
+                abs_extracted,
+            )
+            with open(abs_extracted) as f:
+                extracted = f.read()
+
+        self.assertEqual(updates, ["/boot/grub/themes/DEMO/theme.txt"])
+
+        def summary(report):
+            return [
+                line for line in report.splitlines() if line.startswith("System area summary:")
+            ]
+
+        self.assertNotEqual(summary(system_area_before), [])
+        self.assertEqual(summary(system_area_after), summary(system_area_before))
+
+        def boot_images(report):
+            # NOTE: Number, platform, bootability, emulation, load segment and header ID;
+            #       block addresses move as sessions get appended
+            return [
+                line.partition(":")[2].split()[:6]
+                for line in report.splitlines()
+                if line.startswith("El Torito boot img")
+            ]
+
+        self.assertNotEqual(boot_images(el_torito_before), [])
+        self.assertEqual(boot_images(el_torito_after), boot_images(el_torito_before))
+
+        self.assertIn("/boot/grub/themes/DEMO/theme.txt", found)
+        self.assertEqual(extracted, 'title-text: "after"\n')
@@ -1,7 +1,10 @@
 # Copyright (c) 2022 Sebastian Pipping <sebastian@pipping.org>
 # Licensed under GPL v2 or later
 
+import json
 import os
+import sys
+import tarfile
 import unittest
 from contextlib import contextmanager
 from io import StringIO
@@ -11,7 +14,10 @@ from unittest.mock import patch
 
 from parameterized import parameterized
 
-from ..__main__ import _GRUB_DEBUG_SPEC, main
+from ..__main__ import main, parse_command_line
+from ..imagediff import read_ppm
+from ..pictures import decode_png
+from ..preview import GRUB_DEBUG_SPEC
 
 
 @contextmanager
@@ -64,13 +70,60 @@ def fake_grub2_mkrescue():
                 yield
 
 
+@contextmanager
+def fake_qemu_with_qmp(ppm_content):
+    """
+    Context manager that creates a fake ``qemu`` command
+    that serves QMP on the socket passed via ``-qmp unix:PATH,...``
+    and answers ``screendump`` with ``ppm_content``;
+    yields the absolute path of that command
+    """
+    with TemporaryDirectory() as tempdir:
+        ppm_path = os.path.join(tempdir, "screen.ppm")
+        with open(ppm_path, "wb") as f:
+            f.write(ppm_content)
+
+        qemu_path = os.path.join(tempdir, "qemu")
+        with open(qemu_path, "w") as f:
+            print(
+                dedent(f"""\
+                #! {sys.executable}
+                import json, shutil, socket, sys
+                spec = sys.argv[sys.argv.index("-qmp") + 1]
+                server = socket.socket(socket.AF_UNIX)
+                server.bind(spec[len("unix:"):].split(",")[0])
+                server.listen(1)
+                connection, _ = server.accept()
+                stream = connection.makefile("rw")
+                stream.write(json.dumps({{"QMP": {{"version": {{}}}}}}) + "\\n")
+                stream.flush()
+                for line in stream:
+                    request = json.loads(line)
+                    if request["execute"] == "screendump":
+                        shutil.copyfile({ppm_path!r}, request["arguments"]["filename"])
+                    stream.write(json.dumps({{"return": {{}}}}) + "\\n")
+                    stream.flush()
+                    if request["execute"] == "quit":
+                        break
+            """),
+                file=f,
+            )
+            os.fchmod(f.fileno(), 0o555)
+
+        yield qemu_path
+
+
 class CliTest(unittest.TestCase):
     @parameterized.expand(
         [
-            ("with --verbose", ["--verbose"], "# true", True),
-            ("without --verbose", [], "# true", False),
+            ("with --verbose", ["--verbose"], "/true -m ", True),
+            ("without --verbose", [], "/true -m ", False),
             ("with --display", ["--verbose", "--display=sdl"], "-display sdl", True),
             ("without --display", ["--verbose"], "-display sdl", False),
+            ("default --disk-bus", ["--verbose"], ",index=0,media=disk,", True),
+            ("with --disk-bus=ide", ["--verbose", "--disk-bus=ide"], ",index=0,media=disk,", True),
+            ("with --disk-bus=ahci", ["--verbose", "--disk-bus=ahci"], ",bus=ahci.0,", True),
+            ("with --disk-bus=cdrom", ["--verbose", "--disk-bus=cdrom"], ",media=cdrom,", True),
             ("with --vga", ["--verbose", "--vga=virtio"], "-vga virtio", True),
             ("without --vga", ["--verbose"], "-vga virtio", False),
             ("with --full-screen", ["--verbose", "--full-screen"], "-full-screen", True),
@@ -112,6 +165,7 @@ class CliTest(unittest.TestCase):
             with (
                 patch("sys.stdout", StringIO()) as stdout,
                 patch("sys.stderr", StringIO()),
+                patch.dict(os.environ, {"G2TP_CACHE_DIR": os.path.join(tempdir, "cache")}),
                 fake_grub2_mkrescue(),
             ):
                 main(argv)
@@ -187,7 +241,7 @@ class CliTest(unittest.TestCase):
                 main(argv)
             dump = stderr.getvalue()
             self.assertIn(
-                f"set debug={_GRUB_DEBUG_SPEC}\nserial\n",
+                f"set debug={GRUB_DEBUG_SPEC}\nserial\n",
                 dump,
             )
             self.assertIn("terminal_output gfxterm serial", dump)
@@ -265,3 +319,494 @@ class CliTest(unittest.TestCase):
 
         assertion = self.assertIn if needed_expected else self.assertNotIn
         assertion(needle, stderr.getvalue())
+
+    @parameterized.expand(
+        [
+            ("without --display", [], "-display none", True),
+            ("with --display", ["--display=sdl"], "-display none", False),
+        ]
+    )
+    def test_screenshot_display(self, _label, extra_argv, needle, needed_expected):
+        with (
+            TemporaryDirectory() as tempdir,
+            fake_qemu_with_qmp(b"P6\n1 1\n255\n\x01\x02\x03") as qemu,
+        ):
+            screenshot = os.path.join(tempdir, "screenshot.ppm")
+            argv = [
+                None,
+                "--qemu",
+                qemu,
+                "--verbose",
+                "--screenshot-delay=0",
+                "--screenshot",
+                screenshot,
+                *extra_argv,
+                tempdir,
+            ]
+            with (
+                patch("sys.stdout", StringIO()) as stdout,
+                patch("sys.stderr", StringIO()),
+                fake_grub2_mkrescue(),
+            ):
+                main(argv)
+
+            self.assertEqual(read_ppm(screenshot).data, b"\x01\x02\x03")
+
+        assertion = self.assertIn if needed_expected else self.assertNotIn
+        assertion(needle, stdout.getvalue())
+
+    @parameterized.expand(
+        [
+            ("identical", b"\x01\x02\x03", [], None),
+            ("different", b"\x01\x02\xff", [], 1),
+            ("within tolerance", b"\x01\x02\x05", ["--compare-tolerance=2"], None),
+        ]
+    )
+    def test_compare_baseline(self, _label, actual_pixel, extra_argv, expected_exit_code):
+        with (
+            TemporaryDirectory() as tempdir,
+            fake_qemu_with_qmp(b"P6\n1 1\n255\n" + actual_pixel) as qemu,
+        ):
+            baseline = os.path.join(tempdir, "baseline.ppm")
+            diff = os.path.join(tempdir, "diff.ppm")
+            with open(baseline, "wb") as f:
+                f.write(b"P6\n1 1\n255\n\x01\x02\x03")
+            argv = [
+                None,
+                "--qemu",
+                qemu,
+                "--screenshot-delay=0",
+                "--compare-baseline",
+                baseline,
+                "--compare-diff",
+                diff,
+                *extra_argv,
+                tempdir,
+            ]
+            with (
+                patch("sys.stdout", StringIO()),
+                patch("sys.stderr", StringIO()) as stderr,
+                fake_grub2_mkrescue(),
+            ):
+                if expected_exit_code is None:
+                    main(argv)
+                else:
+                    with self.assertRaises(SystemExit) as caught:
+                        main(argv)
+                    self.assertEqual(caught.exception.code, expected_exit_code)
+                    self.assertIn("does not match baseline", stderr.getvalue())
+                    self.assertTrue(os.path.exists(diff))
+
+    def test_compare_baseline_is_recorded_if_missing(self):
+        with (
+            TemporaryDirectory() as tempdir,
+            fake_qemu_with_qmp(b"P6\n1 1\n255\n\x01\x02\x03") as qemu,
+        ):
+            baseline = os.path.join(tempdir, "baseline.ppm")
+            argv = [
+                None,
+                "--qemu",
+                qemu,
+                "--screenshot-delay=0",
+                "--compare-baseline",
+                baseline,
+                tempdir,
+            ]
+            with (
+                patch("sys.stdout", StringIO()) as stdout,
+                patch("sys.stderr", StringIO()),
+                fake_grub2_mkrescue(),
+            ):
+                main(argv)
+
+            self.assertIn("Recorded new baseline", stdout.getvalue())
+            self.assertEqual(read_ppm(baseline).data, b"\x01\x02\x03")
+
+    def test_capture_vnc_adds_qemu_vnc_server(self):
+        with TemporaryDirectory() as tempdir:
+            argv = [
+                None,
+                "--qemu",
+                "true",
+                "--verbose",
+                "--capture=vnc",
+                "--screenshot",
+                os.path.join(tempdir, "screenshot.ppm"),
+                tempdir,
+            ]
+            with (
+                patch("sys.stdout", StringIO()) as stdout,
+                patch("sys.stderr", StringIO()) as stderr,
+                fake_grub2_mkrescue(),
+                self.assertRaises(SystemExit),
+            ):
+                main(argv)
+
+        self.assertIn(" -vnc unix:", stdout.getvalue())
+        self.assertIn("while waiting for QMP to become available", stderr.getvalue())
+
+    @parameterized.expand(
+        [
+            ("--record", ["--record=out.gif"]),
+            ("--benchmark", ["--benchmark"]),
+        ]
+    )
+    def test_requires_capture_vnc(self, option, extra_argv):
+        argv = [None, "--capture=qmp", *extra_argv, "theme"]
+        with (
+            patch("sys.stdout", StringIO()),
+            patch("sys.stderr", StringIO()) as stderr,
+            self.assertRaises(SystemExit) as caught,
+        ):
+            main(argv)
+
+        self.assertEqual(caught.exception.code, 2)
+        self.assertIn(f'argument {option}: requires "--capture vnc"', stderr.getvalue())
+
+    def test_deadline_menu_adds_serial_marker(self):
+        with TemporaryDirectory() as tempdir:
+            argv = [None, "--qemu", "true", "--debug", "--deadline-menu=5", tempdir]
+            with (
+                patch("sys.stdout", StringIO()),
+                patch("sys.stderr", StringIO()) as stderr,
+                fake_grub2_mkrescue(),
+                self.assertRaises(SystemExit),
+            ):
+                main(argv)
+
+        self.assertIn("terminal_output --append serial\necho G2TP-MENU-READY\n", stderr.getvalue())
+
+    def test_deadline_total_stops_hanging_qemu(self):
+        with TemporaryDirectory() as tempdir:
+            hanging_qemu = os.path.join(tempdir, "qemu")
+            with open(hanging_qemu, "w") as f:
+                print("#! /bin/sh\nexec sleep 60", file=f)
+                os.fchmod(f.fileno(), 0o555)
+            argv = [None, "--qemu", hanging_qemu, "--deadline-total=0.2", tempdir]
+            with (
+                patch("sys.stdout", StringIO()),
+                patch("sys.stderr", StringIO()) as stderr,
+                fake_grub2_mkrescue(),
+                self.assertRaises(SystemExit) as caught,
+            ):
+                main(argv)
+
+        self.assertEqual(caught.exception.code, 1)
+        self.assertIn("Total deadline of 0.2 seconds exceeded", stderr.getvalue())
+
+    @parameterized.expand(
+        [
+            ("interactive", [], None),
+            ("screenshot", ["--screenshot=shot.png"], 600),
+            ("recording", ["--record=run.mp4", "--record-seconds=30"], 630),
+            ("disk bus benchmark", ["--benchmark-disk-bus"], 600),
+            ("profile", ["--profile=profile.folded"], 600),
+            ("explicit", ["--screenshot=shot.png", "--deadline-total=20"], 20),
+            ("disabled", ["--screenshot=shot.png", "--deadline-total=0"], None),
+        ]
+    )
+    def test_deadline_total_default(self, _label, arguments, expected_deadline_total):
+        options = parse_command_line([None, *arguments, "theme"])
+        self.assertEqual(options.deadline_total, expected_deadline_total)
+
+    def test_archive_source_is_staged_into_cache(self):
+        with TemporaryDirectory() as tempdir:
+            theme_dir = os.path.join(tempdir, "theme")
+            os.mkdir(theme_dir)
+            with open(os.path.join(theme_dir, "theme.txt"), "w") as f:
+                f.write("# minimal theme\n")
+            archive_path = os.path.join(tempdir, "theme.tar.gz")
+            with tarfile.open(archive_path, "w:gz") as archive:
+                archive.add(theme_dir, arcname="theme")
+            cache_dir = os.path.join(tempdir, "cache")
+
+            argv = [None, "--qemu", "true", "--verbose", archive_path]
+            with (
+                patch.dict(os.environ, {"G2TP_CACHE_DIR": cache_dir}),
+                patch("sys.stdout", StringIO()) as stdout,
+                patch("sys.stderr", StringIO()),
+                fake_grub2_mkrescue(),
+            ):
+                main(argv)
+
+        self.assertIn(f" boot/grub/themes/DEMO/={cache_dir}/archives/", stdout.getvalue())
+
+    def test_platform_both_builds_and_runs_both_platforms(self):
+        with TemporaryDirectory() as tempdir:
+            grub_lib = os.path.join(tempdir, "grub")
+            for grub2_platform in ("i386-pc", "x86_64-efi"):
+                os.makedirs(os.path.join(grub_lib, grub2_platform))
+            ovmf_image = os.path.join(tempdir, "OVMF_CODE.fd")
+            open(ovmf_image, "w").close()
+
+            argv = [None, "--qemu", "true", "--verbose", "--platform=both", tempdir]
+            with (
+                patch.dict(os.environ, {"G2TP_GRUB_LIB": grub_lib, "G2TP_OVMF_IMAGE": ovmf_image}),
+                patch("platform.machine", return_value="x86_64"),
+                patch("sys.stdout", StringIO()) as stdout,
+                patch("sys.stderr", StringIO()),
+                fake_grub2_mkrescue(),
+            ):
+                main(argv)
+
+        output = stdout.getvalue()
+        self.assertIn(f"--directory={grub_lib}/i386-pc ", output)
+        self.assertIn(f"--directory={grub_lib}/x86_64-efi ", output)
+        self.assertEqual(output.count(f"file={ovmf_image}"), 1)
+        self.assertIn("INFO: Timings in seconds:", output)
+
+    def test_size_report_lists_image_content(self):
+        with TemporaryDirectory() as tempdir:
+            fake_xorriso = os.path.join(tempdir, "xorriso")
+            with open(fake_xorriso, "w") as f:
+                print(
+                    "#! /bin/sh\n"
+                    "echo \"-r--r--r-- 1 0 0 31744 Jan 13 12:00 '/boot/grub/i386-pc/acpi.mod'\"",
+                    file=f,
+                )
+                os.fchmod(f.fileno(), 0o555)
+            size_baseline = os.path.join(tempdir, "sizes.json")
+
+            argv = [None, "--qemu", "true", "--xorriso", fake_xorriso]
+            argv += ["--size-baseline", size_baseline, tempdir]
+            with (
+                patch("sys.stdout", StringIO()) as stdout,
+                patch("sys.stderr", StringIO()),
+                fake_grub2_mkrescue(),
+            ):
+                main(argv)
+
+            self.assertTrue(os.path.exists(size_baseline))
+
+        self.assertRegex(stdout.getvalue(), r"\nmodules +1 +31744 ")
+        self.assertIn("Recorded new size baseline", stdout.getvalue())
+
+    def test_render_runs_neither_grub2_mkrescue_nor_qemu(self):
+        with TemporaryDirectory() as tempdir:
+            theme_dir = os.path.join(tempdir, "theme")
+            os.mkdir(theme_dir)
+            with open(os.path.join(theme_dir, "theme.txt"), "w") as f:
+                f.write('desktop-color: "#204080"\n+ boot_menu { left = 10% }\n')
+            render_path = os.path.join(tempdir, "render.png")
+
+            argv = [None, "--qemu", "/nonexistent/qemu", "--grub2-mkrescue", "/nonexistent"]
+            argv += ["--resolution", "640x480", "--render", render_path, theme_dir]
+            with (
+                patch("sys.stdout", StringIO()) as stdout,
+                patch("sys.stderr", StringIO()),
+            ):
+                main(argv)
+
+            with open(render_path, "rb") as f:
+                rendering = decode_png(f.read())
+
+        self.assertEqual(rendering.size, (640, 480))
+        self.assertEqual(rendering.row(0)[:4], bytes([0x20, 0x40, 0x80, 0xFF]))
+        self.assertIn("INFO: Rendered an approximation of the theme", stdout.getvalue())
+
+    def test_check_fonts_runs_neither_grub2_mkrescue_nor_qemu(self):
+        with TemporaryDirectory() as tempdir:
+            theme_dir = os.path.join(tempdir, "theme")
+            os.mkdir(theme_dir)
+            with open(os.path.join(theme_dir, "theme.txt"), "w") as f:
+                f.write('+ label { text = "Hello" }\n')
+
+            argv = [None, "--qemu", "/nonexistent/qemu", "--grub2-mkrescue", "/nonexistent"]
+            argv += ["--check-fonts", theme_dir]
+            with (
+                patch("sys.stdout", StringIO()) as stdout,
+                patch("sys.stderr", StringIO()),
+            ):
+                main(argv)
+
+        self.assertIn("INFO: Fonts loaded (in order) and their glyph coverage:", stdout.getvalue())
+        self.assertIn("\nmissing glyphs:", stdout.getvalue())
+
+    def test_benchmark_disk_bus_reports_time_to_menu(self):
+        with TemporaryDirectory() as tempdir:
+            fake_qemu = os.path.join(tempdir, "qemu")
+            with open(fake_qemu, "w") as f:
+                print(
+                    dedent(f"""\
+                    #! {sys.executable}
+                    import contextlib, json, os, socket, sys, time
+                    if "ahci,id=ahci" in sys.argv:
+                        sys.exit(1)  # i.e. no boot
+                    start_time = time.monotonic()
+                    serial = sys.argv[sys.argv.index("-serial") + 1]
+                    with open(serial[len("file:"):], "w") as f:
+                        print("G2TP-MENU-READY", file=f)
+                    spec = sys.argv[sys.argv.index("-qmp") + 1]
+                    socket_path = spec[len("unix:"):].split(",")[0]
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(socket_path)  # i.e. from the previous boot
+                    server = socket.socket(socket.AF_UNIX)
+                    server.bind(socket_path)
+                    server.listen(1)
+                    connection, _ = server.accept()
+                    stream = connection.makefile("rw")
+                    stream.write(json.dumps({{"QMP": {{"version": {{}}}}}}) + "\\n")
+                    stream.flush()
+                    for line in stream:
+                        request = json.loads(line)
+                        if request["execute"] == "screendump":
+                            # i.e. the themed menu is drawn a moment after the marker
+                            drawn = time.monotonic() - start_time > 0.3
+                            with open(request["arguments"]["filename"], "wb") as f:
+                                f.write(b"P6\\n1 1\\n255\\n" + (b"\\xff" if drawn else b"\\0") * 3)
+                        stream.write(json.dumps({{"return": {{}}}}) + "\\n")
+                        stream.flush()
+                        if request["execute"] == "quit":
+                            break
+                """),
+                    file=f,
+                )
+                os.fchmod(f.fileno(), 0o555)
+
+            cache_dir = os.path.join(tempdir, "cache")
+            argv = [None, "--qemu", fake_qemu, "--benchmark-disk-bus", "--benchmark-repeat=1"]
+            argv += ["--platform=bios", tempdir]
+            with (
+                patch("sys.stdout", StringIO()) as stdout,
+                patch("sys.stderr", StringIO()),
+                patch.dict(os.environ, {"G2TP_CACHE_DIR": cache_dir}),
+                fake_grub2_mkrescue(),
+            ):
+                main(argv)
+
+            with open(os.path.join(cache_dir, "fastest-disk-buses.json")) as f:
+                fastest_disk_buses = json.load(f)
+
+        output = stdout.getvalue()
+        self.assertRegex(output, r"\ni386-pc +virtio +1 +0\.[3-9][0-9] ")
+        self.assertRegex(output, r"\ni386-pc +ahci +1 +\(1 failed\)")
+        self.assertIn("INFO: Fastest storage attachment for i386-pc: ", output)
+        self.assertIn(fastest_disk_buses["i386-pc"], ("ide", "virtio", "cdrom"))
+
+    def test_disk_bus_auto_uses_recorded_fastest(self):
+        with TemporaryDirectory() as tempdir:
+            with open(os.path.join(tempdir, "fastest-disk-buses.json"), "w") as f:
+                json.dump({"i386-pc": "cdrom"}, f)
+            argv = [None, "--qemu", "true", "--verbose", "--platform=bios", tempdir]
+            with (
+                patch("sys.stdout", StringIO()) as stdout,
+                patch("sys.stderr", StringIO()),
+                patch.dict(os.environ, {"G2TP_CACHE_DIR": tempdir}),
+                fake_grub2_mkrescue(),
+            ):
+                main(argv)
+
+        self.assertIn(",media=cdrom,", stdout.getvalue())
+        self.assertIn("measured fastest by --benchmark-disk-bus earlier", stdout.getvalue())
+
+    def test_profile_adds_qemu_gdbstub(self):
+        with TemporaryDirectory() as tempdir:
+            argv = [None, "--qemu", "true", "--verbose", "--platform=bios"]
+            argv += ["--profile", os.path.join(tempdir, "profile.folded"), tempdir]
+            with (
+                patch("sys.stdout", StringIO()) as stdout,
+                patch("sys.stderr", StringIO()),
+                fake_grub2_mkrescue(),
+                self.assertRaises(SystemExit),
+            ):
+                main(argv)
+
+        self.assertIn(" -gdb chardev:gdb0", stdout.getvalue())
+
+    def test_profile_refuses_efi(self):
+        argv = [None, "--qemu", "qemu-system-x86_64", "--profile=profile.folded"]
+        argv += ["--platform=both", "theme"]
+        with (
+            patch("sys.stdout", StringIO()),
+            patch("sys.stderr", StringIO()) as stderr,
+            self.assertRaises(SystemExit) as caught,
+        ):
+            main(argv)
+
+        self.assertEqual(caught.exception.code, 2)
+        self.assertIn("argument --profile: GRUB platform ", stderr.getvalue())
+        self.assertIn("-efi not supported, as its kernel is relocated", stderr.getvalue())
+
+    def test_profile_requires_supported_qemu_target(self):
+        argv = [None, "--qemu", "qemu-system-riscv64", "--profile=profile.folded", "theme"]
+        with (
+            patch("sys.stdout", StringIO()),
+            patch("sys.stderr", StringIO()) as stderr,
+            self.assertRaises(SystemExit) as caught,
+        ):
+            main(argv)
+
+        self.assertEqual(caught.exception.code, 2)
+        self.assertIn("argument --profile: QEMU target not supported", stderr.getvalue())
+
+    @parameterized.expand(
+        [
+            ("auto", [], r"(?s)INFO: Guest memory for i386-pc: (\d+) MiB \(.*\)\..* -m \1 "),
+            ("given", ["--memory=512"], r"(?s)INFO: Guest memory: 512 MiB\..* -m 512 -drive "),
+            (
+                "prealloc",
+                ["--memory=512", "--memory-backing=prealloc"],
+                r" -m 512 -object memory-backend-ram,id=mem0,size=512M,prealloc=on"
+                r" -machine memory-backend=mem0 ",
+            ),
+            (
+                "hugepages",
+                ["--memory-backing=hugepages"],
+                r" -object memory-backend-file,id=mem0,size=\d+M"
+                r",mem-path=/dev/hugepages,prealloc=on ",
+            ),
+        ]
+    )
+    def test_memory_arguments(self, _label, extra_argv, pattern):
+        with TemporaryDirectory() as tempdir:
+            argv = [None, "--qemu", "true", "--verbose", "--platform=bios", *extra_argv, tempdir]
+            with (
+                patch("sys.stdout", StringIO()) as stdout,
+                patch("sys.stderr", StringIO()),
+                fake_grub2_mkrescue(),
+            ):
+                main(argv)
+
+        self.assertRegex(stdout.getvalue(), pattern)
+
+    def test_incremental_updates_only_changed_files(self):
+        with TemporaryDirectory() as tempdir:
+            theme_dir = os.path.join(tempdir, "theme")
+            os.mkdir(theme_dir)
+            theme_txt = os.path.join(theme_dir, "theme.txt")
+            with open(theme_txt, "w") as f:
+                f.write("# first\n")
+            xorriso_log = os.path.join(tempdir, "xorriso.log")
+            fake_xorriso = os.path.join(tempdir, "xorriso")
+            with open(fake_xorriso, "w") as f:
+                print(f'#! /bin/sh\necho "$@" >> {xorriso_log}', file=f)
+                os.fchmod(f.fileno(), 0o555)
+            cache_dir = os.path.join(tempdir, "cache")
+
+            argv = [None, "--qemu", "true", "--xorriso", fake_xorriso, "--incremental"]
+            argv += ["--grub-cfg", "/dev/null", theme_dir]
+            outputs = []
+            with (
+                patch.dict(os.environ, {"G2TP_CACHE_DIR": cache_dir}),
+                fake_grub2_mkrescue(),
+            ):
+                for content in ("# first\n", "# first\n", "# second\n"):
+                    with open(theme_txt, "w") as f:
+                        f.write(content)
+                    with (
+                        patch("sys.stdout", StringIO()) as stdout,
+                        patch("sys.stderr", StringIO()),
+                    ):
+                        main(argv)
+                    outputs.append(stdout.getvalue())
+
+            with open(xorriso_log) as f:
+                xorriso_calls = f.read().splitlines()
+
+        self.assertNotIn("Reused cached rescue image", outputs[0])
+        self.assertIn("with 0 file(s) updated and 0 removed", outputs[1])
+        self.assertIn("with 1 file(s) updated and 0 removed", outputs[2])
+        self.assertEqual(len(xorriso_calls), 1)
+        self.assertIn(
+            f"-update {theme_txt} /boot/grub/themes/DEMO/theme.txt -commit", xorriso_calls[0]
+        )
@@ -0,0 +1,46 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from ..memory import estimate_guest_memory, iterate_theme_pictures
+from ..pictures import RgbaImage, write_png
+
+
+class EstimateGuestMemoryTest(unittest.TestCase):
+    def test_theme_images_fonts_and_screen(self):
+        with TemporaryDirectory() as tempdir:
+            write_png(
+                os.path.join(tempdir, "background.png"), RgbaImage(1024, 512, bytes(1024**2 * 2))
+            )
+            os.mkdir(os.path.join(tempdir, "icons"))
+            write_png(os.path.join(tempdir, "icons", "linux.png"), RgbaImage(32, 32, bytes(4096)))
+            with open(os.path.join(tempdir, "broken.tga"), "wb") as f:
+                f.write(b"TGA")
+            font_path = os.path.join(tempdir, "font.pf2")
+            with open(font_path, "wb") as f:
+                f.write(bytes(1024**2))
+
+            pictures = list(iterate_theme_pictures(tempdir))
+            bios = estimate_guest_memory("i386-pc", pictures, [font_path], (1024, 768))
+            efi = estimate_guest_memory("x86_64-efi", pictures, [font_path], (1024, 768))
+
+        self.assertEqual(
+            [os.path.relpath(path, tempdir) for path in pictures],
+            ["background.png", "broken.tga", os.path.join("icons", "linux.png")],
+        )
+        self.assertEqual(bios.image_bytes, 1024 * 512 * 4 + 32 * 32 * 4)
+        self.assertEqual(bios.font_bytes, 1024**2)
+        self.assertEqual(bios.screen_bytes, 3 * 1024 * 768 * 4)
+        # i.e. 48 MiB base plus twice 2.0 + 1.0 + 9.0 MiB, rounded up to 16 MiB
+        self.assertEqual(bios.mib, 80)
+        self.assertGreater(efi.mib, bios.mib)
+        self.assertEqual(efi.mib % 16, 0)
+
+    def test_auto_resolution(self):
+        estimate = estimate_guest_memory("i386-pc", [], [], None)
+
+        self.assertEqual(estimate.resolution, (1920, 1080))
+        self.assertIn("at 1920x1080", estimate.describe())
@@ -0,0 +1,255 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import io
+import os
+import random
+import struct
+import unittest
+import zlib
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from parameterized import parameterized
+
+from .. import pictures
+from ..imagediff import Image
+from ..pictures import (
+    RgbaImage,
+    decode_png,
+    decode_tga,
+    encode_png,
+    load_picture,
+    read_picture_size,
+    scale_nearest,
+)
+
+
+def make_png(width, height, bit_depth, color_type, filtered_scanlines, extra_chunks=()):
+    def chunk(chunk_type, payload):
+        return (
+            struct.pack(">I", len(payload))
+            + chunk_type
+            + payload
+            + struct.pack(">I", zlib.crc32(chunk_type + payload))
+        )
+
+    header = struct.pack(">IIBBBBB", width, height, bit_depth, color_type, 0, 0, 0)
+    return b"".join(
+        [b"\x89PNG\r\n\x1a\n", chunk(b"IHDR", header)]
+        + [chunk(chunk_type, payload) for chunk_type, payload in extra_chunks]
+        + [chunk(b"IDAT", zlib.compress(filtered_scanlines)), chunk(b"IEND", b"")]
+    )
+
+
+def unfilter_byte_by_byte(filtered_scanlines, height, row_bytes, filter_unit):
+    """
+    Undo PNG filters literally as the PNG specification describes them
+    """
+
+    def paeth(a, b, c):
+        p = a + b - c
+        pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+        if pa <= pb and pa <= pc:
+            return a
+        return b if pb <= pc else c
+
+    scanlines = bytearray()
+    previous = bytes(row_bytes)
+    for y in range(height):
+        filter_type = filtered_scanlines[y * (row_bytes + 1)]
+        row = bytearray(filtered_scanlines[y * (row_bytes + 1) + 1 : (y + 1) * (row_bytes + 1)])
+        for i in range(row_bytes):
+            a = row[i - filter_unit] if i >= filter_unit else 0
+            b = previous[i]
+            c = previous[i - filter_unit] if i >= filter_unit else 0
+            predictor = [0, a, b, (a + b) // 2, paeth(a, b, c)][filter_type]
+            row[i] = (row[i] + predictor) & 0xFF
+        scanlines += row
+        previous = row
+    return bytes(scanlines)
+
+
+class PngTest(unittest.TestCase):
+    def test_round_trip(self):
+        image = Image(2, 2, bytes([1, 2, 3, 4, 5, 6, 7, 8, 9, 250, 251, 252]))
+
+        decoded = decode_png(encode_png(image))
+
+        self.assertEqual(decoded.size, (2, 2))
+        self.assertEqual(decoded.data[0::4], image.data[0::3])
+        self.assertEqual(decoded.data[2::4], image.data[2::3])
+        self.assertEqual(decoded.data[3::4], b"\xff" * 4)
+
+    @parameterized.expand(
+        [
+            ("none", b"\x00" + bytes([10, 20, 30, 40]) + b"\x00" + bytes([50, 60, 70, 80])),
+            ("sub", b"\x01" + bytes([10, 10, 10, 10]) + b"\x00" + bytes([50, 60, 70, 80])),
+            ("up", b"\x00" + bytes([10, 20, 30, 40]) + b"\x02" + bytes([40, 40, 40, 40])),
+            ("average", b"\x00" + bytes([10, 20, 30, 40]) + b"\x03" + bytes([45, 25, 25, 25])),
+            ("paeth", b"\x00" + bytes([10, 20, 30, 40]) + b"\x04" + bytes([40, 10, 10, 10])),
+        ]
+    )
+    def test_filters(self, _label, filtered_scanlines):
+        decoded = decode_png(make_png(4, 2, 8, 0, filtered_scanlines))
+
+        self.assertEqual(decoded.data[0::4], bytes([10, 20, 30, 40, 50, 60, 70, 80]))
+
+    @parameterized.expand([(filter_type,) for filter_type in range(5)])
+    def test_filters_on_wide_rgba_rows(self, first_filter_type):
+        width, height = 37, 6
+        row_bytes = width * 4
+        rnd = random.Random(first_filter_type)
+        filtered_scanlines = b"".join(
+            bytes([(first_filter_type + y) % 5]) + rnd.randbytes(row_bytes) for y in range(height)
+        )
+
+        decoded = decode_png(make_png(width, height, 8, 6, filtered_scanlines))
+
+        self.assertEqual(
+            decoded.data, unfilter_byte_by_byte(filtered_scanlines, height, row_bytes, 4)
+        )
+
+    def test_palette_with_transparency(self):
+        palette = bytes([255, 0, 0, 0, 0, 255])
+        # 2 bits per pixel: indices 1, 0, 1, 1
+        content = make_png(
+            4, 1, 2, 3, b"\x00" + bytes([0b01000101]), [(b"PLTE", palette), (b"tRNS", b"\x00")]
+        )
+
+        decoded = decode_png(content)
+
+        self.assertEqual(decoded.row(0)[:8], bytes([0, 0, 255, 255, 255, 0, 0, 0]))
+
+    def test_interlaced_is_rejected(self):
+        content = bytearray(make_png(1, 1, 8, 0, b"\x00\x00"))
+        content[28] = 1  # i.e. the interlace method of IHDR
+        with self.assertRaises(ValueError):
+            decode_png(bytes(content))
+
+
+class TgaTest(unittest.TestCase):
+    def test_rle_bottom_up(self):
+        header = struct.pack("<BBBHHBHHHHBB", 0, 0, 10, 0, 0, 0, 0, 0, 2, 2, 24, 0)
+        # Bottom row: two blue pixels (run), top row: red then green (raw)
+        pixels = b"\x81" + bytes([255, 0, 0]) + b"\x01" + bytes([0, 0, 255, 0, 255, 0])
+
+        decoded = decode_tga(header + pixels)
+
+        self.assertEqual(decoded.row(0), bytes([255, 0, 0, 255, 0, 255, 0, 255]))
+        self.assertEqual(decoded.row(1), bytes([0, 0, 255, 255]) * 2)
+
+
+class ScaleNearestTest(unittest.TestCase):
+    def test_upscale(self):
+        image = RgbaImage(2, 1, bytes([1, 1, 1, 1, 2, 2, 2, 2]))
+
+        scaled = scale_nearest(image, 4, 2)
+
+        self.assertEqual(scaled.row(1), bytes([1] * 8 + [2] * 8))
+
+    @unittest.skipIf(pictures.numpy is None, "needs numpy")
+    def test_vectorized_matches_pure_python(self):
+        image = RgbaImage(7, 5, random.Random(0).randbytes(7 * 5 * 4))
+
+        vectorized = scale_nearest(image, 17, 3)
+        with patch.object(pictures, "numpy", None):
+            pure = scale_nearest(image, 17, 3)
+
+        self.assertEqual(vectorized.data, pure.data)
+
+
+def _write_picture(tempdir, filename, content):
+    path = os.path.join(tempdir, filename)
+    with open(path, "wb") as f:
+        f.write(content)
+    return path
+
+
+class LoadPictureTest(unittest.TestCase):
+    def test_jpeg_is_rejected_without_pillow(self):
+        with TemporaryDirectory() as tempdir:
+            path = _write_picture(tempdir, "background.jpg", b"\xff\xd8\xff")
+            with patch.object(pictures, "PIL", None), self.assertRaises(ValueError):
+                load_picture(path)
+
+    @unittest.skipIf(pictures.PIL is None, "needs Pillow")
+    def test_jpeg_with_pillow(self):
+        with TemporaryDirectory() as tempdir:
+            f = io.BytesIO()
+            pictures.PIL.Image.new("RGB", (3, 2), (0, 128, 255)).save(f, "JPEG", quality=100)
+            path = _write_picture(tempdir, "background.jpeg", f.getvalue())
+
+            picture = load_picture(path)
+
+        self.assertEqual(picture.size, (3, 2))
+        for channel, expected in enumerate((0, 128, 255, 255)):
+            for value in picture.data[channel::4]:
+                self.assertAlmostEqual(value, expected, delta=2)
+
+    @parameterized.expand(
+        [
+            ("palette with transparency", "palette.png", 4, 1, 2, 3, b"\x00\x45"),
+            ("paeth rgba", "paeth.png", 37, 6, 8, 6, None),
+            ("16-bit gray", "gray16.png", 2, 1, 16, 0, b"\x00\x12\x34\xfe\xdc"),
+            ("rle tga", "rle.tga", None, None, None, None, None),
+        ]
+    )
+    @unittest.skipIf(pictures.PIL is None, "needs Pillow")
+    def test_pillow_matches_pure_python(
+        self, _label, filename, width, height, bit_depth, color_type, filtered_scanlines
+    ):
+        if filename.endswith(".tga"):
+            content = struct.pack("<BBBHHBHHHHBB", 0, 0, 10, 0, 0, 0, 0, 0, 2, 2, 32, 0)
+            content += b"\x81" + bytes([1, 2, 3, 128]) + b"\x01" + bytes(range(8))
+        else:
+            if filtered_scanlines is None:
+                rnd = random.Random(4)
+                filtered_scanlines = b"".join(
+                    b"\x04" + rnd.randbytes(width * 4) for _y in range(height)
+                )
+            extra_chunks = []
+            if color_type == 3:
+                extra_chunks = [(b"PLTE", bytes([255, 0, 0, 0, 0, 255])), (b"tRNS", b"\x00")]
+            content = make_png(
+                width, height, bit_depth, color_type, filtered_scanlines, extra_chunks
+            )
+
+        with TemporaryDirectory() as tempdir:
+            path = _write_picture(tempdir, filename, content)
+            with_pillow = load_picture(path)
+            with patch.object(pictures, "PIL", None):
+                pure = load_picture(path)
+
+        self.assertEqual(with_pillow.size, pure.size)
+        self.assertEqual(with_pillow.data, pure.data)
+
+
+class ReadPictureSizeTest(unittest.TestCase):
+    @parameterized.expand(
+        [
+            ("png", "background.png", encode_png(RgbaImage(3, 2, bytes(24)))),
+            (
+                "tga",
+                "background.tga",
+                struct.pack("<BBBHHBHHHHBB", 0, 0, 2, 0, 0, 0, 0, 0, 3, 2, 24, 0) + bytes(18),
+            ),
+            (
+                "jpeg",
+                "background.JPG",
+                b"\xff\xd8"
+                + b"\xff\xe0"
+                + struct.pack(">H", 6)
+                + b"JFIF"
+                + b"\xff\xc2"
+                + struct.pack(">HBHHB", 8, 8, 2, 3, 1),
+            ),
+        ]
+    )
+    def test_size_from_headers(self, _label, filename, content):
+        with TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, filename)
+            with open(path, "wb") as f:
+                f.write(content)
+
+            self.assertEqual(tuple(read_picture_size(path)), (3, 2))
@@ -0,0 +1,261 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import asyncio
+import collections
+import ctypes
+import os
+import struct
+import unittest
+from tempfile import TemporaryDirectory
+
+from ..elf import read_symbols
+from ..profiler import (
+    GuestProfiler,
+    SymbolTable,
+    _grub_dl_offsets,
+    format_profile_report,
+    read_loaded_modules,
+    write_folded_stacks,
+)
+
+_ET_REL = 1
+_ET_EXEC = 2
+_STT_OBJECT = 1
+_STT_FUNC = 2
+
+
+def make_elf32(e_type, symbols):
+    """
+    Return a little-endian ELF32 file with sections "" and .text and a symbol table
+    of ``symbols`` given as ``(name, section index, value, size, symbol type)``
+    """
+    strings = b"\x00"
+    entries = [struct.pack("<IIIBBH", 0, 0, 0, 0, 0, 0)]
+    for name, section_index, value, size, symbol_type in symbols:
+        entries.append(
+            struct.pack("<IIIBBH", len(strings), value, size, symbol_type, 0, section_index)
+        )
+        strings += name.encode("ascii") + b"\x00"
+    symtab = b"".join(entries)
+
+    strings_offset = 52
+    symtab_offset = strings_offset + len(strings)
+    sections_offset = symtab_offset + len(symtab)
+    section_headers = [
+        struct.pack("<10I", *[0] * 10),
+        struct.pack("<10I", 0, 1, 6, 0, 0, 0, 0, 0, 1, 0),
+        struct.pack("<10I", 0, 2, 0, 0, symtab_offset, len(symtab), 3, 1, 4, 16),
+        struct.pack("<10I", 0, 3, 0, 0, strings_offset, len(strings), 0, 0, 1, 0),
+    ]
+    header = b"\x7fELF\x01\x01\x01" + bytes(9)
+    header += struct.pack(
+        "<HHIIIIIHHHHHH", e_type, 3, 1, 0, 0, sections_offset, 0, 52, 0, 0, 40, 4, 0
+    )
+    return header + strings + symtab + b"".join(section_headers)
+
+
+class _FakeStub:
+    def __init__(self, memory, program_counters):
+        self.memory = memory
+        self._program_counters = iter(program_counters)
+        self.running = True
+
+    async def interrupt(self):
+        self.running = False
+        return "T05"
+
+    async def resume(self):
+        self.running = True
+
+    async def read_register(self, number, size):
+        assert not self.running
+        return next(self._program_counters)
+
+    async def read_memory(self, address, length):
+        assert not self.running
+        return bytes(self.memory[address : address + length])
+
+
+def _make_grub_dl_struct(pointer_type):
+    """
+    Return struct grub_dl as declared by include/grub/dl.h of GRUB 2.12 for x86,
+    with ``pointer_type`` standing in for pointers and grub_size_t alike
+    """
+
+    class GrubDl(ctypes.LittleEndianStructure):
+        _fields_ = [
+            ("name", pointer_type),
+            ("ref_count", ctypes.c_int),
+            ("persistent", ctypes.c_int),
+            ("dep", pointer_type),
+            ("segment", pointer_type),
+            ("symtab", pointer_type),
+            ("symsize", pointer_type),
+            ("init", pointer_type),
+            ("fini", pointer_type),
+            ("base", pointer_type),
+            ("sz", pointer_type),
+            ("next", pointer_type),
+        ]
+
+    return GrubDl
+
+
+_GrubDl32 = _make_grub_dl_struct(ctypes.c_uint32)
+
+
+def _make_guest_memory():
+    """
+    Return guest memory of an i386 GRUB with module "gfxterm" loaded,
+    its section 1 at 0x50000 and ``grub_dl_head`` at 0x100
+    """
+    memory = bytearray(0x4000)
+    module = _GrubDl32.from_buffer(memory, 0x1000)
+    struct.pack_into("<I", memory, 0x100, 0x1000)  # grub_dl_head
+    module.name = 0x2000
+    module.segment = 0x3000
+    module.next = 0
+    memory[0x2000:0x2008] = b"gfxterm\x00"
+    struct.pack_into("<IIII", memory, 0x3000, 0, 0x50000, 0x400, 1)  # next, addr, size, section
+    return memory
+
+
+class ElfTest(unittest.TestCase):
+    def test_functions_and_objects_of_relocatable(self):
+        content = make_elf32(
+            _ET_REL,
+            [
+                ("grub_gfxterm_init", 1, 0x10, 0x20, _STT_FUNC),
+                ("grub_dl_head", 1, 0x40, 4, _STT_OBJECT),
+                ("undefined", 0, 0, 0, _STT_FUNC),
+            ],
+        )
+
+        symbols = read_symbols(content)
+
+        self.assertEqual(
+            [(s.name, s.section_index, s.value, s.size, s.is_function) for s in symbols],
+            [
+                ("grub_gfxterm_init", 1, 0x10, 0x20, True),
+                ("grub_dl_head", 1, 0x40, 4, False),
+            ],
+        )
+
+    def test_not_elf(self):
+        with self.assertRaises(ValueError):
+            read_symbols(b"\x89PNG")
+
+
+class SymbolTableTest(unittest.TestCase):
+    def test_lookup(self):
+        table = SymbolTable()
+        table.add("gfxterm", "b", 0x200, 0x10)
+        table.add("kernel", "a", 0x100, 0x80)
+
+        self.assertIsNone(table.lookup(0xFF))
+        self.assertEqual(table.lookup(0x100), ("kernel", "a"))
+        self.assertEqual(table.lookup(0x17F), ("kernel", "a"))
+        self.assertIsNone(table.lookup(0x180))
+        self.assertEqual(table.lookup(0x20F), ("gfxterm", "b"))
+
+
+class GrubDlLayoutTest(unittest.TestCase):
+    def test_offsets_match_grub_declaration(self):
+        for pointer_size, pointer_type in ((4, ctypes.c_uint32), (8, ctypes.c_uint64)):
+            grub_dl = _make_grub_dl_struct(pointer_type)
+            with self.subTest(pointer_size=pointer_size):
+                self.assertEqual(
+                    _grub_dl_offsets(pointer_size), (grub_dl.segment.offset, grub_dl.next.offset)
+                )
+
+
+class GuestProfilerTest(unittest.TestCase):
+    def test_read_loaded_modules(self):
+        stub = _FakeStub(_make_guest_memory(), [])
+        stub.running = False
+
+        modules = asyncio.run(read_loaded_modules(stub, 0x100, 4))
+
+        self.assertEqual([(m.name, m.segments) for m in modules], [("gfxterm", {1: 0x50000})])
+
+    def test_samples_are_folded_by_module_and_function(self):
+        stub = _FakeStub(_make_guest_memory(), [0x50018, 0x50018, 0x9010, 0xDEAD])
+
+        async def scenario(abs_platform_dir):
+            profiler = GuestProfiler(stub, (8, 4))
+            profiler.start(0.001)
+            while sum(profiler.samples.values()) < 4:
+                await asyncio.sleep(0.001)
+            await profiler.cancel()
+            return await profiler.resolve(abs_platform_dir, "i386-pc", 4)
+
+        with TemporaryDirectory() as tempdir:
+            with open(os.path.join(tempdir, "kernel.exec"), "wb") as f:
+                f.write(
+                    make_elf32(
+                        _ET_EXEC,
+                        [
+                            ("grub_main", 1, 0x9000, 0x100, _STT_FUNC),
+                            ("grub_dl_head", 1, 0x100, 4, _STT_OBJECT),
+                        ],
+                    )
+                )
+            with open(os.path.join(tempdir, "gfxterm.mod"), "wb") as f:
+                f.write(make_elf32(_ET_REL, [("grub_gfxterm_init", 1, 0x10, 0x20, _STT_FUNC)]))
+
+            folded = asyncio.run(scenario(tempdir))
+
+            abs_folded_file = os.path.join(tempdir, "profile.folded")
+            write_folded_stacks(abs_folded_file, folded)
+            with open(abs_folded_file) as f:
+                folded_content = f.read()
+
+        self.assertTrue(stub.running)
+        self.assertEqual(
+            folded,
+            collections.Counter(
+                {
+                    "grub;gfxterm;grub_gfxterm_init": 2,
+                    "grub;kernel;grub_main": 1,
+                    "grub;[unknown]": 1,
+                }
+            ),
+        )
+        self.assertEqual(
+            folded_content,
+            "grub;[unknown] 1\ngrub;gfxterm;grub_gfxterm_init 2\ngrub;kernel;grub_main 1\n",
+        )
+        self.assertIn("     2   50.0%  gfxterm;grub_gfxterm_init", format_profile_report(folded))
+
+    def test_samples_after_menu_are_dropped(self):
+        stub = _FakeStub(bytearray(), iter(range(1, 1000)))
+
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            profiler = GuestProfiler(stub, (8, 4))
+            profiler.start(0.001)
+            while sum(profiler.samples.values()) < 3:
+                await asyncio.sleep(0.001)
+            menu_time = loop.time()
+            while sum(profiler.samples.values()) < 6:
+                await asyncio.sleep(0.001)
+            await profiler.stop(menu_time)
+            return profiler.samples
+
+        samples = asyncio.run(scenario())
+
+        self.assertGreaterEqual(sum(samples.values()), 3)
+        self.assertLess(sum(samples.values()), 6)
+        self.assertEqual(min(samples), 1)
+        self.assertTrue(all(count == 1 for count in samples.values()))
+
+    def test_no_module_walk_on_relocated_kernel(self):
+        stub = _FakeStub(bytearray(), [])
+        profiler = GuestProfiler(stub, (16, 8))
+        profiler.samples[0x1234] = 3
+
+        with TemporaryDirectory() as tempdir:
+            folded = asyncio.run(profiler.resolve(tempdir, "x86_64-efi", 8))
+
+        self.assertEqual(folded, collections.Counter({"grub;[unknown]": 3}))
@@ -0,0 +1,250 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import os
+import random
+import struct
+import unittest
+from tempfile import TemporaryDirectory
+from textwrap import dedent
+from unittest.mock import patch
+
+from parameterized import parameterized
+
+from .. import render
+from ..pf2 import Pf2Font, read_pf2
+from ..pictures import RgbaImage
+from ..render import (
+    Canvas,
+    draw_text,
+    iterate_menu_entries,
+    parse_color,
+    parse_theme_txt,
+    render_theme,
+    resolve_length,
+)
+
+
+def make_pf2(name, ascent, descent, glyphs):
+    """
+    Return the bytes of a PF2 font with ``glyphs`` mapping code points
+    to ``(width, height, y_offset, rows)``, rows being strings of "#" and "."
+    """
+    glyph_blobs = []
+    for codepoint in sorted(glyphs):
+        width, height, y_offset, rows = glyphs[codepoint]
+        bits = "".join(row.replace("#", "1").replace(".", "0") for row in rows)
+        bits += "0" * (-len(bits) % 8)
+        bitmap = bytes(int(bits[i : i + 8], 2) for i in range(0, len(bits), 8))
+        glyph_blobs.append(
+            (codepoint, struct.pack(">HHhhh", width, height, 0, y_offset, width) + bitmap)
+        )
+
+    def section(section_name, payload):
+        return section_name + struct.pack(">I", len(payload)) + payload
+
+    header = b"".join(
+        [
+            section(b"FILE", b"PFF2"),
+            section(b"NAME", name.encode() + b"\x00"),
+            section(b"ASCE", struct.pack(">H", ascent)),
+            section(b"DESC", struct.pack(">H", descent)),
+        ]
+    )
+    chix_length = 8 + 9 * len(glyph_blobs)
+    offset = len(header) + chix_length + 8
+    chix = b""
+    for codepoint, blob in glyph_blobs:
+        chix += struct.pack(">IBI", codepoint, 0, offset)
+        offset += len(blob)
+    return (
+        header
+        + section(b"CHIX", chix)
+        + b"DATA"
+        + b"\xff\xff\xff\xff"
+        + b"".join(blob for _codepoint, blob in glyph_blobs)
+    )
+
+
+# A 2x2 block that sits on the baseline, and a space
+_BLOCK_FONT = {
+    ord("A"): (2, 2, 0, ["##", "##"]),
+    ord(" "): (2, 0, 0, []),
+}
+
+
+class Pf2FontTest(unittest.TestCase):
+    def test_header_and_glyph(self):
+        font = Pf2Font(make_pf2("Block Regular 2", 3, 1, {ord("A"): (3, 2, 0, ["#..", ".##"])}))
+
+        self.assertEqual(font.name, "Block Regular 2")
+        self.assertEqual(font.height, 4)
+        glyph = font.get_glyph(ord("A"))
+        self.assertEqual(
+            [[glyph.is_set(x, y) for x in range(3)] for y in range(2)],
+            [[True, False, False], [False, True, True]],
+        )
+        self.assertIsNone(font.get_glyph(ord("B")))
+
+    def test_coverage_ranges(self):
+        glyph = (1, 1, 0, ["#"])
+        font = Pf2Font(
+            make_pf2("Sparse 1", 1, 0, {codepoint: glyph for codepoint in (65, 66, 67, 0x3B1)})
+        )
+
+        self.assertEqual(font.glyph_count, 4)
+        self.assertEqual(font.coverage_ranges(), [(65, 67), (0x3B1, 0x3B1)])
+        self.assertTrue(font.has_glyph(0x3B1))
+        self.assertFalse(font.has_glyph(68))
+        self.assertLess(font.index_bytes, font.file_bytes)
+
+    def test_read_pf2(self):
+        with TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "block.pf2")
+            with open(path, "wb") as f:
+                f.write(make_pf2("Block Regular 2", 2, 0, _BLOCK_FONT))
+
+            font = read_pf2(path)
+
+            self.assertEqual(font.get_glyph(ord("A")).bitmap, b"\xf0")
+
+    def test_not_a_pf2_font(self):
+        with self.assertRaises(ValueError):
+            Pf2Font(b"FILE\x00\x00\x00\x04PFF1")
+
+
+class ThemeTxtTest(unittest.TestCase):
+    def test_parse(self):
+        global_properties, components = parse_theme_txt(
+            dedent("""\
+            # comment
+            desktop-color: "#102030"
+            title-text: ""
+            + vbox {
+                left = 10%
+                + label { text = "Hello: world" color = "red" }
+            }
+            + boot_menu {
+                item_height = 20
+            }
+        """)
+        )
+
+        self.assertEqual(global_properties, {"desktop-color": "#102030", "title-text": ""})
+        self.assertEqual([component.kind for component in components], ["vbox", "boot_menu"])
+        self.assertEqual(components[0].properties, {"left": "10%"})
+        label = components[0].children[0]
+        self.assertEqual(label.properties, {"text": "Hello: world", "color": "red"})
+        self.assertEqual(components[1].properties, {"item_height": "20"})
+
+    @parameterized.expand(
+        [
+            ("20", 200, 20),
+            ("50%", 200, 100),
+            ("50%+10", 200, 110),
+            ("50%-10", 200, 90),
+            ("bogus", 200, 7),
+            (None, 200, 7),
+        ]
+    )
+    def test_resolve_length(self, text, parent_length, expected):
+        self.assertEqual(resolve_length(text, parent_length, 7), expected)
+
+    @parameterized.expand(
+        [
+            ("#102030", (16, 32, 48)),
+            ("#fff", (255, 255, 255)),
+            ("10, 20, 30", (10, 20, 30)),
+            ("White", (255, 255, 255)),
+            ("no such color", None),
+        ]
+    )
+    def test_parse_color(self, text, expected):
+        self.assertEqual(parse_color(text), expected)
+
+
+class MenuEntriesTest(unittest.TestCase):
+    def test_top_level_only(self):
+        grub_cfg_content = dedent("""\
+            menuentry 'Debian' --class debian --class os {
+                echo '{'
+            }
+            submenu "Advanced" {
+                menuentry 'Nested' { reboot }
+            }
+            menuentry Plain { reboot }
+        """)
+
+        self.assertEqual(
+            list(iterate_menu_entries(grub_cfg_content)),
+            [("Debian", ["debian", "os"]), ("Advanced", []), ("Plain", [])],
+        )
+
+
+class RenderThemeTest(unittest.TestCase):
+    def test_desktop_color_and_label(self):
+        with TemporaryDirectory() as tempdir:
+            font_path = os.path.join(tempdir, "block.pf2")
+            with open(font_path, "wb") as f:
+                f.write(make_pf2("Block Regular 2", 2, 0, _BLOCK_FONT))
+            theme_txt = os.path.join(tempdir, "theme.txt")
+            with open(theme_txt, "w") as f:
+                f.write(
+                    dedent("""\
+                    desktop-color: "#000080"
+                    + label { left = 2 top = 3 height = 2 text = "A A" color = "#ff0000" }
+                """)
+                )
+
+            image = render_theme(theme_txt, [font_path], [], (10, 8), 10)
+
+        def pixel(x, y):
+            offset = y * image.stride + x * 3
+            return tuple(image.data[offset : offset + 3])
+
+        self.assertEqual(image.size, (10, 8))
+        self.assertEqual(pixel(0, 0), (0, 0, 128))
+        self.assertEqual(pixel(2, 3), (255, 0, 0))
+        self.assertEqual(pixel(3, 4), (255, 0, 0))
+        self.assertEqual(pixel(4, 3), (0, 0, 128))  # i.e. the space
+        self.assertEqual(pixel(6, 4), (255, 0, 0))
+
+
+class CanvasTest(unittest.TestCase):
+    @parameterized.expand([("inside", 3, 2), ("clipped top left", -4, -3), ("clipped", 9, 6)])
+    @unittest.skipIf(render.numpy is None, "needs numpy")
+    def test_vectorized_blit_matches_pure_python(self, _label, x, y):
+        rnd = random.Random(x)
+        data = bytearray(rnd.randbytes(8 * 6 * 4))
+        data[3::16] = b"\x00" * len(data[3::16])  # i.e. some transparent pixels
+        data[7::16] = b"\xff" * len(data[7::16])  # i.e. some opaque pixels
+        picture = RgbaImage(8, 6, bytes(data))
+
+        def blit():
+            canvas = Canvas(13, 9, (10, 200, 90))
+            canvas.blit(picture, x, y)
+            return canvas.to_image().data
+
+        vectorized = blit()
+        with patch.object(render, "numpy", None):
+            pure = blit()
+
+        self.assertEqual(vectorized, pure)
+
+    @parameterized.expand([("inside", 2, 5), ("clipped", -1, 1)])
+    @unittest.skipIf(render.numpy is None, "needs numpy")
+    def test_vectorized_text_matches_pure_python(self, _label, x, baseline):
+        glyphs = {ord("B"): (3, 3, 1, ["#.#", ".#.", "##."]), **_BLOCK_FONT}
+        font = Pf2Font(make_pf2("Mixed Regular 3", 3, 0, glyphs))
+
+        def draw():
+            canvas = Canvas(9, 6)
+            draw_text(canvas, font, "AB BA", x, baseline, (255, 255, 0))
+            return canvas.to_image().data
+
+        vectorized = draw()
+        with patch.object(render, "numpy", None):
+            pure = draw()
+
+        self.assertEqual(vectorized, pure)
+        self.assertIn(b"\xff\xff\x00", vectorized)
@@ -0,0 +1,71 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import os
+import unittest
+from io import StringIO
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from ..errors import CommandNotFoundError, QemuExitError
+from ..session import PreviewSession
+from .test_main import fake_grub2_mkrescue, fake_qemu_with_qmp
+
+
+class PreviewSessionTest(unittest.TestCase):
+    def test_missing_command_raises_instead_of_exiting(self):
+        with fake_grub2_mkrescue(), self.assertRaises(CommandNotFoundError) as caught:
+            PreviewSession(qemu="qemu-does-not-exist")
+        self.assertEqual(caught.exception.command, "qemu-does-not-exist")
+
+    def test_image_is_reused_until_source_changes(self):
+        with TemporaryDirectory() as tempdir, fake_grub2_mkrescue():
+            theme_txt = os.path.join(tempdir, "theme.txt")
+            with open(theme_txt, "w") as f:
+                f.write("# theme\n")
+
+            with patch("sys.stdout", StringIO()), PreviewSession(qemu="true") as session:
+                first = session.build_image(tempdir)
+                self.assertTrue(os.path.exists(first))
+                self.assertEqual(session.build_image(tempdir), first)
+
+                with open(theme_txt, "a") as f:
+                    f.write("# changed\n")
+                os.utime(theme_txt, ns=(0, 0))
+                second = session.build_image(tempdir)
+                self.assertNotEqual(second, first)
+                self.assertFalse(os.path.exists(os.path.dirname(first)))
+                self.assertTrue(os.path.exists(second))
+
+            self.assertFalse(os.path.exists(second))
+
+    def test_commands_are_resolved_to_absolute_paths(self):
+        with fake_grub2_mkrescue(), PreviewSession(qemu="true") as session:
+            for command in (
+                session.commands.grub2_mkrescue,
+                session.commands.qemu,
+                session.commands.xorriso,
+            ):
+                self.assertTrue(os.path.isabs(command), command)
+            self.assertEqual(os.path.basename(session.commands.qemu), "true")
+
+    def test_launch_raises_on_qemu_failure(self):
+        with TemporaryDirectory() as tempdir, fake_grub2_mkrescue():
+            with patch("sys.stdout", StringIO()), PreviewSession(qemu="false") as session:
+                abs_img_file = session.build_image(tempdir)
+                with self.assertRaises(QemuExitError) as caught:
+                    session.launch(abs_img_file)
+        self.assertEqual(caught.exception.exit_code, 1)
+
+    def test_screenshot_returns_image(self):
+        with (
+            TemporaryDirectory() as tempdir,
+            fake_grub2_mkrescue(),
+            fake_qemu_with_qmp(b"P6\n2 1\n255\n" + bytes(range(6))) as qemu,
+        ):
+            with patch("sys.stdout", StringIO()), PreviewSession(qemu=qemu) as session:
+                abs_img_file = session.build_image(tempdir)
+                screenshot = session.screenshot(abs_img_file, delay_seconds=0)
+
+        self.assertEqual(screenshot.size, (2, 1))
+        self.assertEqual(screenshot.data, bytes(range(6)))
@@ -0,0 +1,68 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import os
+import unittest
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from parameterized import parameterized
+
+from ..staging import choose_staging_area, get_file_system_type
+
+_MOUNTS = """\
+/dev/sda1 / ext4 rw,relatime 0 0
+tmpfs /dev/shm tmpfs rw,nosuid,nodev 0 0
+/dev/sdb1 /mnt/with\\040space xfs rw 0 0
+"""
+
+
+class GetFileSystemTypeTest(unittest.TestCase):
+    @parameterized.expand(
+        [
+            ("/dev/shm/x", "tmpfs"),
+            ("/dev/shmem", "ext4"),
+            ("/mnt/with space/x", "xfs"),
+            ("/home", "ext4"),
+        ]
+    )
+    def test_longest_mount_point_wins(self, path, expected_type):
+        with TemporaryDirectory() as tempdir:
+            mounts_file = os.path.join(tempdir, "mounts")
+            with open(mounts_file, "w") as f:
+                f.write(_MOUNTS)
+            with patch("os.path.realpath", side_effect=lambda path: path):
+                self.assertEqual(get_file_system_type(path, mounts_file), expected_type)
+
+
+class ChooseStagingAreaTest(unittest.TestCase):
+    @parameterized.expand(
+        [
+            ("auto with room", "auto", 1, True),
+            ("auto without room", "auto", 2**62, False),
+            ("ram", "ram", 2**62, True),
+            ("disk", "disk", 1, False),
+        ]
+    )
+    def test_choice(self, _label, preference, required_bytes, expected_in_ram):
+        with TemporaryDirectory() as shm_dir:
+
+            def fake_file_system_type(path):
+                return "tmpfs" if path == shm_dir else "ext4"
+
+            with patch(
+                "grub2_theme_preview.staging.get_file_system_type",
+                side_effect=fake_file_system_type,
+            ):
+                area = choose_staging_area(preference, required_bytes, abs_shm_dir=shm_dir)
+
+        self.assertEqual(area.in_ram, expected_in_ram)
+        self.assertEqual(area.abs_directory == shm_dir, expected_in_ram)
+
+    def test_ram_without_tmpfs_fails(self):
+        with (
+            TemporaryDirectory() as shm_dir,
+            patch("grub2_theme_preview.staging.get_file_system_type", return_value="ext4"),
+            self.assertRaises(OSError),
+        ):
+            choose_staging_area("ram", 1, abs_shm_dir=shm_dir)
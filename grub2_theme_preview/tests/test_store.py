@@ -0,0 +1,83 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import errno
+import io
+import os
+import stat
+import unittest
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from .. import store as store_module
+from ..store import ContentStore
+
+
+class ContentStoreTest(unittest.TestCase):
+    def test_identical_content_is_stored_once(self):
+        with TemporaryDirectory() as tempdir:
+            store = ContentStore(os.path.join(tempdir, "objects"))
+            first = store.add_stream(io.BytesIO(b"font"))
+            second = store.add_stream(io.BytesIO(b"font"))
+
+            self.assertEqual(first, second)
+            self.assertEqual(store.statistics.bytes_stored, 4)
+            self.assertEqual(store.statistics.bytes_deduplicated, 4)
+            object_path = os.path.join(tempdir, "objects", first[:2], first[2:])
+            self.assertEqual(stat.S_IMODE(os.stat(object_path).st_mode), 0o444)
+            self.assertEqual(os.listdir(os.path.join(tempdir, "objects")), [first[:2]])
+
+    def test_known_small_content_is_not_written_again(self):
+        with TemporaryDirectory() as tempdir:
+            store = ContentStore(os.path.join(tempdir, "objects"))
+            first = store.add_stream(io.BytesIO(b"font"))
+            with patch("tempfile.mkstemp", side_effect=AssertionError("written")):
+                second = store.add_stream(io.BytesIO(b"font"))
+
+            self.assertEqual(first, second)
+            self.assertEqual(store.statistics.bytes_deduplicated, 4)
+
+    def test_large_content_is_spooled(self):
+        with TemporaryDirectory() as tempdir:
+            store = ContentStore(os.path.join(tempdir, "objects"))
+            with (
+                patch.object(store_module, "_BUFFER_MAX_SIZE", 3),
+                patch.object(store_module, "_COPY_CHUNK_SIZE", 2),
+            ):
+                first = store.add_stream(io.BytesIO(b"background"))
+                second = store.add_stream(io.BytesIO(b"background"))
+
+            self.assertEqual(first, second)
+            self.assertEqual(store.statistics.bytes_stored, 10)
+            self.assertEqual(store.statistics.bytes_deduplicated, 10)
+            with open(os.path.join(tempdir, "objects", first[:2], first[2:]), "rb") as f:
+                self.assertEqual(f.read(), b"background")
+            self.assertEqual(os.listdir(os.path.join(tempdir, "objects")), [first[:2]])
+
+    def test_hardlink(self):
+        with TemporaryDirectory() as tempdir:
+            store = ContentStore(os.path.join(tempdir, "objects"))
+            digest = store.add_stream(io.BytesIO(b"icon"))
+            target = os.path.join(tempdir, "icon.png")
+
+            self.assertEqual(store.link(digest, target), "hardlink")
+            self.assertEqual(os.stat(target).st_nlink, 2)
+
+    def test_falls_back_to_copy(self):
+        with TemporaryDirectory() as tempdir:
+            store = ContentStore(os.path.join(tempdir, "objects"))
+            digest = store.add_stream(io.BytesIO(b"icon"))
+            targets = [os.path.join(tempdir, f"icon{i}.png") for i in range(2)]
+
+            with (
+                patch("os.link", side_effect=OSError(errno.EXDEV, "cross-device")),
+                patch("fcntl.ioctl", side_effect=OSError(errno.EOPNOTSUPP, "no reflinks")),
+            ):
+                methods = [store.link(digest, target) for target in targets]
+
+            self.assertEqual(methods, ["copy", "copy"])
+            self.assertEqual(store.statistics.link_methods["copy"], 2)
+            for target in targets:
+                self.assertEqual(os.stat(target).st_nlink, 1)
+                with open(target, "rb") as f:
+                    self.assertEqual(f.read(), b"icon")
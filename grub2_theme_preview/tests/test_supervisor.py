@@ -0,0 +1,129 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import asyncio
+import os
+import signal
+import unittest
+from io import StringIO
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from parameterized import parameterized
+
+from ..supervisor import MENU_READY_MARKER, QemuSupervisor, SupervisionError
+
+
+async def _supervise(command, scenario, **deadlines):
+    process = await asyncio.create_subprocess_exec(*command)
+    supervisor = QemuSupervisor(process, **deadlines)
+    try:
+        return await scenario(supervisor)
+    finally:
+        await supervisor.shutdown()
+        assert process.returncode is not None
+
+
+class _FakeCapture:
+    def __init__(self, redraw_seconds):
+        self._redraw_seconds = redraw_seconds
+
+    async def wait_for_redrawn(self, timeout_seconds):
+        if self._redraw_seconds is None:
+            return None
+        await asyncio.sleep(self._redraw_seconds)
+        return asyncio.get_running_loop().time()
+
+
+class QemuSupervisorTest(unittest.TestCase):
+    def test_wait_returns_exit_code(self):
+        exit_code = asyncio.run(
+            _supervise(["sh", "-c", "exit 3"], lambda supervisor: supervisor.wait())
+        )
+        self.assertEqual(exit_code, 3)
+
+    def test_total_deadline_terminates(self):
+        with self.assertRaises(SupervisionError) as caught:
+            asyncio.run(
+                _supervise(
+                    ["sleep", "60"],
+                    lambda supervisor: supervisor.wait(),
+                    total_deadline_seconds=0.1,
+                )
+            )
+        self.assertIn("Total deadline of 0.1 seconds exceeded", str(caught.exception))
+
+    def test_shutdown_escalates_to_kill(self):
+        async def scenario():
+            process = await asyncio.create_subprocess_exec(
+                "sh", "-c", "trap '' TERM; while true; do sleep 0.05; done"
+            )
+            supervisor = QemuSupervisor(process)
+            await asyncio.sleep(0.2)  # for the trap to be installed
+            with (
+                patch("grub2_theme_preview.supervisor._SHUTDOWN_GRACE_SECONDS", 0.2),
+                patch("sys.stdout", StringIO()),
+            ):
+                await supervisor.shutdown()
+            return process.returncode
+
+        self.assertEqual(asyncio.run(scenario()), -signal.SIGKILL)
+
+    def test_menu_marker_is_detected(self):
+        with TemporaryDirectory() as tempdir:
+            serial_path = os.path.join(tempdir, "serial.log")
+            command = [
+                "sh",
+                "-c",
+                f"sleep 0.1; echo {MENU_READY_MARKER} > {serial_path}; sleep 60",
+            ]
+            with patch("sys.stdout", StringIO()):
+                menu_seconds = asyncio.run(
+                    _supervise(
+                        command,
+                        lambda supervisor: self._wait_for_menu(supervisor, serial_path),
+                        menu_deadline_seconds=10,
+                    )
+                )
+        self.assertGreaterEqual(menu_seconds, 0.1)
+
+    @parameterized.expand([("drawn later", 0.3, 0.4), ("screen unchanged", None, 0.1)])
+    def test_menu_is_timed_when_drawn(self, _label, redraw_seconds, expected_min_seconds):
+        with TemporaryDirectory() as tempdir:
+            serial_path = os.path.join(tempdir, "serial.log")
+            command = [
+                "sh",
+                "-c",
+                f"sleep 0.1; echo {MENU_READY_MARKER} > {serial_path}; sleep 60",
+            ]
+            with patch("sys.stdout", StringIO()) as stdout:
+                menu_seconds = asyncio.run(
+                    _supervise(
+                        command,
+                        lambda supervisor: self._wait_for_menu(
+                            supervisor, serial_path, _FakeCapture(redraw_seconds)
+                        ),
+                        menu_deadline_seconds=10,
+                    )
+                )
+        self.assertGreaterEqual(menu_seconds, expected_min_seconds)
+        self.assertLess(menu_seconds, expected_min_seconds + 0.5)
+        self.assertEqual("Screen did not change" in stdout.getvalue(), redraw_seconds is None)
+
+    def test_menu_deadline(self):
+        with TemporaryDirectory() as tempdir:
+            serial_path = os.path.join(tempdir, "serial.log")
+            with self.assertRaises(SupervisionError) as caught:
+                asyncio.run(
+                    _supervise(
+                        ["sleep", "60"],
+                        lambda supervisor: supervisor.wait_for_menu(serial_path),
+                        menu_deadline_seconds=0.1,
+                    )
+                )
+        self.assertIn("GRUB menu did not show up within 0.1 seconds", str(caught.exception))
+
+    @staticmethod
+    async def _wait_for_menu(supervisor, serial_path, capture=None):
+        await supervisor.wait_for_menu(serial_path, capture)
+        return supervisor.menu_seconds
@@ -0,0 +1,42 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import asyncio
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from ..unixsocket import open_unix_connection_with_retry
+
+
+async def _greet(reader, writer):
+    writer.write(b"hello\n")
+    await writer.drain()
+    writer.close()
+
+
+class OpenUnixConnectionWithRetryTest(unittest.TestCase):
+    def test_waits_for_socket_to_appear(self):
+        async def scenario(socket_path):
+            async def serve_later():
+                await asyncio.sleep(0.2)
+                return await asyncio.start_unix_server(_greet, path=socket_path)
+
+            serving = asyncio.ensure_future(serve_later())
+            reader, writer = await open_unix_connection_with_retry(socket_path)
+            server = await serving
+            async with server:
+                line = await reader.readline()
+                writer.close()
+            return line
+
+        with TemporaryDirectory() as tempdir:
+            line = asyncio.run(scenario(os.path.join(tempdir, "qemu.sock")))
+
+        self.assertEqual(line, b"hello\n")
+
+    def test_gives_up_after_timeout(self):
+        with TemporaryDirectory() as tempdir:
+            socket_path = os.path.join(tempdir, "missing.sock")
+            with self.assertRaises(FileNotFoundError):
+                asyncio.run(open_unix_connection_with_retry(socket_path, timeout_seconds=0.1))
@@ -0,0 +1,76 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import asyncio
+import os
+import struct
+import unittest
+from tempfile import TemporaryDirectory
+
+from ..vnc import VncClient
+
+
+def _bgrx(*rgb_pixels):
+    return b"".join(bytes((b, g, r, 0)) for r, g, b in rgb_pixels)
+
+
+async def _serve_fake_vnc(reader, writer, updates):
+    writer.write(b"RFB 003.008\n")
+    await reader.readexactly(12)
+    writer.write(b"\x01\x01")  # one security type: None
+    await reader.readexactly(1)
+    writer.write(struct.pack(">I", 0))
+    await reader.readexactly(1)  # ClientInit
+    writer.write(struct.pack(">HH16xI", 2, 2, 4) + b"fake")
+    await reader.readexactly(20)  # SetPixelFormat
+    (encoding_count,) = struct.unpack(">xxH", await reader.readexactly(4))
+    await reader.readexactly(4 * encoding_count)
+    for update in updates:
+        await reader.readexactly(10)  # FramebufferUpdateRequest
+        writer.write(update)
+        await writer.drain()
+    writer.close()
+
+
+def _update(*rectangles):
+    return struct.pack(">BxH", 0, len(rectangles)) + b"".join(rectangles)
+
+
+def _rectangle(x, y, width, height, encoding, payload=b""):
+    return struct.pack(">HHHHi", x, y, width, height, encoding) + payload
+
+
+class VncClientTest(unittest.TestCase):
+    def _run_against(self, updates):
+        async def scenario(socket_path):
+            server = await asyncio.start_unix_server(
+                lambda r, w: _serve_fake_vnc(r, w, updates), path=socket_path
+            )
+            async with server:
+                client = await VncClient.connect(socket_path)
+                await client.run()
+                await client.close()
+                return client
+
+        with TemporaryDirectory() as tempdir:
+            return asyncio.run(scenario(os.path.join(tempdir, "vnc.sock")))
+
+    def test_raw_and_copy_rect_updates(self):
+        red, green, blue, white = (255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 255)
+        client = self._run_against(
+            [
+                _update(_rectangle(0, 0, 2, 2, 0, _bgrx(red, green, blue, white))),
+                _update(_rectangle(1, 0, 1, 1, 1, struct.pack(">HH", 0, 1))),
+            ]
+        )
+        self.assertEqual(client.frame_number, 2)
+        self.assertEqual(client.damaged_rectangles, [(1, 0, 1, 1)])
+        self.assertEqual(client.damaged_pixel_count, 5)
+        self.assertEqual(client.screenshot().data, bytes(red + blue + blue + white))
+        self.assertEqual(bytes(client.frame()), _bgrx(red, blue, blue, white))
+        self.assertTrue(client.frame().readonly)
+
+    def test_desktop_size_update(self):
+        client = self._run_against([_update(_rectangle(0, 0, 3, 1, -223))])
+        self.assertEqual((client.width, client.height), (3, 1))
+        self.assertEqual(client.screenshot().data, bytes(9))
@@ -0,0 +1,22 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import asyncio
+import time
+
+
+async def open_unix_connection_with_retry(
+    socket_path, timeout_seconds=10.0, poll_interval_seconds=0.05
+):
+    """
+    Connect to Unix domain socket ``socket_path`` as soon as QEMU serves it,
+    return ``(reader, writer)`` or raise the last ``OSError`` once out of time
+    """
+    deadline = time.monotonic() + timeout_seconds
+    while True:
+        try:
+            return await asyncio.open_unix_connection(socket_path)
+        except OSError:
+            if time.monotonic() >= deadline:
+                raise
+            await asyncio.sleep(poll_interval_seconds)
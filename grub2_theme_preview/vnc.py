@@ -0,0 +1,230 @@
+# Copyright (C) 2026 Sebastian Pipping <sebastian@pipping.org>
+# Licensed under GPL v2 or later
+
+import asyncio
+import struct
+import time
+
+from .imagediff import Image
+from .unixsocket import open_unix_connection_with_retry
+
+_ENCODING_RAW = 0
+_ENCODING_COPY_RECT = 1
+_ENCODING_DESKTOP_SIZE = -223  # pseudo-encoding
+
+_SECURITY_TYPE_NONE = 1
+
+_BYTES_PER_PIXEL = 4
+
+# 32 bits per pixel, depth 24, little endian, true colour, 8 bits per channel,
+# with red/green/blue shifts chosen so that pixels are stored as B, G, R, X in memory
+_PIXEL_FORMAT = struct.pack(">BBBBHHHBBB3x", 32, 24, 0, 1, 255, 255, 255, 16, 8, 0)
+
+
+class VncError(Exception):
+    pass
+
+
+class VncClient:
+    """
+    Minimal in-process RFB 3.8 client keeping a local copy of QEMU's framebuffer
+
+    Only damaged rectangles are transferred and applied;
+    the framebuffer is exposed as a read-only ``memoryview`` without copying.
+
+    See https://github.com/rfbproto/rfbproto/blob/master/rfbproto.rst
+    """
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._framebuffer = bytearray()
+        self._updated = asyncio.Condition()
+        self.width = 0
+        self.height = 0
+        self.frame_number = 0
+        self.closed = False
+        self.last_update_time = None
+        self.damaged_rectangles = []  # of latest update, list of (x, y, width, height)
+        self.damaged_pixel_count = 0  # accumulated over all updates
+
+    @classmethod
+    async def connect(cls, socket_path, timeout_seconds=10.0, poll_interval_seconds=0.05):
+        reader, writer = await open_unix_connection_with_retry(
+            socket_path, timeout_seconds, poll_interval_seconds
+        )
+        client = cls(reader, writer)
+        await client._handshake()
+        return client
+
+    async def _read(self, fmt):
+        return struct.unpack(fmt, await self._reader.readexactly(struct.calcsize(fmt)))
+
+    async def _handshake(self):
+        version = await self._reader.readexactly(12)
+        if not version.startswith(b"RFB 003."):
+            raise VncError(f"Unexpected RFB protocol version {version!r}")
+        self._writer.write(b"RFB 003.008\n")
+
+        (security_type_count,) = await self._read(">B")
+        if security_type_count == 0:
+            (reason_length,) = await self._read(">I")
+            reason = await self._reader.readexactly(reason_length)
+            raise VncError("VNC connection refused: %s" % reason.decode("utf-8", "replace"))
+        security_types = await self._reader.readexactly(security_type_count)
+        if _SECURITY_TYPE_NONE not in security_types:
+            raise VncError("VNC server requires authentication, which is not supported")
+        self._writer.write(struct.pack(">B", _SECURITY_TYPE_NONE))
+        (security_result,) = await self._read(">I")
+        if security_result != 0:
+            raise VncError("VNC security handshake failed")
+
+        self._writer.write(struct.pack(">B", 1))  # i.e. shared session
+        width, height = await self._read(">HH")
+        await self._reader.readexactly(16)  # server pixel format, replaced below
+        (name_length,) = await self._read(">I")
+        await self._reader.readexactly(name_length)
+        self._resize(width, height)
+
+        self._writer.write(struct.pack(">B3x", 0) + _PIXEL_FORMAT)
+        encodings = (_ENCODING_COPY_RECT, _ENCODING_RAW, _ENCODING_DESKTOP_SIZE)
+        self._writer.write(struct.pack(">BxH%di" % len(encodings), 2, len(encodings), *encodings))
+        self._request_update(incremental=False)
+        await self._writer.drain()
+
+    def _resize(self, width, height):
+        # NOTE: A new buffer rather than resizing in place,
+        #       so that views handed out earlier remain valid
+        self._framebuffer = bytearray(width * height * _BYTES_PER_PIXEL)
+        self.width = width
+        self.height = height
+
+    def _request_update(self, incremental):
+        self._writer.write(
+            struct.pack(">BBHHHH", 3, int(incremental), 0, 0, self.width, self.height)
+        )
+
+    async def _apply_raw(self, x, y, width, height):
+        data = await self._reader.readexactly(width * height * _BYTES_PER_PIXEL)
+        framebuffer = self._framebuffer
+        fb_stride = self.width * _BYTES_PER_PIXEL
+        row_length = width * _BYTES_PER_PIXEL
+        if x == 0 and width == self.width:
+            start = y * fb_stride
+            framebuffer[start : start + len(data)] = data
+            return
+        for row in range(height):
+            start = (y + row) * fb_stride + x * _BYTES_PER_PIXEL
+            framebuffer[start : start + row_length] = data[
+                row * row_length : (row + 1) * row_length
+            ]
+
+    async def _apply_copy_rect(self, x, y, width, height):
+        source_x, source_y = await self._read(">HH")
+        framebuffer = self._framebuffer
+        fb_stride = self.width * _BYTES_PER_PIXEL
+        row_length = width * _BYTES_PER_PIXEL
+        # Copy bottom-up when moving down so that overlapping rows are read before written
+        rows = range(height - 1, -1, -1) if y > source_y else range(height)
+        for row in rows:
+            source = (source_y + row) * fb_stride + source_x * _BYTES_PER_PIXEL
+            target = (y + row) * fb_stride + x * _BYTES_PER_PIXEL
+            framebuffer[target : target + row_length] = framebuffer[source : source + row_length]
+
+    async def _handle_framebuffer_update(self):
+        (rectangle_count,) = await self._read(">xH")
+        damaged_rectangles = []
+        resized = False
+        for _ in range(rectangle_count):
+            x, y, width, height, encoding = await self._read(">HHHHi")
+            if encoding == _ENCODING_RAW:
+                await self._apply_raw(x, y, width, height)
+            elif encoding == _ENCODING_COPY_RECT:
+                await self._apply_copy_rect(x, y, width, height)
+            elif encoding == _ENCODING_DESKTOP_SIZE:
+                self._resize(width, height)
+                resized = True
+            else:
+                raise VncError(f"Unsupported VNC encoding {encoding}")
+            damaged_rectangles.append((x, y, width, height))
+
+        async with self._updated:
+            self.damaged_rectangles = damaged_rectangles
+            self.damaged_pixel_count += sum(w * h for _x, _y, w, h in damaged_rectangles)
+            self.frame_number += 1
+            self.last_update_time = time.monotonic()
+            self._updated.notify_all()
+
+        return resized
+
+    async def run(self):
+        """
+        Process server messages until the connection is closed
+        """
+        try:
+            while True:
+                (message_type,) = await self._read(">B")
+                if message_type == 0:
+                    resized = await self._handle_framebuffer_update()
+                    self._request_update(incremental=not resized)
+                    await self._writer.drain()
+                elif message_type == 1:  # SetColourMapEntries
+                    _first_colour, colour_count = await self._read(">xHH")
+                    await self._reader.readexactly(colour_count * 6)
+                elif message_type == 2:  # Bell
+                    pass
+                elif message_type == 3:  # ServerCutText
+                    (text_length,) = await self._read(">3xI")
+                    await self._reader.readexactly(text_length)
+                else:
+                    raise VncError(f"Unsupported VNC server message type {message_type}")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # i.e. QEMU went away
+        finally:
+            async with self._updated:
+                self.closed = True
+                self._updated.notify_all()
+
+    async def wait_for_update(self, frame_number, timeout_seconds=None):
+        """
+        Wait until a frame later than ``frame_number`` has been received,
+        return whether that happened before the timeout or the connection closing
+        """
+        async with self._updated:
+            try:
+                await asyncio.wait_for(
+                    self._updated.wait_for(
+                        lambda: self.frame_number > frame_number or self.closed
+                    ),
+                    timeout_seconds,
+                )
+            except asyncio.TimeoutError:
+                return False
+            return self.frame_number > frame_number
+
+    def frame(self):
+        """
+        Return the current framebuffer as a read-only ``memoryview``
+        of B, G, R, X bytes per pixel, without copying.
+
+        The view reflects later updates until the guest changes resolution.
+        """
+        return memoryview(self._framebuffer).toreadonly()
+
+    def screenshot(self):
+        """
+        Return a copy of the current framebuffer as an RGB ``Image``
+        """
+        framebuffer = self._framebuffer
+        rgb = bytearray(self.width * self.height * 3)
+        rgb[0::3] = framebuffer[2::4]
+        rgb[1::3] = framebuffer[1::4]
+        rgb[2::3] = framebuffer[0::4]
+        return Image(self.width, self.height, bytes(rgb))
+
+    async def close(self):
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except OSError:
+            pass
@@ -22,6 +22,10 @@ setup(
         "setuptools>=38.6.0",  # for long_description_content_type
     ],
     packages=find_packages(),
+    extras_require={
+        # Faster approximate rendering and image comparison, JPEG support for --render
+        "fast": ["numpy", "Pillow"],
+    },
     entry_points={
         "console_scripts": [
             "grub2-theme-preview = grub2_theme_preview.__main__:main",